@@ -9,16 +9,20 @@ from pathlib import Path
 import sys
 
 from config import (
-    SUPPORTED_STATES,
-    STATE_NAMES,
     MIN_TOP_K,
     MAX_TOP_K,
     DEFAULT_TOP_K,
     GROQ_API_KEY,
+    LLM_BACKEND,
     CHROMA_DIR,
-    COLLECTION_NAME
+    COLLECTION_NAME,
+    RAG_SERVICE_URL,
+    PRELOAD_ON_START
 )
-from rag import RAGPipeline, get_collection_stats
+from tracing import METRICS, export_traces_jsonl
+
+
+COMPARE_DEFAULT_STATES = 3  # states preselected for a comparison
 
 
 # Page configuration
@@ -30,12 +34,45 @@ st.set_page_config(
 )
 
 
+def collection_stats():
+    """Get collection statistics from the RAG service in thin-client mode, else locally."""
+    if RAG_SERVICE_URL:
+        from rag_client import get_remote_collection_stats
+        return get_remote_collection_stats(RAG_SERVICE_URL)
+    
+    from rag import get_collection_stats
+    return get_collection_stats()
+
+
+def state_names():
+    """Get the registered states (code -> name) from the collection statistics."""
+    return {
+        state: entry.get('name', state)
+        for state, entry in collection_stats().get('states', {}).items()
+    }
+
+
+def state_label(state):
+    """Format a state code with its name."""
+    return f"{state_names().get(state, state)} ({state})"
+
+
 def check_prerequisites():
     """Check if all prerequisites are met before running the app."""
     errors = []
     
-    # Check GROQ_API_KEY
-    if not GROQ_API_KEY:
+    # Thin-client mode: the service owns the API key and the index
+    if RAG_SERVICE_URL:
+        stats = collection_stats()
+        if 'error' in stats:
+            errors.append(f"❌ {stats['error']}")
+            errors.append("   Please start the service: python server.py")
+        elif stats.get('total_chunks', 0) == 0:
+            errors.append("❌ The RAG service's collection is empty.")
+        return errors
+    
+    # Check GROQ_API_KEY (only the Groq backend needs it)
+    if LLM_BACKEND == "groq" and not GROQ_API_KEY:
         errors.append("❌ GROQ_API_KEY not set. Please set it in your .env file or environment.")
     
     # Check if ChromaDB collection exists
@@ -44,7 +81,7 @@ def check_prerequisites():
         errors.append("   Please run: python ingest.py")
     else:
         # Check collection stats
-        stats = get_collection_stats()
+        stats = collection_stats()
         if 'error' in stats:
             errors.append(f"❌ ChromaDB collection '{COLLECTION_NAME}' not found.")
             errors.append("   Please run: python ingest.py")
@@ -64,15 +101,30 @@ def initialize_session_state():
         st.session_state.rag_pipeline = None
     
     if 'selected_state' not in st.session_state:
-        st.session_state.selected_state = "CA"
+        st.session_state.selected_state = None
+    
+    if 'last_ttft' not in st.session_state:
+        st.session_state.last_ttft = None
 
 
 def load_rag_pipeline():
-    """Load RAG pipeline (cached in session state)."""
+    """
+    Attach the RAG pipeline to this session.
+    
+    The pipeline and its models are loaded once per process and shared by all
+    sessions; the session only keeps a reference next to its chat history.
+    With RAG_SERVICE_URL set, the session gets a client for the remote service
+    instead and no models are loaded in this process.
+    """
     if st.session_state.rag_pipeline is None:
         with st.spinner("Loading RAG pipeline..."):
             try:
-                st.session_state.rag_pipeline = RAGPipeline()
+                if RAG_SERVICE_URL:
+                    from rag_client import RemotePipeline
+                    st.session_state.rag_pipeline = RemotePipeline(RAG_SERVICE_URL)
+                else:
+                    from registry import get_pipeline
+                    st.session_state.rag_pipeline = get_pipeline()
                 return True
             except Exception as e:
                 st.error(f"Error loading RAG pipeline: {str(e)}")
@@ -80,7 +132,15 @@ def load_rag_pipeline():
     return True
 
 
-def display_citation(citation, index):
+def render_cited_page(source_file, page_num, highlight):
+    """Render a cited page as PNG via the RAG service in thin-client mode, else locally."""
+    if RAG_SERVICE_URL:
+        return st.session_state.rag_pipeline.render_page(source_file, page_num, highlight=highlight)
+    from registry import get_page_renderer
+    return get_page_renderer().render(source_file, page_num, highlight=highlight)
+
+
+def display_citation(citation, index, key_prefix="citation"):
     """Display a single citation in an expander."""
     source = citation['source_file']
     page_start = citation['page_start']
@@ -104,13 +164,71 @@ def display_citation(citation, index):
         st.markdown(f"**Source:** {source}")
         st.markdown(f"**Pages:** {page_ref}")
         
+        also_at = citation.get('also_at')
+        if also_at:
+            locations = ", ".join(
+                f"{loc['source_file']} p.{loc['page_start']}" if loc['page_start'] == loc['page_end']
+                else f"{loc['source_file']} p.{loc['page_start']}-{loc['page_end']}"
+                for loc in also_at
+            )
+            st.markdown(f"**Same text also at:** {locations}")
+        
         if has_time and keywords:
             if isinstance(keywords, str):
                 keywords = keywords.split(',')
             st.markdown(f"**Time Keywords Found:** {', '.join(keywords)}")
         
-        st.markdown("**Excerpt:**")
+        snippet_page = citation.get('snippet_page')
+        st.markdown(f"**Excerpt (p.{snippet_page}):**" if snippet_page is not None else "**Excerpt:**")
         st.text(snippet)
+        
+        # Rendered only on request; repeat views come from the page cache
+        if st.toggle("🖼️ Show page", key=f"{key_prefix}-{index}-page"):
+            page_num = snippet_page if isinstance(snippet_page, int) else page_start
+            try:
+                image = render_cited_page(source, int(page_num), snippet)
+                st.image(image, caption=f"{source} p.{page_num}", use_container_width=True)
+            except Exception as e:
+                st.warning(f"Could not render page: {str(e)}")
+
+
+def display_trace(trace):
+    """Display the spans of a request trace as a table."""
+    depth = {}
+    rows = []
+    for span in trace['spans']:
+        depth[span['name']] = depth.get(span['parent'], -1) + 1 if span['parent'] else 0
+        rows.append({
+            'stage': "\u2003" * depth[span['name']] + span['name'],
+            'start (ms)': round(span['start_ms'], 1),
+            'duration (ms)': round(span['duration_ms'], 1),
+            'attributes': ", ".join(f"{key}={value}" for key, value in span['attributes'].items())
+        })
+    
+    with st.expander(f"🔧 Debug: Trace ({trace['duration_ms']:.0f} ms)"):
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.caption(f"Trace ID: {trace['trace_id']}")
+
+
+def format_state_answer(response):
+    """Format one state's answer from a cross-state comparison."""
+    if response.get('error'):
+        return f"❌ Error: {response['error']}"
+    return response['final_answer']
+
+
+def display_comparison(comparison, show_debug=False, key_prefix="comparison"):
+    """Display per-state answers of a cross-state comparison side by side."""
+    columns = st.columns(len(comparison))
+    for column, (state, response) in zip(columns, comparison.items()):
+        with column:
+            st.markdown(f"**{state_label(state)}**")
+            st.markdown(format_state_answer(response))
+            
+            if show_debug and response.get('citations'):
+                st.markdown("**📚 Citations:**")
+                for i, citation in enumerate(response['citations']):
+                    display_citation(citation, i, f"{key_prefix}-{state}")
 
 
 def main():
@@ -131,15 +249,22 @@ def main():
             st.text(error)
         st.stop()
     
+    # Start loading models in the background while the page renders;
+    # load_rag_pipeline below waits for this load
+    if not RAG_SERVICE_URL and PRELOAD_ON_START:
+        from registry import preload
+        preload(LLM_BACKEND)
+    
     # Sidebar
     with st.sidebar:
         st.header("⚙️ Settings")
         
-        # State selection
+        # State selection, from the states registered in the index
+        states = state_names()
         selected_state = st.selectbox(
             "Select State",
-            options=SUPPORTED_STATES,
-            format_func=lambda x: f"{x} - {STATE_NAMES[x]}",
+            options=list(states),
+            format_func=lambda x: f"{x} - {states[x]}",
             key="state_selector"
         )
         
@@ -148,6 +273,27 @@ def main():
             st.session_state.selected_state = selected_state
             st.session_state.messages = []  # Clear chat history on state change
         
+        # Cross-state comparison
+        compare_mode = st.toggle(
+            "🔀 Compare states",
+            value=False,
+            help="Ask each question across several states at once"
+        )
+        compare_states = []
+        synthesize = False
+        if compare_mode:
+            compare_states = st.multiselect(
+                "States to compare",
+                options=list(states),
+                default=list(states)[:COMPARE_DEFAULT_STATES],
+                format_func=lambda x: f"{x} - {states[x]}"
+            )
+            synthesize = st.checkbox(
+                "Summarize differences",
+                value=False,
+                help="Make one extra LLM call that compares the state answers"
+            )
+        
         st.divider()
         
         # Retrieval settings
@@ -169,10 +315,56 @@ def main():
         st.divider()
         
         # Collection info
-        stats = get_collection_stats()
+        stats = collection_stats()
         if 'total_chunks' in stats:
             st.metric("📊 Total Chunks", stats['total_chunks'])
         
+        state_stats = stats.get('states', {}).get(selected_state)
+        if state_stats:
+            st.caption(
+                f"{selected_state}: {state_stats['chunks']} chunks · "
+                f"{state_stats['time_keyword_chunks']} with time keywords · "
+                f"{state_stats['pages']} pages"
+            )
+        if stats.get('index_version'):
+            snapshot = f" · snapshot {stats['snapshot_id']}" if stats.get('snapshot_id') else ""
+            st.caption(f"Index version {stats['index_version']}{snapshot}")
+        
+        if st.session_state.last_ttft is not None:
+            st.metric("⚡ Time to First Token", f"{st.session_state.last_ttft:.2f}s")
+        
+        if show_debug and st.session_state.rag_pipeline is not None:
+            gateway = st.session_state.rag_pipeline.llm_gateway.metrics()
+            st.caption(
+                f"🚦 LLM queue: {gateway['queue_depth']} waiting · "
+                f"{gateway['in_flight']} in flight · "
+                f"avg wait {gateway['wait_avg']:.2f}s · "
+                f"circuit {gateway['circuit_state']}"
+            )
+            
+            with st.expander("📈 Metrics"):
+                # In thin-client mode the pipeline, and so its metrics and
+                # traces, live in the service
+                if RAG_SERVICE_URL:
+                    prometheus_text = st.session_state.rag_pipeline.prometheus_metrics()
+                    traces_jsonl = st.session_state.rag_pipeline.traces_jsonl()
+                else:
+                    prometheus_text = METRICS.to_prometheus()
+                    traces_jsonl = export_traces_jsonl()
+                st.code(prometheus_text, language="text")
+                st.download_button(
+                    "Download Prometheus metrics",
+                    data=prometheus_text,
+                    file_name="metrics.prom",
+                    use_container_width=True
+                )
+                st.download_button(
+                    "Download traces (JSON lines)",
+                    data=traces_jsonl,
+                    file_name="traces.jsonl",
+                    use_container_width=True
+                )
+        
         st.divider()
         
         # Clear chat button
@@ -185,21 +377,41 @@ def main():
         st.stop()
     
     # Main chat interface
-    st.subheader(f"💬 {STATE_NAMES[selected_state]} ({selected_state})")
+    if compare_mode:
+        if not compare_states:
+            st.info("Select at least one state to compare.")
+            st.stop()
+        st.subheader(f"💬 Comparing {', '.join(compare_states)}")
+    else:
+        st.subheader(f"💬 {state_label(selected_state)}")
     
     # Display chat history
-    for message in st.session_state.messages:
+    for message_index, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
+            if "comparison" in message:
+                display_comparison(message["comparison"], show_debug, f"message{message_index}")
             st.markdown(message["content"])
             
             # Display citations and debug info only if debug mode is enabled
             if message["role"] == "assistant" and show_debug:
+                # Display latency metrics
+                metrics = message.get("metrics")
+                if metrics:
+                    st.caption(
+                        f"⏱️ First token: {metrics['time_to_first_token']:.2f}s · "
+                        f"Retrieval: {metrics['retrieval_time']:.2f}s · "
+                        f"Total: {metrics['total_time']:.2f}s"
+                    )
+                
+                if "trace" in message:
+                    display_trace(message["trace"])
+                
                 # Display citations
                 if "citations" in message and message["citations"]:
                     st.markdown("---")
                     st.markdown("**📚 Citations:**")
                     for i, citation in enumerate(message["citations"]):
-                        display_citation(citation, i)
+                        display_citation(citation, i, f"message{message_index}")
                 
                 # Display debug info
                 if "debug_chunks" in message:
@@ -211,48 +423,108 @@ def main():
     
     # Helper function to process questions
     def process_question(question_text):
-        """Process a user question and generate response."""
+        """Process a user question, rendering the answer as it streams in."""
+        placeholder = st.empty()
+        placeholder.markdown("_Searching manual and generating answer..._")
+        
         try:
-            # Query RAG pipeline
-            response = st.session_state.rag_pipeline.answer_question(
+            # Stream from RAG pipeline
+            answer = ""
+            response = None
+            for event in st.session_state.rag_pipeline.stream_answer(
                 state=selected_state,
                 question=question_text,
                 k=top_k,
                 return_debug=show_debug
-            )
+            ):
+                if event['type'] == 'token':
+                    answer += event['content']
+                    placeholder.markdown(answer + "▌")
+                elif event['type'] == 'done':
+                    response = event['response']
             
             # Extract data
             answer = response['final_answer']
             citations = response.get('citations', [])
+            metrics = response.get('metrics', {})
+            placeholder.markdown(answer)
             
             # Add assistant message to chat
             message_data = {
                 "role": "assistant",
                 "content": answer,
-                "citations": citations
+                "citations": citations,
+                "metrics": metrics
             }
             
             if show_debug and 'retrieved_chunks' in response:
                 message_data['debug_chunks'] = response['retrieved_chunks']
             
+            if show_debug and 'trace' in response:
+                message_data['trace'] = response['trace']
+            
             st.session_state.messages.append(message_data)
+            if 'time_to_first_token' in metrics:
+                st.session_state.last_ttft = metrics['time_to_first_token']
             
         except Exception as e:
             error_msg = f"❌ Error: {str(e)}"
+            placeholder.markdown(error_msg)
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": error_msg
             })
     
+    # Helper function to process cross-state questions
+    def process_comparison(question_text):
+        """Process a user question for several states, filling columns as answers arrive."""
+        placeholders = {}
+        for column, state in zip(st.columns(len(compare_states)), compare_states):
+            with column:
+                st.markdown(f"**{state_label(state)}**")
+                placeholders[state] = st.empty()
+                placeholders[state].markdown("_Searching manual..._")
+        
+        try:
+            comparison = {}
+            for state, response in st.session_state.rag_pipeline.iter_compare_states(
+                states=compare_states,
+                question=question_text,
+                k=top_k,
+                return_debug=show_debug
+            ):
+                comparison[state] = response
+                placeholders[state].markdown(format_state_answer(response))
+            
+            synthesis = ""
+            if synthesize:
+                with st.spinner("Comparing states..."):
+                    synthesis = st.session_state.rag_pipeline.synthesize_comparison(
+                        question_text, comparison
+                    )
+            
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": synthesis,
+                "comparison": {state: comparison[state] for state in compare_states}
+            })
+            
+        except Exception as e:
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": f"❌ Error: {str(e)}"
+            })
+    
+    handle_question = process_comparison if compare_mode else process_question
+    
     # Check if there's a pending question from suggested questions
     if len(st.session_state.messages) > 0 and st.session_state.messages[-1]["role"] == "user":
         last_message = st.session_state.messages[-1]["content"]
         # Check if this is a new question that hasn't been answered yet
         if len(st.session_state.messages) == 1 or st.session_state.messages[-2]["role"] != "assistant":
             with st.chat_message("assistant"):
-                with st.spinner("Searching manual and generating answer..."):
-                    process_question(last_message)
-                    st.rerun()
+                handle_question(last_message)
+                st.rerun()
     
     # Chat input
     if prompt := st.chat_input("Ask a question about maintenance policies..."):
@@ -265,9 +537,8 @@ def main():
         
         # Get response from RAG pipeline
         with st.chat_message("assistant"):
-            with st.spinner("Searching manual and generating answer..."):
-                process_question(prompt)
-                st.rerun()
+            handle_question(prompt)
+            st.rerun()
     
     # Suggested questions (only show if chat is empty)
     if not st.session_state.messages:
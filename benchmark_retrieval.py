@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality and speed benchmark against the versioned gold question set.
+Computes recall@k, MRR and nDCG@k (page-level relevance) plus query latency
+for every retrieval mode, and optionally fails on regressions against a
+baseline run. A routing report compares the query intent classifier with
+keyword routing: accuracy on the labeled intent set, and what each routing
+costs in retrieval latency and quality.
+
+Usage:
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --modes dense merged_mmr --k 5
+    python benchmark_retrieval.py --baseline data/benchmarks/results/retrieval-baseline.json
+    python benchmark_retrieval.py --modes dense --vector-modes float32 int8 binary pca truncate
+    python benchmark_retrieval.py --intent-set v1
+"""
+import argparse
+import json
+import math
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from config import DATA_DIR, DEFAULT_TOP_K
+from chunking import parse_locations
+from compact_vectors import MODES as COMPACT_MODES
+from loadtest import percentile
+
+
+GOLD_DIR = DATA_DIR / "benchmarks" / "gold"
+RESULTS_DIR = DATA_DIR / "benchmarks" / "results"
+INTENT_SET_DIR = DATA_DIR / "benchmarks" / "intents"
+DEFAULT_GOLD_VERSION = "v1"
+DEFAULT_INTENT_SET = "v1"
+
+# Retrieval modes: name -> keyword arguments for RAGPipeline.retrieve_chunks
+RETRIEVAL_MODES = {
+    'dense': {'boost_time_keywords': False, 'merge_adjacent': False, 'route_sections': False},
+    'time_boost': {'boost_time_keywords': True, 'merge_adjacent': False, 'route_sections': False},
+    'merged_mmr': {'boost_time_keywords': True, 'merge_adjacent': True, 'route_sections': False},
+    'section_routed': {'boost_time_keywords': True, 'merge_adjacent': False, 'route_sections': True},
+}
+
+# Substring check retrieval routed time questions with before the intent
+# classifier; kept as the routing baseline
+KEYWORD_TIME_INDICATORS = ("night", "day", "time", "hours", "off-peak", "curfew", "lane closure", "when", "schedule")
+
+
+def load_gold_set(version: str, states: List[str] = None) -> Dict[str, List[Dict[str, any]]]:
+    """
+    Load the gold questions for a gold-set version.
+
+    Args:
+        version: Gold-set version folder (e.g. v1)
+        states: State codes to load (default: every state file in the folder)
+
+    Returns:
+        Mapping of state code to list of gold question dictionaries
+    """
+    gold_dir = GOLD_DIR / version
+    if not gold_dir.exists():
+        raise FileNotFoundError(f"Gold set not found: {gold_dir}")
+
+    gold = {}
+    for path in sorted(gold_dir.glob("*.jsonl")):
+        state = path.stem.upper()
+        if states and state not in states:
+            continue
+        with open(path, encoding="utf-8") as f:
+            gold[state] = [json.loads(line) for line in f if line.strip()]
+    return gold
+
+
+def chunk_pages(chunk: Dict[str, any]) -> set:
+    """Get the set of pages a retrieved chunk covers, including those of near-duplicates folded into it."""
+    metadata = chunk['metadata']
+    pages = set(range(int(metadata['page_start']), int(metadata['page_end']) + 1))
+    for location in parse_locations(metadata.get('duplicate_locations')):
+        pages.update(range(location['page_start'], location['page_end'] + 1))
+    return pages
+
+
+def score_ranking(chunks: List[Dict[str, any]], expected_pages: List[int], relevant_in_index: int,
+                  k: int) -> Dict[str, float]:
+    """
+    Score one ranked result list against the expected pages.
+
+    A retrieved chunk is relevant if it covers at least one expected page.
+
+    Args:
+        chunks: Retrieved chunks, best first
+        expected_pages: Pages that answer the question
+        relevant_in_index: Number of indexed chunks covering an expected page (for ideal DCG)
+        k: Number of chunks requested; the ideal ranking fills all k slots even
+            when fewer chunks came back, so short result lists are not rewarded
+
+    Returns:
+        Dictionary with recall, mrr and ndcg
+    """
+    expected = set(expected_pages)
+    covered = set()
+    reciprocal_rank = 0.0
+    dcg = 0.0
+
+    for rank, chunk in enumerate(chunks, 1):
+        hits = chunk_pages(chunk) & expected
+        if not hits:
+            continue
+        covered |= hits
+        if reciprocal_rank == 0.0:
+            reciprocal_rank = 1.0 / rank
+        dcg += 1.0 / math.log2(rank + 1)
+
+    ideal_hits = max(1, min(k, relevant_in_index))
+    idcg = sum(1.0 / math.log2(rank + 1) for rank in range(1, ideal_hits + 1))
+
+    return {
+        'recall': len(covered) / len(expected) if expected else 0.0,
+        'mrr': reciprocal_rank,
+        'ndcg': min(1.0, dcg / idcg)
+    }
+
+
+def count_relevant_chunks(index_pages: List[set], expected_pages: List[int]) -> int:
+    """Count indexed chunks that cover at least one expected page."""
+    expected = set(expected_pages)
+    return sum(1 for pages in index_pages if pages & expected)
+
+
+def load_index_pages(pipeline, state: str) -> List[set]:
+    """Get the page set of every retrievable chunk for a state (parents, for a hierarchical index)."""
+    if pipeline.hierarchy is not None:
+        metadatas = [entry['metadata'] for entry in pipeline.hierarchy.values() if entry['metadata']['state'] == state]
+    else:
+        collection = pipeline.state_collection(state)
+        if collection is None:
+            return []
+        metadatas = collection.get(where={"state": state}, include=['metadatas'])['metadatas']
+    return [chunk_pages({'metadata': metadata}) for metadata in metadatas]
+
+
+def run_mode(pipeline, mode: str, gold: Dict[str, List[Dict[str, any]]], k: int,
+             index_pages: Dict[str, List[set]]) -> Dict[str, any]:
+    """
+    Evaluate one retrieval mode over the whole gold set.
+
+    Returns:
+        Dictionary with aggregate metrics, latency statistics and per-question rows
+    """
+    kwargs = RETRIEVAL_MODES[mode]
+    rows = []
+    latencies = []
+
+    for state, questions in gold.items():
+        for item in questions:
+            start = time.perf_counter()
+            chunks = pipeline.retrieve_chunks(query=item['question'], state=state, k=k, **kwargs)
+            latency = time.perf_counter() - start
+            latencies.append(latency)
+
+            relevant = count_relevant_chunks(index_pages[state], item['expected_pages'])
+            scores = score_ranking(chunks, item['expected_pages'], relevant, k)
+            rows.append({
+                'id': item['id'],
+                'state': state,
+                'latency': latency,
+                'retrieved_pages': [
+                    [c['metadata']['page_start'], c['metadata']['page_end']] for c in chunks
+                ],
+                'retrieved_ids': [c['id'] for c in chunks],
+                **scores
+            })
+
+    count = len(rows)
+    return {
+        'questions': count,
+        f'recall@{k}': sum(r['recall'] for r in rows) / count if count else 0.0,
+        'mrr': sum(r['mrr'] for r in rows) / count if count else 0.0,
+        f'ndcg@{k}': sum(r['ndcg'] for r in rows) / count if count else 0.0,
+        'latency_mean': sum(latencies) / count if count else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'per_question': rows
+    }
+
+
+def run_vector_modes(pipeline, vector_modes: List[str], gold: Dict[str, List[Dict[str, any]]], k: int,
+                     index_pages: Dict[str, List[set]]) -> Dict[str, Dict[str, any]]:
+    """
+    Compare compact vector storage against the float32 path on the dense mode.
+
+    Each compact index is built in a temporary directory from the vectors in
+    the collection (per gold-set state, for a sharded index). Besides gold-set
+    quality and latency, every mode reports the memory held for vector search
+    and the overlap of its top-k with the float32 top-k (how often it finds the
+    same chunks).
+
+    Returns:
+        Mapping of vector mode to metrics (per-question rows omitted)
+    """
+    from compact_vectors import build_compact_index, load_collection_vectors
+
+    # One set of vectors per state shard, or one for an unsharded index
+    states = [state for state in gold if pipeline.state_collection(state) is not None] if pipeline.sharded else [None]
+    vectors = {state: load_collection_vectors(pipeline.state_collection(state)) for state in states}
+    float_bytes = sum(embeddings.nbytes for _, _, embeddings in vectors.values())
+    saved_indexes = {state: pipeline.set_compact_index(None, state) for state in states}
+
+    reference = run_mode(pipeline, 'dense', gold, k, index_pages)
+    reference_ids = [set(row['retrieved_ids']) for row in reference['per_question']]
+
+    results = {}
+    try:
+        for vector_mode in vector_modes:
+            print(f"Running vector mode: {vector_mode}")
+            if vector_mode == 'float32':
+                result, memory = reference, float_bytes
+            else:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    memory = 0
+                    for state, (ids, metadatas, embeddings) in vectors.items():
+                        index = build_compact_index(
+                            ids, metadatas, embeddings, vector_mode, Path(tmp_dir) / (state or "all")
+                        )
+                        pipeline.set_compact_index(index, state)
+                        memory += index.memory_bytes()
+                    result = run_mode(pipeline, 'dense', gold, k, index_pages)
+                    for state in states:
+                        pipeline.set_compact_index(None, state)
+
+            overlaps = [
+                len(set(row['retrieved_ids']) & expected) / len(expected) if expected else 1.0
+                for row, expected in zip(result['per_question'], reference_ids)
+            ]
+            results[vector_mode] = {
+                **{key: value for key, value in result.items() if key != 'per_question'},
+                'memory_bytes': memory,
+                'memory_ratio': memory / float_bytes if float_bytes else 0.0,
+                f'float_overlap@{k}': sum(overlaps) / len(overlaps) if overlaps else 0.0
+            }
+    finally:
+        for state, index in saved_indexes.items():
+            pipeline.set_compact_index(index, state)
+    return results
+
+
+def keyword_intent(question: str) -> str:
+    """Get a question's intent by keyword routing (the baseline)."""
+    lowered = question.lower()
+    return "time" if any(indicator in lowered for indicator in KEYWORD_TIME_INDICATORS) else "general"
+
+
+def routing_accuracy(predicted: List[str], labels: List[str]) -> Dict[str, any]:
+    """
+    Score predicted intents against labeled intents.
+
+    Returns:
+        Dictionary with accuracy, the share of questions routed to the time
+        strategy and a confusion matrix ({label: {predicted: count}})
+    """
+    confusion = {}
+    for label, intent in zip(labels, predicted):
+        row = confusion.setdefault(label, {})
+        row[intent] = row.get(intent, 0) + 1
+    count = len(labels)
+    return {
+        'accuracy': sum(1 for label, intent in zip(labels, predicted) if label == intent) / count if count else 0.0,
+        'time_routed': sum(1 for intent in predicted if intent == "time") / count if count else 0.0,
+        'confusion': confusion
+    }
+
+
+def load_intent_set(version: str) -> List[Dict[str, any]]:
+    """
+    Load the labeled intent questions of an intent-set version.
+
+    Args:
+        version: Intent-set version (file name without .jsonl, e.g. v1)
+
+    Returns:
+        List of question dictionaries (id, question, intent)
+    """
+    path = INTENT_SET_DIR / f"{version}.jsonl"
+    if not path.exists():
+        raise FileNotFoundError(f"Intent set not found: {path}")
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_intent_routing(pipeline, questions: List[Dict[str, any]], state: str,
+                       gold: Dict[str, List[Dict[str, any]]], k: int,
+                       index_pages: Dict[str, List[set]]) -> Dict[str, any]:
+    """
+    Compare the intent classifier with keyword routing.
+
+    Both routings are scored against the labeled intent set. Retrieval
+    (time_boost mode) is then run with each routing's intents on the same
+    precomputed embeddings, so differences come from routing alone: the
+    intent-set questions against one state give the latency, and the gold
+    questions give recall and MRR.
+
+    Args:
+        pipeline: RAG pipeline
+        questions: Labeled intent questions (see load_intent_set)
+        state: State the intent-set questions are retrieved from
+        gold: Gold questions per state
+        k: Retrieval cutoff
+        index_pages: Page sets of the indexed chunks per state
+
+    Returns:
+        Dictionary with per-routing metrics and per-question rows
+    """
+    labels = [item['intent'] for item in questions]
+    embeddings = pipeline._embed_queries([item['question'] for item in questions])
+    gold_items = [(gold_state, item) for gold_state, items in gold.items() for item in items]
+    gold_embeddings = pipeline._embed_queries([item['question'] for _, item in gold_items])
+
+    # One query at a time, as questions arrive when serving
+    classifier = pipeline.intent_classifier
+    classify_latencies = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        classifier.classify([embedding])
+        classify_latencies.append(time.perf_counter() - start)
+
+    routings = {
+        'classifier': (classifier.classify(embeddings), classifier.classify(gold_embeddings)),
+        'keyword': (
+            [keyword_intent(item['question']) for item in questions],
+            [keyword_intent(item['question']) for _, item in gold_items]
+        )
+    }
+    report = {'questions': len(questions), 'state': state, 'gold_questions': len(gold_items), 'routings': {}}
+    for name, (intents, gold_intents) in routings.items():
+        latencies = []
+        for item, embedding, intent in zip(questions, embeddings, intents):
+            start = time.perf_counter()
+            pipeline._retrieve_batch(
+                [item['question']], [embedding], state, k=k, intents=[intent], **RETRIEVAL_MODES['time_boost']
+            )
+            latencies.append(time.perf_counter() - start)
+
+        rows = []
+        for (gold_state, item), embedding, intent in zip(gold_items, gold_embeddings, gold_intents):
+            chunks = pipeline._retrieve_batch(
+                [item['question']], [embedding], gold_state, k=k, intents=[intent], **RETRIEVAL_MODES['time_boost']
+            )[0]
+            relevant = count_relevant_chunks(index_pages[gold_state], item['expected_pages'])
+            rows.append(score_ranking(chunks, item['expected_pages'], relevant, k))
+
+        count = len(rows)
+        report['routings'][name] = {
+            **routing_accuracy(intents, labels),
+            'latency_mean': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p95': percentile(latencies, 95),
+            f'recall@{k}': sum(r['recall'] for r in rows) / count if count else 0.0,
+            'mrr': sum(r['mrr'] for r in rows) / count if count else 0.0
+        }
+    report['routings']['classifier']['classify_latency_mean'] = (
+        sum(classify_latencies) / len(classify_latencies) if classify_latencies else 0.0
+    )
+
+    report['per_question'] = [
+        {'id': item['id'], 'intent': item['intent'], **{name: intents[i] for name, (intents, _) in routings.items()}}
+        for i, item in enumerate(questions)
+    ]
+    return report
+
+
+def print_intent_table(report: Dict[str, any], k: int):
+    """Print intent routing accuracy, retrieval latency and quality per routing."""
+    print(
+        f"Intent routing: accuracy and latency on {report['questions']} labeled questions ({report['state']}), "
+        f"recall/MRR on {report['gold_questions']} gold questions (time_boost mode)"
+    )
+    print(
+        f"{'Routing':<11} {'Accuracy':>8} {'Time':>6} {'recall@' + str(k):>10} {'MRR':>7} "
+        f"{'mean':>9} {'p95':>9} {'Classify':>10}"
+    )
+    for name, result in report['routings'].items():
+        classify = result.get('classify_latency_mean')
+        print(
+            f"{name:<11} {result['accuracy']:>8.1%} {result['time_routed']:>6.1%} {result[f'recall@{k}']:>10.3f} "
+            f"{result['mrr']:>7.3f} {result['latency_mean'] * 1000:>7.1f}ms {result['latency_p95'] * 1000:>7.1f}ms "
+            f"{f'{classify * 1e6:.0f}us' if classify is not None else '-':>10}"
+        )
+    for name, result in report['routings'].items():
+        cells = ", ".join(
+            f"{label}->{intent}: {count}"
+            for label, row in sorted(result['confusion'].items())
+            for intent, count in sorted(row.items())
+        )
+        print(f"  {name} confusion (label->routed): {cells}")
+
+
+def print_vector_table(results: Dict[str, Dict[str, any]], k: int):
+    """Print per-vector-mode memory, quality and latency as a table."""
+    print(
+        f"{'Vectors':<10} {'Memory':>10} {'vs f32':>7} {'recall@' + str(k):>10} "
+        f"{'overlap@' + str(k):>11} {'p50':>9} {'p95':>9}"
+    )
+    for mode, result in results.items():
+        print(
+            f"{mode:<10} {result['memory_bytes'] / 1e6:>8.2f}MB {result['memory_ratio']:>7.1%} "
+            f"{result[f'recall@{k}']:>10.3f} {result[f'float_overlap@{k}']:>11.3f} "
+            f"{result['latency_p50'] * 1000:>7.1f}ms {result['latency_p95'] * 1000:>7.1f}ms"
+        )
+
+
+def print_table(results: Dict[str, Dict[str, any]], k: int):
+    """Print per-mode metrics as a table."""
+    print(f"{'Mode':<16} {'recall@' + str(k):>10} {'MRR':>7} {'nDCG@' + str(k):>9} {'p50':>9} {'p95':>9}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<16} {result[f'recall@{k}']:>10.3f} {result['mrr']:>7.3f} {result[f'ndcg@{k}']:>9.3f} "
+            f"{result['latency_p50'] * 1000:>7.1f}ms {result['latency_p95'] * 1000:>7.1f}ms"
+        )
+
+
+def find_regressions(results: Dict[str, Dict[str, any]], baseline: Dict[str, Dict[str, any]], k: int,
+                     max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        results: Per-mode results of this run
+        baseline: Per-mode results of the baseline run
+        k: Cutoff used for recall and nDCG
+        max_quality_drop: Largest allowed absolute drop in recall, MRR or nDCG
+        max_latency_increase: Largest allowed relative increase in p95 latency
+
+    Returns:
+        List of human-readable regression descriptions
+    """
+    regressions = []
+    for mode, result in results.items():
+        base = baseline.get(mode)
+        if base is None:
+            continue
+        for metric in (f'recall@{k}', 'mrr', f'ndcg@{k}'):
+            if metric in base and base[metric] - result[metric] > max_quality_drop:
+                regressions.append(f"{mode}: {metric} {base[metric]:.3f} -> {result[metric]:.3f}")
+        if base.get('latency_p95') and result['latency_p95'] > base['latency_p95'] * (1 + max_latency_increase):
+            regressions.append(
+                f"{mode}: p95 latency {base['latency_p95'] * 1000:.1f}ms -> {result['latency_p95'] * 1000:.1f}ms"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and speed")
+    parser.add_argument("--gold-version", default=DEFAULT_GOLD_VERSION, help="Gold-set version folder")
+    parser.add_argument("--states", nargs="*", default=None, help="States to evaluate (default: all in the gold set)")
+    parser.add_argument("--modes", nargs="*", default=list(RETRIEVAL_MODES), choices=list(RETRIEVAL_MODES))
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K, help="Retrieval cutoff")
+    parser.add_argument(
+        "--vector-modes", nargs="*", default=[], choices=("float32",) + COMPACT_MODES,
+        help="Also compare compact vector storage with the float32 path (dense mode)"
+    )
+    parser.add_argument("--intent-set", default=DEFAULT_INTENT_SET, help="Labeled intent-set version for the routing report")
+    parser.add_argument("--output", type=Path, default=None, help="JSON results path")
+    parser.add_argument("--baseline", type=Path, default=None, help="Baseline JSON results to compare against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02, help="Allowed absolute drop in recall/MRR/nDCG")
+    parser.add_argument("--max-latency-increase", type=float, default=0.25, help="Allowed relative increase in p95 latency")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the retrieval benchmark."""
+    args = parse_args(argv)
+
+    print("=" * 70)
+    print("RETRIEVAL BENCHMARK")
+    print("=" * 70)
+    print()
+
+    gold = load_gold_set(args.gold_version, args.states)
+    if not gold:
+        print(f"❌ Error: No gold questions found for version {args.gold_version}")
+        sys.exit(1)
+    for state, questions in gold.items():
+        print(f"📋 {state}: {len(questions)} gold questions ({args.gold_version})")
+    print()
+
+    from rag import RAGPipeline
+
+    # Only retrieval is measured; the fake backend avoids needing an API key
+    pipeline = RAGPipeline(llm_backend="fake")
+    index_pages = {state: load_index_pages(pipeline, state) for state in gold}
+
+    # Warm up the embedding model so the first query is not an outlier
+    first_state = next(iter(gold))
+    pipeline.retrieve_chunks(query=gold[first_state][0]['question'], state=first_state, k=args.k)
+
+    results = {}
+    for mode in args.modes:
+        print(f"Running mode: {mode}")
+        results[mode] = run_mode(pipeline, mode, gold, args.k, index_pages)
+    print()
+
+    vector_results = {}
+    if args.vector_modes:
+        if pipeline.doc_store is None:
+            print("⚠ Compact vectors need the chunk-text store; re-run ingest.py to compare vector modes")
+        else:
+            vector_results = run_vector_modes(pipeline, args.vector_modes, gold, args.k, index_pages)
+            print()
+
+    print(f"Running intent routing ({args.intent_set})")
+    intent_report = run_intent_routing(
+        pipeline, load_intent_set(args.intent_set), first_state, gold, args.k, index_pages
+    )
+    print()
+
+    print("RESULTS")
+    print("-" * 70)
+    print_table(results, args.k)
+    if vector_results:
+        print()
+        print_vector_table(vector_results, args.k)
+    if intent_report:
+        print()
+        print_intent_table(intent_report, args.k)
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"retrieval-{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'gold_version': args.gold_version,
+        'k': args.k,
+        'modes': results,
+        'vector_modes': vector_results,
+        'intent_set': args.intent_set,
+        'intent_routing': intent_report
+    }, indent=2), encoding="utf-8")
+    print()
+    print(f"✓ Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get('k') != args.k or baseline.get('gold_version') != args.gold_version:
+            print("⚠ Baseline used a different k or gold version; comparison may be meaningless")
+        regressions = find_regressions(
+            results, baseline.get('modes', {}), args.k,
+            args.max_quality_drop, args.max_latency_increase
+        )
+        print()
+        if regressions:
+            print("❌ REGRESSIONS against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for concurrent app sessions.
+Simulates N browser sessions in one process and reports resident memory and
+per-session cold-start time, comparing one set of models per session (the
+previous app behaviour) with the shared process-wide registry.
+
+Each mode runs in a fresh subprocess so the measurements do not interfere.
+
+Usage:
+    python benchmark_sessions.py
+    python benchmark_sessions.py --sessions 1 10 50 --modes shared
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from config import DATA_DIR, DEFAULT_TOP_K
+from loadtest import peak_rss_mb
+
+
+RESULTS_DIR = DATA_DIR / "benchmarks" / "results"
+MODES = ['per_session', 'shared']
+RESULT_PREFIX = "RESULT "
+SAMPLE_QUESTION = "What are the requirements for nighttime lane closures?"
+
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process in MB (peak RSS where unavailable)."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def create_isolated_session(backend: str, state: str) -> Dict[str, any]:
+    """
+    Create a session that loads its own embedding model, Chroma client and
+    LLM client, as every browser session did before the shared registry.
+    """
+    import chromadb
+    from chromadb.config import Settings
+    from sentence_transformers import SentenceTransformer
+    from config import CHROMA_DIR, EMBED_MODEL
+    from index_manifest import read_manifest
+    from llm_backends import create_llm
+    from state_registry import state_collection_name
+
+    session = {
+        'messages': [],
+        'embedding_model': SentenceTransformer(EMBED_MODEL),
+        'chroma_client': chromadb.PersistentClient(
+            path=str(CHROMA_DIR),
+            settings=Settings(anonymized_telemetry=False)
+        ),
+        'llm': create_llm(backend)
+    }
+    collection = session['chroma_client'].get_collection(name=state_collection_name(read_manifest(), state))
+    collection.query(
+        query_embeddings=[session['embedding_model'].encode(SAMPLE_QUESTION).tolist()],
+        n_results=DEFAULT_TOP_K,
+        where={"state": state}
+    )
+    return session
+
+
+def create_shared_session(backend: str, state: str) -> Dict[str, any]:
+    """Create a session that only holds chat state and a reference to the shared pipeline."""
+    from registry import get_pipeline
+
+    session = {
+        'messages': [],
+        'rag_pipeline': get_pipeline(backend)
+    }
+    session['rag_pipeline'].retrieve_chunks(query=SAMPLE_QUESTION, state=state, k=DEFAULT_TOP_K)
+    return session
+
+
+def run_worker(mode: str, checkpoints: List[int], backend: str, state: str, max_rss_mb: float) -> Dict[str, any]:
+    """
+    Create sessions one by one and record memory at each checkpoint.
+
+    Returns:
+        Dictionary with the baseline RSS and one row per reached checkpoint
+    """
+    create_session = create_isolated_session if mode == 'per_session' else create_shared_session
+    baseline = current_rss_mb()
+    sessions = []
+    start_times = []
+    rows = []
+    stopped = None
+
+    for count in range(1, max(checkpoints) + 1):
+        start = time.perf_counter()
+        sessions.append(create_session(backend, state))
+        start_times.append(time.perf_counter() - start)
+
+        rss = current_rss_mb()
+        if count in checkpoints:
+            rows.append({
+                'sessions': count,
+                'rss_mb': rss,
+                'mb_per_session': (rss - baseline) / count,
+                'first_session_start': start_times[0],
+                'mean_session_start': sum(start_times) / len(start_times)
+            })
+        if rss > max_rss_mb:
+            stopped = f"RSS limit of {max_rss_mb:.0f} MB reached after {count} sessions"
+            break
+
+    return {'mode': mode, 'baseline_rss_mb': baseline, 'checkpoints': rows, 'stopped': stopped}
+
+
+def run_mode(mode: str, args) -> Dict[str, any]:
+    """Run one mode in a fresh Python process and parse its result."""
+    command = [
+        sys.executable, __file__, "--worker", mode,
+        "--sessions", *[str(n) for n in args.sessions],
+        "--backend", args.backend,
+        "--state", args.state,
+        "--max-rss-mb", str(args.max_rss_mb)
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{mode} worker failed:\n{completed.stderr.strip()}")
+
+
+def print_table(results: Dict[str, Dict[str, any]]):
+    """Print memory per mode and session count."""
+    print(f"{'Mode':<14} {'Sessions':>8} {'RSS':>10} {'MB/session':>11} {'Start (mean)':>13}")
+    for mode, result in results.items():
+        for row in result['checkpoints']:
+            print(
+                f"{mode:<14} {row['sessions']:>8} {row['rss_mb']:>8.0f}MB "
+                f"{row['mb_per_session']:>11.1f} {row['mean_session_start']:>12.2f}s"
+            )
+        if result['stopped']:
+            print(f"{mode:<14} stopped: {result['stopped']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark memory use of concurrent app sessions")
+    parser.add_argument("--sessions", nargs="*", type=int, default=[1, 10, 50], help="Session counts to measure")
+    parser.add_argument("--modes", nargs="*", default=MODES, choices=MODES)
+    parser.add_argument("--backend", default="fake", help="LLM backend each session loads")
+    parser.add_argument("--state", default="TX", help="State code for the warm-up query")
+    parser.add_argument("--max-rss-mb", type=float, default=16000, help="Stop a mode once its RSS exceeds this")
+    parser.add_argument("--output", type=Path, default=None, help="JSON results path")
+    parser.add_argument("--worker", choices=MODES, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the session memory benchmark."""
+    args = parse_args(argv)
+    checkpoints = sorted(set(args.sessions))
+
+    if args.worker:
+        result = run_worker(args.worker, checkpoints, args.backend, args.state, args.max_rss_mb)
+        print(RESULT_PREFIX + json.dumps(result))
+        return
+
+    print("=" * 70)
+    print("SESSION MEMORY BENCHMARK")
+    print("=" * 70)
+    print()
+
+    results = {}
+    for mode in args.modes:
+        print(f"Running mode: {mode} ({', '.join(str(n) for n in checkpoints)} sessions)")
+        results[mode] = run_mode(mode, args)
+    print()
+
+    print("RESULTS")
+    print("-" * 70)
+    print_table(results)
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"sessions-{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'backend': args.backend,
+        'modes': results
+    }, indent=2), encoding="utf-8")
+    print()
+    print(f"✓ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Persisted parent/child links for hierarchical chunking.
+
+Child passages are stored in Chroma with their parent_id in the metadata; this
+file holds the other direction (parent -> children) together with each
+parent's metadata, so retrieval can return parents without querying Chroma
+for them. Parent texts live in the chunk-text store (doc_store.py).
+
+Updates merge by parent ID, so documents can be added or re-chunked one at a
+time without rewriting the links of the others.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import CHUNK_HIERARCHY_PATH
+from chunking import chunk_metadata
+
+
+HIERARCHY_FORMAT = 1
+
+
+def read_hierarchy(path: Path = CHUNK_HIERARCHY_PATH) -> Optional[Dict[str, Dict[str, any]]]:
+    """
+    Read the parent/child links.
+
+    Args:
+        path: Hierarchy file path
+
+    Returns:
+        Mapping of parent ID to {'children': [child IDs], 'metadata': {...}},
+        or None if the index was not built with hierarchical chunking
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get('format') != HIERARCHY_FORMAT:
+        return None
+    return data['parents']
+
+
+def update_hierarchy(
+    parents: List[Dict[str, any]],
+    path: Path = CHUNK_HIERARCHY_PATH,
+    replace_sources: bool = True
+) -> Dict[str, Dict[str, any]]:
+    """
+    Add parent chunks to the hierarchy file, written atomically.
+
+    Args:
+        parents: Parent chunk dictionaries (with child_ids) from chunk_document_pages
+        path: Hierarchy file path
+        replace_sources: Drop existing parents of the same source files first,
+            so re-chunking a document leaves no stale links
+
+    Returns:
+        The updated mapping
+    """
+    hierarchy = read_hierarchy(path) or {}
+
+    if replace_sources:
+        sources = {parent['source_file'] for parent in parents}
+        hierarchy = {
+            parent_id: entry
+            for parent_id, entry in hierarchy.items()
+            if entry['metadata']['source_file'] not in sources
+        }
+
+    for parent in parents:
+        hierarchy[parent['id']] = {
+            'children': parent['child_ids'],
+            'metadata': chunk_metadata(parent)
+        }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps({'format': HIERARCHY_FORMAT, 'parents': hierarchy}), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return hierarchy
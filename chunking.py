@@ -1,9 +1,18 @@
 """
 Text chunking utilities with keyword tagging for maintenance manuals.
 """
+from bisect import bisect_right
 from typing import List, Dict, Tuple
+import hashlib
 import re
-from config import CHUNK_SIZE, CHUNK_OVERLAP_CHARS, TIME_KEYWORDS
+from config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP_CHARS,
+    CHILD_CHUNK_SIZE,
+    CHILD_CHUNK_OVERLAP_CHARS,
+    HIERARCHICAL_CHUNKING,
+    TIME_KEYWORDS
+)
 
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
@@ -102,26 +111,143 @@ def create_chunk_id(state: str, source_file: str, page_start: int, page_end: int
     return f"{state}:{source_file}:{page_start}-{page_end}:{chunk_index}"
 
 
+def create_section_id(state: str, source_file: str, section_path: List[str]) -> str:
+    """
+    Create a stable ID for a document section.
+    
+    Args:
+        state: State code
+        source_file: Source PDF filename
+        section_path: Section titles from the outermost level inwards
+        
+    Returns:
+        Section ID string
+    """
+    digest = hashlib.sha1(" > ".join(section_path).encode("utf-8")).hexdigest()[:8]
+    return f"{state}:{source_file}:s{digest}"
+
+
+def slice_page_offsets(
+    page_offsets: List[Tuple[int, int]],
+    start: int,
+    end: int
+) -> List[Tuple[int, int]]:
+    """
+    Map a span of text to the pages it comes from.
+    
+    Args:
+        page_offsets: (page number, character offset) of every page in the
+            text, in order
+        start: Start of the span
+        end: End of the span (exclusive)
+        
+    Returns:
+        (page number, character offset relative to start) of every page the
+        span touches; the first page is at offset 0
+    """
+    offsets = [offset for _, offset in page_offsets]
+    first = max(0, bisect_right(offsets, start) - 1)
+    pages = [(page_offsets[first][0], 0)]
+    for page, offset in page_offsets[first + 1:]:
+        if offset >= end:
+            break
+        pages.append((page, offset - start))
+    return pages
+
+
+def format_page_offsets(page_offsets: List[Tuple[int, int]]) -> str:
+    """Flatten page offsets for Chroma metadata, e.g. "12:0,13:842"."""
+    return ",".join(f"{page}:{offset}" for page, offset in page_offsets)
+
+
+def parse_page_offsets(value) -> List[Tuple[int, int]]:
+    """
+    Read page offsets back from chunk metadata.
+    
+    Args:
+        value: Flattened string from format_page_offsets, a list of pairs,
+            or None (chunks indexed before page offsets were recorded)
+        
+    Returns:
+        List of (page number, character offset) tuples (empty if unknown)
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [pair.split(":") for pair in value.split(",")]
+    return [(int(page), int(offset)) for page, offset in value]
+
+
+def format_locations(locations: List[Dict[str, any]]) -> str:
+    """Flatten page locations for Chroma metadata, e.g. "A.pdf:12-13;A.pdf:40-40"."""
+    return ";".join(f"{loc['source_file']}:{loc['page_start']}-{loc['page_end']}" for loc in locations)
+
+
+def parse_locations(value: str) -> List[Dict[str, any]]:
+    """
+    Read page locations back from chunk metadata.
+    
+    Args:
+        value: Flattened string from format_locations (or empty)
+        
+    Returns:
+        List of {'source_file', 'page_start', 'page_end'} dictionaries
+    """
+    locations = []
+    for item in (value or "").split(";"):
+        if not item:
+            continue
+        source_file, pages = item.rsplit(":", 1)
+        page_start, page_end = pages.split("-")
+        locations.append({'source_file': source_file, 'page_start': int(page_start), 'page_end': int(page_end)})
+    return locations
+
+
+def page_at(page_offsets: List[Tuple[int, int]], offset: int, default: int = None) -> int:
+    """
+    Get the page that a character offset within a chunk falls on.
+    
+    Args:
+        page_offsets: (page number, offset) pairs of the chunk
+        offset: Character offset within the chunk text
+        default: Page returned when the offsets are unknown
+        
+    Returns:
+        Page number
+    """
+    if not page_offsets:
+        return default
+    return slice_page_offsets(page_offsets, offset, offset + 1)[0][0]
+
+
 def chunk_document_pages(
     pages: List[Dict[str, any]],
     state: str,
     source_file: str,
     title: str,
-    doc_type: str = "maintenance_manual"
+    doc_type: str = "maintenance_manual",
+    hierarchical: bool = HIERARCHICAL_CHUNKING
 ) -> List[Dict[str, any]]:
     """
     Chunk document pages into smaller pieces with metadata.
     Never crosses document boundaries.
     
+    In hierarchical mode every chunk becomes a parent (level "parent", with
+    child_ids) and is split into small child passages (level "child", with
+    parent_id and their character offset in the parent). Children are what
+    gets embedded and searched; parents are what gets returned as context.
+    
     Args:
         pages: List of page dictionaries from pdf_extract
         state: State code
         source_file: Source filename
         title: Document title
         doc_type: Document type
+        hierarchical: Whether to also create child passages
         
     Returns:
-        List of chunk dictionaries with metadata
+        List of chunk dictionaries with metadata (parents first, then
+        children, in hierarchical mode)
     """
     chunks = []
     chunk_global_index = 0
@@ -131,6 +257,8 @@ def chunk_document_pages(
     current_text = ""
     current_page_start = None
     current_page_end = None
+    current_page_offsets = []  # (page number, offset in current_text)
+    page_sections = {page["page_num"]: page.get("section_path", []) for page in pages}
     
     for page in pages:
         page_num = page["page_num"]
@@ -145,6 +273,7 @@ def chunk_document_pages(
             current_page_start = page_num
         
         current_page_end = page_num
+        current_page_offsets.append((page_num, len(current_text) + 2 if current_text else 0))
         current_text += "\n\n" + page_text if current_text else page_text
         
         # If accumulated text is large enough, chunk it
@@ -157,7 +286,9 @@ def chunk_document_pages(
                 doc_type,
                 current_page_start,
                 current_page_end,
-                chunk_global_index
+                chunk_global_index,
+                current_page_offsets,
+                page_sections
             )
             chunks.extend(page_chunks)
             chunk_global_index += len(page_chunks)
@@ -166,6 +297,7 @@ def chunk_document_pages(
             current_text = ""
             current_page_start = None
             current_page_end = None
+            current_page_offsets = []
     
     # Process remaining text
     if current_text.strip():
@@ -177,13 +309,121 @@ def chunk_document_pages(
             doc_type,
             current_page_start,
             current_page_end,
-            chunk_global_index
+            chunk_global_index,
+            current_page_offsets,
+            page_sections
         )
         chunks.extend(page_chunks)
     
+    if hierarchical:
+        children = []
+        for parent in chunks:
+            children.extend(split_into_children(parent))
+        chunks.extend(children)
+    
     return chunks
 
 
+def chunk_metadata(chunk: Dict[str, any]) -> Dict[str, any]:
+    """
+    Flatten a chunk's metadata into simple types (as ChromaDB requires).
+    
+    Args:
+        chunk: Chunk dictionary
+        
+    Returns:
+        Metadata dictionary (child chunks include their parent link)
+    """
+    metadata = {
+        'state': chunk['state'],
+        'doc_type': chunk['doc_type'],
+        'title': chunk['title'],
+        'source_file': chunk['source_file'],
+        'page_start': int(chunk['page_start']),
+        'page_end': int(chunk['page_end']),
+        'has_time_keywords': bool(chunk['has_time_keywords']),
+        'matched_time_keywords': ','.join(chunk['matched_time_keywords']) if chunk['matched_time_keywords'] else '',
+        'chunk_index': int(chunk['chunk_index']),
+        'char_count': int(chunk['char_count'])
+    }
+    if 'page_offsets' in chunk:
+        metadata['page_offsets'] = format_page_offsets(chunk['page_offsets'])
+    if chunk.get('duplicates'):
+        metadata.update({
+            'duplicate_count': len(chunk['duplicates']),
+            'duplicate_locations': format_locations(chunk['duplicates'])
+        })
+    if 'section_id' in chunk:
+        metadata.update({
+            'section': " > ".join(chunk['section_path']),
+            'section_id': chunk['section_id']
+        })
+    if chunk.get('level') == "child":
+        metadata.update({
+            'parent_id': chunk['parent_id'],
+            'parent_offset': int(chunk['parent_offset']),
+            'child_index': int(chunk['child_index'])
+        })
+    return metadata
+
+
+def split_into_children(
+    parent: Dict[str, any],
+    child_size: int = CHILD_CHUNK_SIZE,
+    overlap: int = CHILD_CHUNK_OVERLAP_CHARS
+) -> List[Dict[str, any]]:
+    """
+    Split a chunk into small child passages linked to it.
+    
+    Children keep the parent's chunk_index and get their own ID, exact page
+    span, time keywords, and offset within the parent text. The parent is
+    marked as such and given the list of its child IDs.
+    
+    Args:
+        parent: Chunk dictionary (updated in place)
+        child_size: Target size per child in characters
+        overlap: Overlap between consecutive children in characters
+        
+    Returns:
+        List of child chunk dictionaries
+    """
+    children = []
+    cursor = 0
+    
+    for i, text in enumerate(chunk_text(parent['text'], child_size, overlap)):
+        # chunk_text only strips whitespace, so every child is a substring
+        offset = parent['text'].find(text, cursor)
+        if offset == -1:
+            offset = cursor
+        cursor = offset + 1
+        
+        has_time_keywords, matched_keywords = detect_time_keywords(text)
+        child = dict(parent)
+        if 'page_offsets' in parent:
+            pages = slice_page_offsets(parent['page_offsets'], offset, offset + len(text))
+            child.update({
+                "page_start": pages[0][0],
+                "page_end": pages[-1][0],
+                "page_offsets": pages
+            })
+        child.update({
+            "id": f"{parent['id']}#{i}",
+            "text": text,
+            "level": "child",
+            "parent_id": parent['id'],
+            "parent_offset": offset,
+            "child_index": i,
+            "has_time_keywords": has_time_keywords,
+            "matched_time_keywords": matched_keywords,
+            "char_count": len(text)
+        })
+        children.append(child)
+    
+    parent['level'] = "parent"
+    parent['child_ids'] = [child['id'] for child in children]
+    return children
+
+
 def _chunk_and_create_metadata(
     text: str,
     state: str,
@@ -192,28 +432,48 @@ def _chunk_and_create_metadata(
     doc_type: str,
     page_start: int,
     page_end: int,
-    start_index: int
+    start_index: int,
+    page_offsets: List[Tuple[int, int]] = None,
+    page_sections: Dict[int, List[str]] = None
 ) -> List[Dict[str, any]]:
     """
     Helper to chunk text and create metadata dictionaries.
     
+    Each chunk records the exact pages its text comes from (page_start,
+    page_end and page_offsets, the character offset at which each page
+    begins within the chunk) and the section of the page it starts on. The
+    chunk ID keeps the page range of the whole segment, so IDs stay unique.
+    
     Args:
         text: Text to chunk
         state: State code
         source_file: Source filename
         title: Document title
         doc_type: Document type
-        page_start: Starting page number
-        page_end: Ending page number
+        page_start: Starting page number of the segment
+        page_end: Ending page number of the segment
         start_index: Starting index for chunk IDs
+        page_offsets: (page number, offset in text) for every page in text
+        page_sections: Section path of every page
         
     Returns:
         List of chunk dictionaries
     """
     text_chunks = chunk_text(text)
+    page_offsets = page_offsets or [(page_start, 0)]
+    page_sections = page_sections or {}
     result = []
+    cursor = 0
     
     for i, text_chunk in enumerate(text_chunks):
+        # chunk_text only strips whitespace, so every chunk is a substring
+        chunk_start = text.find(text_chunk, cursor)
+        if chunk_start == -1:
+            chunk_start = cursor
+        cursor = chunk_start + 1
+        pages = slice_page_offsets(page_offsets, chunk_start, chunk_start + len(text_chunk))
+        section_path = page_sections.get(pages[0][0], [])
+        
         # Detect time keywords
         has_time_keywords, matched_keywords = detect_time_keywords(text_chunk)
         
@@ -228,11 +488,15 @@ def _chunk_and_create_metadata(
             "doc_type": doc_type,
             "title": title,
             "source_file": source_file,
-            "page_start": page_start,
-            "page_end": page_end,
+            "page_start": pages[0][0],
+            "page_end": pages[-1][0],
+            "page_offsets": pages,
             "has_time_keywords": has_time_keywords,
             "matched_time_keywords": matched_keywords,
-            "char_count": len(text_chunk)
+            "chunk_index": start_index + i,
+            "char_count": len(text_chunk),
+            "section_path": section_path,
+            "section_id": create_section_id(state, source_file, section_path)
         }
         
         result.append(chunk_dict)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Compact vector index: coarse search on small vectors, exact rescoring.
+
+Chunk embeddings are kept in memory in one of these compact forms:
+
+    int8      scalar-quantized, one scale per vector (4x smaller than float32)
+    binary    one sign bit per dimension after centering (32x smaller)
+    pca       projected onto the top COMPACT_DIMS principal components (float16)
+    truncate  the first COMPACT_DIMS dimensions, Matryoshka-style (float16)
+
+A query is scored against the compact vectors of the rows that pass its
+filter. The best n_results * COMPACT_RESCORE_FACTOR candidates are then
+rescored with squared L2 distance on the full-precision vectors. Those are
+memory-mapped from disk, so only the candidates' rows are ever read.
+
+Files (in COMPACT_INDEX_DIR):
+    full.f32     float32 embeddings, row-major, no header
+    index.npz    mode, compact codes and filter columns
+
+Usage (build from the existing Chroma collection, without re-embedding):
+    python compact_vectors.py int8
+    python compact_vectors.py pca --dims 128
+"""
+import argparse
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    COMPACT_DIMS,
+    COMPACT_INDEX_DIR,
+    COMPACT_RESCORE_FACTOR,
+    COMPACT_VECTORS
+)
+
+
+INDEX_FORMAT = 1
+MODES = ("int8", "binary", "pca", "truncate")
+BLOCK_ROWS = 16384  # rows decoded per step, bounds temporary memory
+FILTER_FIELDS = ("state", "has_time_keywords")
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class CompactIndex:
+    """In-memory compact vectors with memory-mapped full-precision rescoring."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], full: np.ndarray):
+        """
+        Args:
+            arrays: Contents of index.npz (see build_compact_index)
+            full: Full-precision embeddings, one row per ID (usually a memmap)
+        """
+        self.mode = str(arrays['mode'])
+        self.ids = arrays['ids'].tolist()
+        self.codes = arrays['codes']
+        self.scales = arrays.get('scales')
+        self.norms = arrays.get('norms')
+        self.mean = arrays.get('mean')
+        self.components = arrays.get('components')
+        self.full = full
+        self.time_flags = arrays['time_flags']
+
+        states = arrays['states']
+        self._rows_by_state = {
+            str(state): np.flatnonzero(arrays['state_codes'] == i)
+            for i, state in enumerate(states)
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        """Get the resident size of the compact vectors and filter columns (IDs excluded)."""
+        arrays = [self.codes, self.scales, self.norms, self.mean, self.components, self.time_flags]
+        arrays += list(self._rows_by_state.values())
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def full_bytes(self) -> int:
+        """Get the size of the full-precision vectors (on disk, read on demand)."""
+        return self.full.shape[0] * self.full.shape[1] * 4
+
+    def search(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: Dict[str, any],
+        rescore_factor: int = COMPACT_RESCORE_FACTOR
+    ) -> Optional[List[List[Tuple[int, float]]]]:
+        """
+        Find the nearest rows for each query.
+
+        Args:
+            query_embeddings: Query vectors
+            n_results: Results per query
+            where: Metadata filter; only equality on state and
+                has_time_keywords is supported
+            rescore_factor: Candidates rescored exactly per result
+
+        Returns:
+            Per query, (row, squared L2 distance) pairs best first, or None if
+            the filter is not supported (the caller should use Chroma)
+        """
+        rows = self._filter_rows(where)
+        if rows is None:
+            return None
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if not rows.size:
+            return [[] for _ in queries]
+
+        coarse = np.concatenate([
+            self._coarse_distances(rows[start:start + BLOCK_ROWS], queries)
+            for start in range(0, rows.size, BLOCK_ROWS)
+        ])
+
+        candidates = min(rows.size, n_results * max(1, rescore_factor))
+        results = []
+        for q, query in enumerate(queries):
+            if candidates < rows.size:
+                top = np.argpartition(coarse[:, q], candidates - 1)[:candidates]
+            else:
+                top = np.arange(rows.size)
+            candidate_rows = np.sort(rows[top])  # ascending rows read the memmap sequentially
+            exact = np.sum((np.asarray(self.full[candidate_rows]) - query) ** 2, axis=1)
+            order = np.argsort(exact)[:n_results]
+            results.append([(int(candidate_rows[i]), float(exact[i])) for i in order])
+        return results
+
+    def embeddings(self, rows: List[int]) -> np.ndarray:
+        """Get full-precision embeddings of some rows."""
+        return np.asarray(self.full[np.asarray(rows, dtype=np.int64)])
+
+    def _filter_rows(self, where: Dict[str, any]) -> Optional[np.ndarray]:
+        """Get the rows matching an equality filter, or None if it is unsupported."""
+        if any(field not in FILTER_FIELDS or isinstance(value, dict) for field, value in where.items()):
+            return None
+        if 'state' in where:
+            rows = self._rows_by_state.get(where['state'], np.empty(0, dtype=np.int64))
+        else:
+            rows = np.arange(len(self.ids))
+        if 'has_time_keywords' in where:
+            rows = rows[self.time_flags[rows] == bool(where['has_time_keywords'])]
+        return rows
+
+    def _coarse_distances(self, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate distances of some rows to every query (rows x queries; lower is closer)."""
+        codes = self.codes[rows]
+
+        if self.mode == "int8":
+            dots = (codes.astype(np.float32) @ queries.T) * (self.scales[rows] / 127.0)[:, None]
+            return self.norms[rows][:, None] - 2.0 * dots
+
+        if self.mode == "binary":
+            query_bits = np.packbits(queries - self.mean > 0, axis=1)
+            return np.stack([_POPCOUNT[codes ^ bits].sum(axis=1) for bits in query_bits], axis=1)
+
+        if self.mode == "pca":
+            reduced = (queries - self.mean) @ self.components.T
+        else:
+            reduced = queries[:, :codes.shape[1]]
+        vectors = codes.astype(np.float32)
+        return (
+            np.sum(vectors ** 2, axis=1)[:, None]
+            - 2.0 * (vectors @ reduced.T)
+            + np.sum(reduced ** 2, axis=1)[None, :]
+        )
+
+
+def build_compact_index(
+    ids: List[str],
+    metadatas: List[Dict[str, any]],
+    embeddings: np.ndarray,
+    mode: str,
+    path: Path = COMPACT_INDEX_DIR,
+    dims: int = COMPACT_DIMS
+) -> CompactIndex:
+    """
+    Build and save a compact index, replacing any existing one.
+
+    Args:
+        ids: Chunk IDs, in the same order as the embeddings
+        metadatas: Chunk metadata (state and has_time_keywords are kept for filtering)
+        embeddings: Full-precision embeddings (n x d)
+        mode: One of MODES
+        path: Index directory
+        dims: Dimensions kept by "pca" and "truncate"
+
+    Returns:
+        The opened index
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown compact vector mode '{mode}' (expected one of {', '.join(MODES)})")
+
+    full = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dims = min(dims, full.shape[1])
+    states = sorted({metadata['state'] for metadata in metadatas})
+    arrays = {
+        'format': np.array(INDEX_FORMAT),
+        'mode': np.array(mode),
+        'ids': np.array(ids),
+        'states': np.array(states),
+        'state_codes': np.array([states.index(metadata['state']) for metadata in metadatas], dtype=np.uint16),
+        'time_flags': np.array([bool(metadata.get('has_time_keywords')) for metadata in metadatas], dtype=bool)
+    }
+
+    if mode == "int8":
+        scales = np.abs(full).max(axis=1)
+        scales[scales == 0] = 1.0
+        arrays['codes'] = np.round(full / scales[:, None] * 127.0).astype(np.int8)
+        arrays['scales'] = scales.astype(np.float32)
+        arrays['norms'] = np.sum(full ** 2, axis=1).astype(np.float32)
+    elif mode == "binary":
+        mean = full.mean(axis=0)
+        arrays['codes'] = np.packbits(full - mean > 0, axis=1)
+        arrays['mean'] = mean.astype(np.float32)
+    elif mode == "pca":
+        mean = full.mean(axis=0)
+        # Principal axes from the SVD of the centred vectors
+        _, _, vt = np.linalg.svd(full - mean, full_matrices=False)
+        components = vt[:dims].astype(np.float32)
+        arrays['codes'] = ((full - mean) @ components.T).astype(np.float16)
+        arrays['mean'] = mean.astype(np.float32)
+        arrays['components'] = components
+    else:
+        arrays['codes'] = full[:, :dims].astype(np.float16)
+
+    path = Path(path)
+    remove_compact_index(path)
+    path.mkdir(parents=True, exist_ok=True)
+    full.tofile(path / "full.f32")
+    np.savez(path / "index.npz", **arrays)
+    return open_compact_index(path)
+
+
+def open_compact_index(path: Path = COMPACT_INDEX_DIR) -> Optional[CompactIndex]:
+    """
+    Open a compact index if one exists.
+
+    Args:
+        path: Index directory
+
+    Returns:
+        CompactIndex, or None if there is no index or it has an unknown format
+    """
+    path = Path(path)
+    try:
+        with np.load(path / "index.npz", allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        return None
+    if int(arrays['format']) != INDEX_FORMAT:
+        return None
+
+    count = len(arrays['ids'])
+    dims = (path / "full.f32").stat().st_size // 4 // max(1, count)
+    full = np.memmap(path / "full.f32", dtype=np.float32, mode="r", shape=(count, dims))
+    return CompactIndex(arrays, full)
+
+
+def remove_compact_index(path: Path = COMPACT_INDEX_DIR):
+    """Delete a compact index directory."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def load_collection_vectors(collection) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+    """
+    Read every ID, metadata and embedding from a Chroma collection.
+
+    Args:
+        collection: Chroma collection
+
+    Returns:
+        Tuple of (ids, metadatas, embeddings matrix)
+    """
+    results = collection.get(include=['metadatas', 'embeddings'])
+    return list(results['ids']), list(results['metadatas']), np.asarray(results['embeddings'], dtype=np.float32)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the compact vector index from the Chroma collection")
+    parser.add_argument("mode", nargs="?", default=COMPACT_VECTORS or "int8", choices=MODES)
+    parser.add_argument("--dims", type=int, default=COMPACT_DIMS, help="Dimensions kept by pca and truncate")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Build the compact index (one per state shard) from the vectors already stored in Chroma."""
+    args = parse_args(argv)
+
+    from config import COLLECTION_NAME
+    from index_manifest import read_manifest
+    from registry import get_chroma_client
+    from state_registry import shard_collection_name, shard_compact_dir
+
+    manifest = read_manifest()
+    if manifest is not None and manifest.get('sharding') == "state":
+        targets = [(shard_collection_name(state), shard_compact_dir(state)) for state in manifest['states']]
+    else:
+        targets = [(COLLECTION_NAME, COMPACT_INDEX_DIR)]
+
+    remove_compact_index(COMPACT_INDEX_DIR)
+    for name, path in targets:
+        try:
+            collection = get_chroma_client().get_collection(name=name)
+        except Exception:
+            print(f"❌ Collection '{name}' not found. Run 'python ingest.py' first.")
+            sys.exit(1)
+
+        ids, metadatas, embeddings = load_collection_vectors(collection)
+        index = build_compact_index(ids, metadatas, embeddings, args.mode, path=path, dims=args.dims)
+        print(
+            f"✓ Built {args.mode} index of {len(index)} vectors in {path}: "
+            f"{index.memory_bytes() / 1e6:.1f} MB in memory vs {index.full_bytes() / 1e6:.1f} MB float32"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ PROJECT_ROOT = Path(__file__).parent
 DATA_DIR = PROJECT_ROOT / "data"
 PDF_DIR = DATA_DIR / "pdfs"
 CHROMA_DIR = DATA_DIR / "chroma"
+INDEX_MANIFEST_PATH = CHROMA_DIR / "index_manifest.json"  # written by ingest.py
 
 # Ensure directories exist
 PDF_DIR.mkdir(parents=True, exist_ok=True)
@@ -29,17 +30,68 @@ LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "true")
 LANGCHAIN_PROJECT = os.getenv("LANGCHAIN_PROJECT", "DOT-Maintenance-RAG")
 
 # Model configurations
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")  # groq or fake (see llm_backends.py)
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-base-en-v1.5")
 
+# Fake LLM backend (offline benchmarks and load tests)
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))  # time to first token
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "200"))
+
 # ChromaDB configuration
 COLLECTION_NAME = "road_maintenance_manuals"
+STATS_CACHE_TTL = 30.0  # seconds collection statistics are cached for
+
+# Two-stage section-routed retrieval (see sections.py)
+SECTION_COLLECTION_NAME = f"{COLLECTION_NAME}_sections"  # routing index of section titles + summaries
+SECTION_ROUTING = os.getenv("SECTION_ROUTING", "false").lower() == "true"
+SECTION_ROUTING_TOP_N = 3  # sections searched per query
+SECTION_SUMMARY_CHARS = 600  # leading section text embedded with the title
+SECTION_CACHE_SIZE = 64  # sections whose chunk vectors are kept in memory
+
+# Chunk texts are kept outside Chroma in a compressed store (see doc_store.py)
+DOC_STORE_PATH = CHROMA_DIR / "chunk_texts.bin"
+DOC_STORE_COMPRESSION_LEVEL = 6  # zlib level
+
+# Rendering of cited PDF pages (see page_render.py)
+PAGE_CACHE_DIR = DATA_DIR / "page_cache"
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", "256"))  # disk LRU size bound
+PAGE_RENDER_DPI = int(os.getenv("PAGE_RENDER_DPI", "110"))
+PAGE_RENDER_MAX_DPI = 300
+PDF_HANDLE_POOL_SIZE = 8  # documents kept open for rendering
+
+# Compact vector storage: coarse search on quantized/reduced vectors, exact
+# rescoring of the top candidates on full-precision vectors (see compact_vectors.py)
+COMPACT_VECTORS = os.getenv("COMPACT_VECTORS", "")  # "", "int8", "binary", "pca" or "truncate"
+COMPACT_DIMS = int(os.getenv("COMPACT_DIMS", "256"))  # dimensions kept by "pca" and "truncate"
+COMPACT_RESCORE_FACTOR = int(os.getenv("COMPACT_RESCORE_FACTOR", "4"))  # candidates rescored per result
+COMPACT_INDEX_DIR = CHROMA_DIR / "compact_vectors"
+
+# Portable index snapshots (see snapshot.py)
+SNAPSHOT_DIR = DATA_DIR / "snapshots"
 
 # Chunking configuration
 CHUNK_SIZE = 5000  # characters (approximately 1200 tokens)
 CHUNK_OVERLAP = 0.125  # 12.5% overlap
 CHUNK_OVERLAP_CHARS = int(CHUNK_SIZE * CHUNK_OVERLAP)
 
+# Hierarchical chunking: small child passages are embedded and searched, their
+# parent chunks (CHUNK_SIZE) are returned as context
+HIERARCHICAL_CHUNKING = os.getenv("HIERARCHICAL_CHUNKING", "false").lower() == "true"
+CHILD_CHUNK_SIZE = 800  # characters
+CHILD_CHUNK_OVERLAP_CHARS = 100
+CHUNK_HIERARCHY_PATH = CHROMA_DIR / "chunk_hierarchy.json"  # parent -> children mapping
+PARENT_CONTEXT_MODE = os.getenv("PARENT_CONTEXT_MODE", "parent")  # "parent" or "window" around the hits
+PARENT_WINDOW_CHARS = 1000  # window mode: characters kept on each side of a hit
+PARENT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PARENT_CONTEXT_TOKEN_BUDGET", "8000"))  # estimated tokens
+
+# Near-duplicate chunk detection at ingest (see dedup.py)
+DEDUP_NEAR_DUPLICATES = os.getenv("DEDUP_NEAR_DUPLICATES", "true").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))  # estimated Jaccard similarity
+MINHASH_NUM_PERM = 128
+MINHASH_SHINGLE_WORDS = 5
+LSH_BANDS = 16  # MINHASH_NUM_PERM / LSH_BANDS rows per band; candidate threshold ~0.7
+
 # Time-related keywords for tagging
 TIME_KEYWORDS = [
     "night",
@@ -54,13 +106,16 @@ TIME_KEYWORDS = [
     "closure window",
 ]
 
-# State configuration
-SUPPORTED_STATES = ["CA", "TX", "WA"]
-STATE_NAMES = {
-    "CA": "California",
-    "TX": "Texas",
-    "WA": "Washington"
-}
+# Query intent classification (see intents.py): the query embedding is scored
+# against embedded example questions to pick a retrieval strategy
+INTENT_PROTOTYPES_PATH = CHROMA_DIR / "intent_prototypes.npz"  # embedded once per embedding model
+
+# State/agency registry (see state_registry.py): jurisdictions come from the
+# PDF file name prefixes and are recorded in the index manifest
+JURISDICTIONS_FILE = PDF_DIR / "jurisdictions.json"  # optional extra {"CODE": "Name"} agencies
+STATE_SHARDING = os.getenv("STATE_SHARDING", "true").lower() == "true"  # ingest: one collection per state
+STATE_SHARD_CACHE_SIZE = int(os.getenv("STATE_SHARD_CACHE_SIZE", "8"))  # state shards kept open per pipeline
+CHROMA_MEMORY_LIMIT_MB = int(os.getenv("CHROMA_MEMORY_LIMIT_MB", "0"))  # LRU-unload Chroma indexes above this; 0 = no limit
 
 # Document type (for phase 1, only maintenance manuals)
 DOC_TYPE = "maintenance_manual"
@@ -70,3 +125,48 @@ DEFAULT_TOP_K = 10
 MAX_TOP_K = 20
 MIN_TOP_K = 5
 
+# Post-retrieval merging of adjacent/overlapping chunks
+MERGE_ADJACENT_CHUNKS = True
+MMR_LAMBDA = 0.7  # relevance vs. diversity trade-off when refilling freed slots
+MMR_FETCH_MULTIPLIER = 3  # candidate pool size relative to k
+
+# Bulk question answering (RAGPipeline.answer_many)
+EMBED_BATCH_SIZE = 32
+ANSWER_MANY_MAX_CONCURRENCY = int(os.getenv("ANSWER_MANY_MAX_CONCURRENCY", "4"))
+
+# Cross-request micro-batching of query embeddings (see embedding_batcher.py)
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # 0 disables
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+
+# Async API (RAGPipeline.aanswer_question)
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", "8"))  # threads for embedding/Chroma calls
+ASYNC_ANSWER_TIMEOUT = float(os.getenv("ASYNC_ANSWER_TIMEOUT", "60"))  # seconds
+
+# LLM gateway: rate limiting, retries, deadlines and circuit breaker
+LLM_MAX_TOKENS = 1024
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))  # 0 disables
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "60000"))  # 0 disables
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_BASE = 0.5  # seconds
+LLM_BACKOFF_MAX = 8.0  # seconds
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))  # seconds, including queueing and retries
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failures
+LLM_CIRCUIT_RESET_TIMEOUT = 30.0  # seconds
+
+# Tracing and metrics (see tracing.py)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # JSON lines file for finished traces; empty disables
+TRACE_HISTORY_SIZE = 100  # finished traces kept in memory for the debug panel
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "256"))  # 0 disables
+
+# Startup: background preloading and warm-up (see registry.preload, profile_startup.py)
+PRELOAD_ON_START = os.getenv("PRELOAD_ON_START", "true").lower() == "true"
+WARMUP_QUERY = "What are the requirements for nighttime lane closures?"
+
+# Retrieval/answer HTTP service (server.py) and thin-client mode for app.py
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))  # pipeline calls running at once
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "32"))  # calls waiting for a worker before 503
+SERVICE_REQUEST_TIMEOUT = float(os.getenv("SERVICE_REQUEST_TIMEOUT", "120"))  # seconds
+RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL", "")  # e.g. http://127.0.0.1:8765; empty runs the pipeline in-process
@@ -0,0 +1,190 @@
+"""
+Near-duplicate chunk detection with MinHash and LSH.
+
+Manuals repeat boilerplate (safety notices, traffic-control paragraphs)
+across chapters and revisions. At ingest every searchable chunk gets a MinHash
+signature over its word shingles. Locality-sensitive hashing (signature bands)
+finds candidate pairs without comparing every pair, and candidates whose
+estimated Jaccard similarity reaches NEAR_DUPLICATE_THRESHOLD are clustered.
+Only the first chunk of each cluster is embedded and stored; it keeps
+back-references to the page locations of the others.
+
+Chunks are only clustered within a state, since retrieval filters by state.
+"""
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config import (
+    NEAR_DUPLICATE_THRESHOLD,
+    MINHASH_NUM_PERM,
+    MINHASH_SHINGLE_WORDS,
+    LSH_BANDS
+)
+
+
+_PRIME = (1 << 31) - 1  # hashes are taken modulo this Mersenne prime
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def shingle_hashes(text: str, shingle_words: int = MINHASH_SHINGLE_WORDS) -> np.ndarray:
+    """
+    Hash the word shingles of a text.
+
+    Args:
+        text: Chunk text (case and punctuation are ignored)
+        shingle_words: Words per shingle
+
+    Returns:
+        Array of distinct shingle hashes
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= shingle_words:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+    return np.array([zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles], dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures from a fixed family of universal hash functions."""
+
+    def __init__(self, num_perm: int = MINHASH_NUM_PERM, shingle_words: int = MINHASH_SHINGLE_WORDS, seed: int = 1):
+        """
+        Args:
+            num_perm: Number of hash functions (signature length)
+            shingle_words: Words per shingle
+            seed: Seed for the hash functions; signatures are only comparable
+                between hashers with the same seed and num_perm
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text: Text to sign
+
+        Returns:
+            Array of num_perm minimum hash values
+        """
+        hashes = shingle_hashes(text, self.shingle_words)
+        if not hashes.size:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        # a, x < 2^31, so a * x + b stays below 2^63
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+
+def estimated_similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(left == right))
+
+
+def find_near_duplicates(
+    chunks: List[Dict[str, any]],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    hasher: MinHasher = None,
+    bands: int = LSH_BANDS
+) -> List[List[int]]:
+    """
+    Cluster near-identical chunks.
+
+    Args:
+        chunks: Chunk dictionaries (text and state are used)
+        threshold: Minimum estimated Jaccard similarity of a duplicate pair
+        hasher: MinHasher to sign with (default: MINHASH_NUM_PERM functions)
+        bands: LSH bands; each band holds num_perm / bands signature rows
+
+    Returns:
+        Clusters of two or more chunk indexes, each in ascending order
+    """
+    hasher = hasher or MinHasher()
+    rows = hasher.num_perm // bands
+    signatures = [hasher.signature(chunk['text']) for chunk in chunks]
+
+    # Chunks sharing any band bucket are candidates
+    buckets = defaultdict(list)
+    for i, (chunk, signature) in enumerate(zip(chunks, signatures)):
+        for band in range(bands):
+            buckets[(chunk['state'], band, signature[band * rows:(band + 1) * rows].tobytes())].append(i)
+
+    parents = list(range(len(chunks)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    checked = set()
+    for members in buckets.values():
+        for x, i in enumerate(members):
+            for j in members[x + 1:]:
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                if estimated_similarity(signatures[i], signatures[j]) >= threshold:
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parents[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = defaultdict(list)
+    for i in range(len(chunks)):
+        clusters[find(i)].append(i)
+    return sorted((members for members in clusters.values() if len(members) > 1), key=lambda members: members[0])
+
+
+def deduplicate_chunks(
+    chunks: List[Dict[str, any]],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> Tuple[List[Dict[str, any]], Dict[str, any]]:
+    """
+    Keep one representative of every near-duplicate cluster.
+
+    The representative is the cluster's first chunk in document order. It is
+    given a 'duplicates' list with the ID and page location of every chunk it
+    stands for (stored in Chroma metadata by chunking.chunk_metadata).
+
+    Args:
+        chunks: Searchable chunks, in document order
+        threshold: Minimum estimated Jaccard similarity of a duplicate pair
+
+    Returns:
+        Tuple of (kept chunks in their original order, savings report)
+    """
+    clusters = find_near_duplicates(chunks, threshold)
+
+    removed = set()
+    for members in clusters:
+        representative = chunks[members[0]]
+        representative['duplicates'] = [
+            {
+                'id': chunks[i]['id'],
+                'source_file': chunks[i]['source_file'],
+                'page_start': chunks[i]['page_start'],
+                'page_end': chunks[i]['page_end']
+            }
+            for i in members[1:]
+        ]
+        removed.update(members[1:])
+
+    kept = [chunk for i, chunk in enumerate(chunks) if i not in removed]
+    chars_before = sum(len(chunk['text']) for chunk in chunks)
+    report = {
+        'threshold': threshold,
+        'chunks_before': len(chunks),
+        'chunks_after': len(kept),
+        'clusters': len(clusters),
+        'duplicates_removed': len(removed),
+        'chars_before': chars_before,
+        'chars_saved': sum(len(chunks[i]['text']) for i in removed)
+    }
+    return kept, report
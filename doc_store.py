@@ -0,0 +1,228 @@
+"""
+External chunk-text store.
+
+Chunk texts live outside the vector index in an append-only file of
+zlib-compressed records, with a JSON offset index keyed by chunk ID. Readers
+memory-map the data file, so fetching a text is a slice plus a decompress and
+only the chunks that are actually returned are ever read.
+
+Files (for DOC_STORE_PATH = chunk_texts.bin):
+    chunk_texts.bin       header + compressed records, append-only
+    chunk_texts.idx.json  {"format", "data_size", "entries": {id: [offset, length, chars]}}
+
+The index is rewritten atomically after each batch of appends and records the
+data size it covers, so a crash mid-append leaves a readable store; the
+unreferenced tail is truncated by the next writer.
+"""
+import json
+import mmap
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from config import DOC_STORE_PATH, DOC_STORE_COMPRESSION_LEVEL
+
+
+STORE_FORMAT = 1
+HEADER = b"RAGTXT1\n"
+
+
+def index_path_for(path: Path) -> Path:
+    """Get the offset index path that belongs to a data file."""
+    return path.with_suffix(".idx.json")
+
+
+def _read_index(path: Path) -> Optional[Dict[str, any]]:
+    try:
+        index = json.loads(index_path_for(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if index.get('format') != STORE_FORMAT:
+        return None
+    return index
+
+
+def remove_store(path: Path = DOC_STORE_PATH):
+    """Delete a store's data and index files."""
+    path.unlink(missing_ok=True)
+    index_path_for(path).unlink(missing_ok=True)
+
+
+class DocStore:
+    """Read-only, memory-mapped view of a chunk-text store."""
+
+    def __init__(self, path: Path = DOC_STORE_PATH):
+        """
+        Args:
+            path: Data file path
+
+        Raises:
+            FileNotFoundError: If the store does not exist or its index is unreadable
+        """
+        self.path = Path(path)
+        index = _read_index(self.path)
+        if index is None or not self.path.exists():
+            raise FileNotFoundError(f"No chunk-text store at {self.path}")
+
+        self._entries = index['entries']
+        self._file = open(self.path, "rb")
+        self._mmap = None
+        if index['data_size'] > len(HEADER):
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._entries
+
+    def get(self, chunk_id: str) -> Optional[str]:
+        """
+        Get one chunk's text.
+
+        Args:
+            chunk_id: Chunk ID
+
+        Returns:
+            Chunk text, or None if the ID is not in the store
+        """
+        entry = self._entries.get(chunk_id)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return zlib.decompress(self._mmap[offset:offset + length]).decode("utf-8")
+
+    def get_many(self, chunk_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Get several chunks' texts.
+
+        Args:
+            chunk_ids: Chunk IDs
+
+        Returns:
+            Mapping of chunk ID to text (IDs not in the store are left out)
+        """
+        texts = {}
+        for chunk_id in chunk_ids:
+            text = self.get(chunk_id)
+            if text is not None:
+                texts[chunk_id] = text
+        return texts
+
+    def stats(self) -> Dict[str, int]:
+        """Get entry count and raw vs. stored sizes."""
+        return _entry_stats(self._entries)
+
+    def close(self):
+        """Release the memory map and file handle."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class DocStoreWriter:
+    """
+    Appends chunk texts to a store.
+
+    Adding an ID that is already stored appends a new record and points the
+    index at it; the old record stays in the file until the store is rebuilt.
+    """
+
+    def __init__(
+        self,
+        path: Path = DOC_STORE_PATH,
+        reset: bool = False,
+        level: int = DOC_STORE_COMPRESSION_LEVEL
+    ):
+        """
+        Args:
+            path: Data file path
+            reset: Start an empty store instead of appending to an existing one
+            level: zlib compression level
+        """
+        self.path = Path(path)
+        self.level = level
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if reset:
+            remove_store(self.path)
+
+        index = _read_index(self.path) if self.path.exists() else None
+        if index is None:
+            self._entries = {}
+            self._file = open(self.path, "wb")
+            self._file.write(HEADER)
+        else:
+            self._entries = index['entries']
+            self._file = open(self.path, "r+b")
+            # Drop any tail left by an append that never made it into the index
+            self._file.truncate(index['data_size'])
+            self._file.seek(index['data_size'])
+
+    def add(self, chunk_id: str, text: str):
+        """
+        Append one chunk's text.
+
+        Args:
+            chunk_id: Chunk ID
+            text: Chunk text
+        """
+        record = zlib.compress(text.encode("utf-8"), self.level)
+        offset = self._file.tell()
+        self._file.write(record)
+        self._entries[chunk_id] = [offset, len(record), len(text)]
+
+    def flush(self):
+        """Make everything appended so far durable and visible to new readers."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        index_path = index_path_for(self.path)
+        tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({
+            'format': STORE_FORMAT,
+            'data_size': self._file.tell(),
+            'entries': self._entries
+        }), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+
+    def stats(self) -> Dict[str, int]:
+        """Get entry count and raw vs. stored sizes."""
+        return _entry_stats(self._entries)
+
+    def close(self):
+        """Flush and close the store."""
+        self.flush()
+        self._file.close()
+
+    def __enter__(self) -> "DocStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _entry_stats(entries: Dict[str, list]) -> Dict[str, int]:
+    return {
+        'chunks': len(entries),
+        'raw_chars': sum(entry[2] for entry in entries.values()),
+        'stored_bytes': sum(entry[1] for entry in entries.values())
+    }
+
+
+def open_doc_store(path: Path = DOC_STORE_PATH) -> Optional[DocStore]:
+    """
+    Open a store if one exists.
+
+    Args:
+        path: Data file path
+
+    Returns:
+        DocStore, or None if there is no store (e.g. an index built before
+        the store existed, which keeps its texts in Chroma)
+    """
+    try:
+        return DocStore(path)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,198 @@
+"""
+Cross-request micro-batching of query embeddings.
+
+Concurrent callers each submit one query; a background thread groups the
+requests that arrive within a short window (or until the batch is full) and
+embeds them in a single forward pass, which is much cheaper on CPU than many
+batch-of-one passes. A lone caller is not held back: collection stops as soon
+as every caller currently waiting is in the batch.
+"""
+import queue
+import threading
+import time
+from typing import List
+
+from config import EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH_SIZE
+from tracing import METRICS, SECONDS_BUCKETS, SIZE_BUCKETS
+
+
+BATCH_SIZE = METRICS.histogram(
+    "rag_embed_batch_size", "Queries per batched embedding forward pass", SIZE_BUCKETS
+)
+BATCH_SECONDS = METRICS.histogram(
+    "rag_embed_batch_seconds", "Duration of batched embedding forward passes", SECONDS_BUCKETS
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "rag_embed_request_seconds", "Query embedding latency including batching wait", SECONDS_BUCKETS
+)
+
+
+class _EmbedRequest:
+    """One caller's pending query embedding."""
+
+    __slots__ = ('text', 'enqueued', 'done', 'vector', 'error')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.vector = None
+        self.error = None
+
+
+class EmbeddingBatcher:
+    """
+    Embeds queries from concurrent callers in shared forward passes.
+
+    The window and maximum batch size can be changed at any time through the
+    `window` (seconds) and `max_batch_size` attributes.
+    """
+
+    def __init__(
+        self,
+        model,
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE
+    ):
+        """
+        Args:
+            model: SentenceTransformer (anything with encode)
+            window_ms: Longest time to wait for more requests (0 disables batching)
+            max_batch_size: Largest number of queries per forward pass
+        """
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.requests = 0
+        self.batches = 0
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embed one query, batched with concurrent callers.
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        if self.window <= 0 or self.max_batch_size <= 1:
+            request = _EmbedRequest(text)
+            self._process([request])
+        else:
+            self._ensure_worker()
+            request = _EmbedRequest(text)
+            with self._lock:
+                self._waiting += 1
+            try:
+                self._queue.put(request)
+                request.done.wait()
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        if request.error is not None:
+            raise request.error
+        return request.vector
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries from one caller, sharing passes with concurrent callers.
+
+        Args:
+            texts: Query texts
+
+        Returns:
+            Embedding vectors, in input order
+        """
+        requests = [_EmbedRequest(text) for text in texts]
+        if self.window <= 0 or self.max_batch_size <= 1:
+            step = max(1, self.max_batch_size)
+            for i in range(0, len(requests), step):
+                self._process(requests[i:i + step])
+        else:
+            self._ensure_worker()
+            with self._lock:
+                self._waiting += len(requests)
+            try:
+                for request in requests:
+                    self._queue.put(request)
+                for request in requests:
+                    request.done.wait()
+            finally:
+                with self._lock:
+                    self._waiting -= len(requests)
+
+        for request in requests:
+            if request.error is not None:
+                raise request.error
+        return [request.vector for request in requests]
+
+    def stats(self) -> dict:
+        """Get request and batch counts."""
+        with self._lock:
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch_size': self.max_batch_size,
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """Collect requests into batches and embed them, forever."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+
+            while len(batch) < self.max_batch_size:
+                # Nobody else is waiting: do not hold back the callers we have
+                with self._lock:
+                    others_waiting = self._waiting > len(batch)
+                if not others_waiting and self._queue.empty():
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch: List[_EmbedRequest]):
+        """Embed a batch in one forward pass and hand each caller its vector."""
+        texts = list(dict.fromkeys(request.text for request in batch))
+        start = time.perf_counter()
+        try:
+            vectors = self.model.encode(texts, batch_size=len(texts)).tolist()
+            by_text = dict(zip(texts, vectors))
+            for request in batch:
+                request.vector = list(by_text[request.text])
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finished = time.perf_counter()
+
+        BATCH_SIZE.observe(len(batch))
+        BATCH_SECONDS.observe(finished - start)
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+
+        for request in batch:
+            REQUEST_SECONDS.observe(finished - request.enqueued)
+            request.done.set()
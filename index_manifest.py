@@ -0,0 +1,153 @@
+"""
+Index manifest: statistics about the Chroma index, written once at ingest.
+
+The manifest sits next to the Chroma data and records exact per-state chunk
+counts, time-keyword chunk counts, page totals, and an index version, so
+readers never have to scan the collection to describe it.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import (
+    INDEX_MANIFEST_PATH,
+    COLLECTION_NAME,
+    EMBED_MODEL,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP_CHARS
+)
+from state_registry import known_jurisdictions, shard_collection_name
+
+
+MANIFEST_FORMAT = 1
+
+
+def compute_index_version(chunks: List[Dict[str, any]]) -> str:
+    """
+    Fingerprint an index build.
+
+    The version changes whenever the chunk IDs, chunk texts, embedding model
+    or chunking settings change.
+
+    Args:
+        chunks: All chunks stored in the index
+
+    Returns:
+        Short hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{EMBED_MODEL}|{CHUNK_SIZE}|{CHUNK_OVERLAP_CHARS}".encode("utf-8"))
+    for chunk in chunks:
+        digest.update(chunk['id'].encode("utf-8"))
+        digest.update(hashlib.sha256(chunk['text'].encode("utf-8")).digest())
+    return digest.hexdigest()[:12]
+
+
+def build_manifest(
+    documents: List[Dict[str, any]],
+    chunks: List[Dict[str, any]],
+    sections: Optional[List[Dict[str, any]]] = None,
+    sharded: bool = False
+) -> Dict[str, any]:
+    """
+    Build the manifest for a set of ingested documents and their chunks.
+
+    Chunk counts are of (parent) chunks; child passages from hierarchical
+    chunking are counted separately. The per-state entries are the state
+    registry: each records the state's name and the collection holding it.
+
+    Args:
+        documents: Documents from extract_all_pdfs
+        chunks: All chunks created from the documents
+        sections: Section index from sections.build_sections, if built
+        sharded: Whether every state is stored in its own collection
+
+    Returns:
+        Manifest dictionary
+    """
+    names = known_jurisdictions()
+    states = {}
+    for doc in documents:
+        doc_chunks = [c for c in chunks if c['source_file'] == doc['source_file'] and c.get('level') != 'child']
+        child_count = sum(1 for c in chunks if c['source_file'] == doc['source_file'] and c.get('level') == 'child')
+        entry = states.setdefault(doc['state'], {
+            'name': names.get(doc['state'], doc['state']),
+            'collection': shard_collection_name(doc['state']) if sharded else COLLECTION_NAME,
+            'chunks': 0,
+            'child_chunks': 0,
+            'sections': 0,
+            'time_keyword_chunks': 0,
+            'pages': 0,
+            'documents': []
+        })
+        time_chunks = sum(1 for c in doc_chunks if c['has_time_keywords'])
+        entry['chunks'] += len(doc_chunks)
+        entry['child_chunks'] += child_count
+        entry['time_keyword_chunks'] += time_chunks
+        entry['pages'] += doc['total_pages']
+        entry['documents'].append({
+            'source_file': doc['source_file'],
+            'title': doc['title'],
+            'pages': doc['total_pages'],
+            'chunks': len(doc_chunks),
+            'child_chunks': child_count,
+            'time_keyword_chunks': time_chunks
+        })
+
+    for section in sections or []:
+        states[section['state']]['sections'] += 1
+
+    total_children = sum(entry['child_chunks'] for entry in states.values())
+
+    return {
+        'format': MANIFEST_FORMAT,
+        'index_version': compute_index_version(chunks),
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'collection_name': COLLECTION_NAME,
+        'embed_model': EMBED_MODEL,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP_CHARS,
+        'chunking': "hierarchical" if total_children else "flat",
+        'sharding': "state" if sharded else "none",
+        'total_chunks': sum(entry['chunks'] for entry in states.values()),
+        'total_child_chunks': total_children,
+        'total_pages': sum(entry['pages'] for entry in states.values()),
+        'states': dict(sorted(states.items()))
+    }
+
+
+def write_manifest(manifest: Dict[str, any], path: Path = INDEX_MANIFEST_PATH):
+    """
+    Write the manifest atomically, so readers never see a partial file.
+
+    Args:
+        manifest: Manifest dictionary
+        path: Destination path
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: Path = INDEX_MANIFEST_PATH) -> Optional[Dict[str, any]]:
+    """
+    Read the manifest.
+
+    Args:
+        path: Manifest path
+
+    Returns:
+        Manifest dictionary, or None if it is missing, unreadable or of an
+        unknown format
+    """
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return None
+    return manifest
@@ -19,10 +19,25 @@ from config import (
     COLLECTION_NAME,
     EMBED_MODEL,
     DOC_TYPE,
-    SUPPORTED_STATES
+    INDEX_MANIFEST_PATH,
+    DOC_STORE_PATH,
+    HIERARCHICAL_CHUNKING,
+    CHUNK_HIERARCHY_PATH,
+    SECTION_COLLECTION_NAME,
+    DEDUP_NEAR_DUPLICATES,
+    COMPACT_VECTORS,
+    COMPACT_INDEX_DIR,
+    STATE_SHARDING
 )
 from pdf_extract import extract_all_pdfs
-from chunking import chunk_document_pages
+from chunking import chunk_document_pages, chunk_metadata
+from chunk_hierarchy import update_hierarchy
+from sections import build_sections, routing_text, section_metadata
+from dedup import deduplicate_chunks
+from compact_vectors import build_compact_index, remove_compact_index
+from index_manifest import build_manifest, write_manifest
+from state_registry import shard_collection_name, shard_collection_names, shard_compact_dir
+from doc_store import DocStoreWriter, remove_store
 
 
 def main():
@@ -41,7 +56,7 @@ def main():
     pdf_files = list(PDF_DIR.glob("*.pdf"))
     if not pdf_files:
         print(f"❌ Error: No PDF files found in {PDF_DIR}")
-        print(f"\nExpected files:")
+        print(f"\nExpected files named {{STATE}}_*.pdf, e.g.:")
         print(f"  - CA_Caltrans_Maintenance_Manual.pdf")
         print(f"  - TX_TxDOT_Maintenance_Management_Manual.pdf")
         print(f"  - WA_WSDOT_Maintenance_Manual.pdf")
@@ -50,7 +65,8 @@ def main():
     print(f"📂 PDF Directory: {PDF_DIR}")
     print(f"📦 ChromaDB Path: {CHROMA_DIR}")
     print(f"🔤 Embedding Model: {EMBED_MODEL}")
-    print(f"📚 Collection Name: {COLLECTION_NAME}")
+    print(f"📚 Collection Name: {COLLECTION_NAME}{' (one shard per state)' if STATE_SHARDING else ''}")
+    print(f"🧩 Chunking: {'hierarchical (parent/child)' if HIERARCHICAL_CHUNKING else 'flat'}")
     print()
     
     # Step 1: Extract PDFs
@@ -87,20 +103,66 @@ def main():
             all_chunks.extend(chunks)
             
             # Count chunks with time keywords
-            time_chunks = sum(1 for c in chunks if c['has_time_keywords'])
-            print(f"  ✓ Created {len(chunks)} chunks ({time_chunks} with time keywords)")
+            doc_parents = [c for c in chunks if c.get('level') != 'child']
+            time_chunks = sum(1 for c in doc_parents if c['has_time_keywords'])
+            print(f"  ✓ Created {len(doc_parents)} chunks ({time_chunks} with time keywords)")
+            if len(doc_parents) < len(chunks):
+                print(f"    and {len(chunks) - len(doc_parents)} child passages for search")
             
         except Exception as e:
             print(f"  ❌ Error chunking document: {str(e)}")
             continue
     
-    print(f"\n✓ Total chunks created: {len(all_chunks)}")
+    # In hierarchical mode only the child passages are embedded; parents are
+    # returned as context
+    parents = [c for c in all_chunks if c.get('level') != 'child']
+    children = [c for c in all_chunks if c.get('level') == 'child']
+    indexed_chunks = children or parents
+    
+    print(f"\n✓ Total chunks created: {len(parents)}")
+    if children:
+        print(f"✓ Total child passages created: {len(children)}")
     print()
     
     if not all_chunks:
         print("❌ No chunks created. Exiting.")
         sys.exit(1)
     
+    # Near-duplicate chunks are embedded and stored once; the kept copy
+    # records the page locations of the others
+    dedup_report = None
+    if DEDUP_NEAR_DUPLICATES:
+        indexed_chunks, dedup_report = deduplicate_chunks(indexed_chunks)
+        if children:
+            kept_ids = {chunk['id'] for chunk in indexed_chunks}
+            for parent in parents:
+                parent['child_ids'] = [child_id for child_id in parent['child_ids'] if child_id in kept_ids]
+            # Parents whose passages all repeat text found elsewhere are unreachable
+            parents = [parent for parent in parents if parent['child_ids']]
+            children = indexed_chunks
+        else:
+            parents = indexed_chunks
+        all_chunks = parents + children
+        
+        removed = dedup_report['duplicates_removed']
+        print(
+            f"✓ Near-duplicates: {removed} of {dedup_report['chunks_before']} "
+            f"{'child passages' if children else 'chunks'} folded into {dedup_report['clusters']} kept copies "
+            f"({removed / dedup_report['chunks_before']:.1%} fewer vectors, "
+            f"{dedup_report['chars_saved'] / 1e6:.2f}M chars)"
+        )
+        print()
+    
+    # Section index for section-routed retrieval
+    sections = build_sections(documents, all_chunks)
+    print(f"✓ Mapped chunks to {len(sections)} sections")
+    print()
+    
+    # Statistics for the index manifest (written once the index is stored)
+    manifest = build_manifest(documents, all_chunks, sections, sharded=STATE_SHARDING)
+    if dedup_report is not None:
+        manifest['dedup'] = dedup_report
+    
     # Step 3: Initialize embedding model
     print("STEP 3: Loading embedding model")
     print("-" * 70)
@@ -117,7 +179,7 @@ def main():
     print("STEP 4: Creating embeddings")
     print("-" * 70)
     try:
-        texts = [chunk['text'] for chunk in all_chunks]
+        texts = [chunk['text'] for chunk in indexed_chunks]
         print(f"Embedding {len(texts)} chunks...")
         embeddings = embedding_model.encode(
             texts,
@@ -125,6 +187,15 @@ def main():
             batch_size=32
         )
         print(f"✓ Created {len(embeddings)} embeddings")
+        if dedup_report is not None and len(embeddings):
+            dedup_report['vector_bytes_saved'] = dedup_report['duplicates_removed'] * embeddings.shape[1] * 4
+            print(f"  (near-duplicate folding saved {dedup_report['vector_bytes_saved'] / 1e6:.2f} MB of float32 vectors)")
+        
+        section_embeddings = embedding_model.encode(
+            [routing_text(section) for section in sections],
+            batch_size=32
+        )
+        print(f"✓ Created {len(section_embeddings)} section routing embeddings")
     except Exception as e:
         print(f"❌ Error creating embeddings: {str(e)}")
         sys.exit(1)
@@ -147,58 +218,119 @@ def main():
             print(f"🗑️  Deleted existing collection: {COLLECTION_NAME}")
         except:
             pass
+        for name in [SECTION_COLLECTION_NAME] + shard_collection_names(chroma_client):
+            try:
+                chroma_client.delete_collection(name=name)
+            except:
+                pass
+        INDEX_MANIFEST_PATH.unlink(missing_ok=True)
+        remove_store(DOC_STORE_PATH)
+        CHUNK_HIERARCHY_PATH.unlink(missing_ok=True)
+        remove_compact_index(COMPACT_INDEX_DIR)
         
-        # Create new collection
-        collection = chroma_client.create_collection(
-            name=COLLECTION_NAME,
-            metadata={"description": "State DOT maintenance manuals"}
-        )
-        print(f"✓ Created collection: {COLLECTION_NAME}")
-        
-        # Prepare data for insertion
+        # Prepare data for insertion. Chroma holds only vectors, IDs and the
+        # metadata used for filtering; texts go to the compressed chunk-text store
         ids = []
-        documents = []
         metadatas = []
         embeddings_list = []
         
-        for chunk, embedding in zip(all_chunks, embeddings):
+        with DocStoreWriter(DOC_STORE_PATH, reset=True) as doc_store:
+            for chunk in parents:
+                doc_store.add(chunk['id'], chunk['text'])
+            store_stats = doc_store.stats()
+        manifest['text_store'] = {'path': DOC_STORE_PATH.name, **store_stats}
+        print(
+            f"✓ Stored {store_stats['chunks']} chunk texts in {DOC_STORE_PATH.name} "
+            f"({store_stats['raw_chars'] / 1e6:.1f}M chars → {store_stats['stored_bytes'] / 1e6:.1f} MB compressed)"
+        )
+        
+        for chunk, embedding in zip(indexed_chunks, embeddings):
             ids.append(chunk['id'])
-            documents.append(chunk['text'])
             
             # Prepare metadata (ChromaDB requires simple types)
-            metadata = {
-                'state': chunk['state'],
-                'doc_type': chunk['doc_type'],
-                'title': chunk['title'],
-                'source_file': chunk['source_file'],
-                'page_start': int(chunk['page_start']),
-                'page_end': int(chunk['page_end']),
-                'has_time_keywords': bool(chunk['has_time_keywords']),
-                'matched_time_keywords': ','.join(chunk['matched_time_keywords']) if chunk['matched_time_keywords'] else '',
-                'char_count': int(chunk['char_count'])
-            }
-            metadatas.append(metadata)
+            metadatas.append(chunk_metadata(chunk))
             embeddings_list.append(embedding.tolist())
         
-        # Insert in batches
-        batch_size = 100
-        for i in tqdm(range(0, len(ids), batch_size), desc="Inserting batches"):
-            batch_end = min(i + batch_size, len(ids))
-            collection.add(
-                ids=ids[i:batch_end],
-                documents=documents[i:batch_end],
-                metadatas=metadatas[i:batch_end],
-                embeddings=embeddings_list[i:batch_end]
+        # With sharding every state gets its own collection (and compact
+        # index), so a query only searches the vectors of its state
+        shards = {}
+        for i, metadata in enumerate(metadatas):
+            shards.setdefault(metadata['state'] if STATE_SHARDING else None, []).append(i)
+        
+        compact_memory = 0
+        compact_full = 0
+        for state, rows in shards.items():
+            name = shard_collection_name(state) if state else COLLECTION_NAME
+            collection = chroma_client.create_collection(
+                name=name,
+                metadata={"description": f"State DOT maintenance manuals ({state})" if state else "State DOT maintenance manuals"}
             )
+            print(f"✓ Created collection: {name}")
+            
+            # Insert in batches
+            batch_size = 100
+            for start in tqdm(range(0, len(rows), batch_size), desc="Inserting batches"):
+                batch = rows[start:start + batch_size]
+                collection.add(
+                    ids=[ids[i] for i in batch],
+                    metadatas=[metadatas[i] for i in batch],
+                    embeddings=[embeddings_list[i] for i in batch]
+                )
+            
+            # Compact vectors for the coarse search (full vectors kept for rescoring)
+            if COMPACT_VECTORS:
+                compact_index = build_compact_index(
+                    [ids[i] for i in rows],
+                    [metadatas[i] for i in rows],
+                    embeddings[rows],
+                    COMPACT_VECTORS,
+                    path=shard_compact_dir(state) if state else COMPACT_INDEX_DIR
+                )
+                compact_memory += compact_index.memory_bytes()
+                compact_full += compact_index.full_bytes()
         
-        print(f"✓ Stored {len(ids)} chunks in ChromaDB")
+        print(f"✓ Stored {len(ids)} {'child passages' if children else 'chunks'} in ChromaDB")
+        
+        if COMPACT_VECTORS:
+            manifest['compact_vectors'] = {
+                'mode': COMPACT_VECTORS,
+                'memory_bytes': compact_memory,
+                'full_bytes': compact_full
+            }
+            print(
+                f"✓ Built {COMPACT_VECTORS} compact vectors: {compact_memory / 1e6:.1f} MB in memory "
+                f"vs {compact_full / 1e6:.1f} MB float32"
+            )
+        
+        # Small routing index: one vector per section title + summary
+        if sections:
+            section_collection = chroma_client.create_collection(
+                name=SECTION_COLLECTION_NAME,
+                metadata={"description": "Section routing index"}
+            )
+            section_collection.add(
+                ids=[section['id'] for section in sections],
+                metadatas=[section_metadata(section) for section in sections],
+                embeddings=section_embeddings.tolist()
+            )
+            print(f"✓ Stored {len(sections)} sections in {SECTION_COLLECTION_NAME}")
+        
+        # Parent -> children links, read by retrieval to return parents
+        if children:
+            update_hierarchy(parents)
+            print(f"✓ Wrote chunk hierarchy: {CHUNK_HIERARCHY_PATH} ({len(parents)} parents)")
+        
+        # Write the stats manifest read by the app
+        write_manifest(manifest)
+        print(f"✓ Wrote index manifest: {INDEX_MANIFEST_PATH} (version {manifest['index_version']})")
         
         # Verify counts per state
         print("\nState breakdown:")
-        for state in SUPPORTED_STATES:
-            state_chunks = [c for c in all_chunks if c['state'] == state]
-            time_keyword_chunks = [c for c in state_chunks if c['has_time_keywords']]
-            print(f"  {state}: {len(state_chunks)} chunks ({len(time_keyword_chunks)} with time keywords)")
+        for state, state_stats in manifest['states'].items():
+            print(
+                f"  {state}: {state_stats['chunks']} chunks "
+                f"({state_stats['time_keyword_chunks']} with time keywords, {state_stats['pages']} pages)"
+            )
         
     except Exception as e:
         print(f"❌ Error storing in ChromaDB: {str(e)}")
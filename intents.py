@@ -0,0 +1,181 @@
+"""
+Query intent classification on the embedding already computed for retrieval.
+
+Every intent has a handful of example questions. Their embeddings are the
+intent's prototype vectors, and a query gets the intent of its most similar
+prototype (cosine similarity). Classifying is one small matrix product on the
+query embedding, with no extra forward pass of the embedding model.
+
+Prototypes are embedded once per embedding model and cached in
+INTENT_PROTOTYPES_PATH; the cache is rebuilt when the model or the examples
+change.
+
+Each intent selects a retrieval strategy (see RAGPipeline._retrieve_batch):
+
+    time     work hours, night work, closure windows: an extra query over
+             chunks tagged with time keywords, whose hits are boosted
+    general  everything else: one dense query
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from config import INTENT_PROTOTYPES_PATH
+
+
+PROTOTYPES_FORMAT = 1
+
+# The general examples include questions that say "when", "daily" or "time"
+# without asking about time of day, which keyword matching would misroute
+INTENTS = {
+    "time": {
+        'boost_time_keywords': True,
+        'examples': [
+            "Are there any nighttime restrictions for maintenance work?",
+            "What hours can lane closures be scheduled on a freeway?",
+            "Can maintenance crews work at night?",
+            "What are the allowed work hours for maintenance operations?",
+            "Are lane closures prohibited during peak traffic hours?",
+            "What time of day may maintenance be performed on urban highways?",
+            "Is there a curfew for road work near residential areas?",
+            "Must work zones be cleared before the morning rush hour?",
+            "Which closure windows apply to work on interstate lanes?",
+            "Is off-peak scheduling required for pavement repairs?",
+            "Do crews work overnight shifts on major projects?",
+            "Are daytime lane closures allowed on weekends and holidays?"
+        ]
+    },
+    "general": {
+        'boost_time_keywords': False,
+        'examples': [
+            "What is the definition of routine maintenance?",
+            "How are potholes repaired on asphalt roads?",
+            "Who approves maintenance contracts above the purchase limit?",
+            "What training is required for equipment operators?",
+            "How should herbicides be applied along the right of way?",
+            "What records must be kept for stockpiled materials?",
+            "What are the responsibilities of the district maintenance engineer?",
+            "How often are culverts and drainage structures cleaned?",
+            "When must a damaged guardrail be replaced?",
+            "When should a bridge inspection report be submitted?",
+            "What daily reports must crew supervisors submit?",
+            "How much time is allowed to respond to a sign knockdown?",
+            "What safety equipment must flaggers wear?",
+            "How is pavement condition rated?",
+            "How is salt for snow and ice control stored?"
+        ]
+    }
+}
+
+
+def examples_digest(intents: Dict[str, Dict[str, any]] = INTENTS) -> str:
+    """Get a digest of the intent names and examples (the prototype cache key)."""
+    payload = json.dumps({name: intent['examples'] for name, intent in intents.items()}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IntentClassifier:
+    """Nearest-prototype classifier over query embeddings."""
+
+    def __init__(self, names: List[str], prototypes: np.ndarray, offsets: np.ndarray):
+        """
+        Args:
+            names: Intent names
+            prototypes: Example embeddings, grouped by intent in names order
+            offsets: Row where each intent's examples start in prototypes
+        """
+        self.names = list(names)
+        norms = np.linalg.norm(prototypes, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.prototypes = np.asarray(prototypes / norms, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def scores(self, query_embeddings: List[List[float]]) -> np.ndarray:
+        """
+        Score queries against every intent.
+
+        Args:
+            query_embeddings: Query vectors
+
+        Returns:
+            Array (queries x intents) of the best cosine similarity to each
+            intent's prototypes
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        similarities = (queries / norms) @ self.prototypes.T
+        return np.maximum.reduceat(similarities, self.offsets, axis=1)
+
+    def classify(self, query_embeddings: List[List[float]]) -> List[str]:
+        """
+        Get the intent of each query.
+
+        Args:
+            query_embeddings: Query vectors
+
+        Returns:
+            Intent names, in query order
+        """
+        if not len(query_embeddings):
+            return []
+        return [self.names[i] for i in np.argmax(self.scores(query_embeddings), axis=1)]
+
+
+def load_intent_classifier(
+    embedding_model,
+    model_name: str,
+    path: Path = INTENT_PROTOTYPES_PATH,
+    intents: Dict[str, Dict[str, any]] = INTENTS
+) -> IntentClassifier:
+    """
+    Get a classifier, embedding the prototypes only if the cache is stale.
+
+    Args:
+        embedding_model: SentenceTransformer the queries are embedded with
+        model_name: Name of that model (part of the cache key)
+        path: Prototype cache file
+        intents: Intent table (see INTENTS)
+
+    Returns:
+        IntentClassifier
+    """
+    names = list(intents)
+    digest = examples_digest(intents)
+    path = Path(path)
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if (
+                int(data['format']) == PROTOTYPES_FORMAT
+                and str(data['model']) == model_name
+                and str(data['digest']) == digest
+            ):
+                return IntentClassifier(names, data['prototypes'], data['offsets'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    examples = [example for name in names for example in intents[name]['examples']]
+    offsets = np.cumsum([0] + [len(intents[name]['examples']) for name in names[:-1]])
+    prototypes = np.asarray(embedding_model.encode(examples, batch_size=len(examples)), dtype=np.float32)
+
+    try:
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            format=np.array(PROTOTYPES_FORMAT),
+            model=np.array(model_name),
+            digest=np.array(digest),
+            prototypes=prototypes,
+            offsets=offsets
+        )
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # A read-only index still classifies; prototypes are re-embedded per process
+        print(f"⚠ Could not cache intent prototypes in {path}: {e}")
+
+    return IntentClassifier(names, prototypes, offsets)
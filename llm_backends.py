@@ -0,0 +1,167 @@
+"""
+LLM backends: factory for the chat model used by the RAG pipeline.
+
+Backends are selected by name (config.LLM_BACKEND):
+- groq: ChatGroq via the Groq API (requires GROQ_API_KEY)
+- fake: deterministic local stand-in for offline benchmarks and load tests
+"""
+import asyncio
+import re
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, AsyncIterator
+
+# LangChain is imported on first use to keep module import cheap
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, AIMessageChunk
+
+from config import (
+    LLM_BACKEND,
+    GROQ_API_KEY,
+    GROQ_MODEL,
+    LLM_MAX_TOKENS,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_TOKENS_PER_SEC,
+    TIME_KEYWORDS
+)
+
+
+# Matches excerpt headers written by RAGPipeline._format_context
+EXCERPT_PATTERN = re.compile(r"^\[Excerpt (\d+)\] \((.+?) (p\.[\d?]+(?:-[\d?]+)?)\):\n(.*?)(?=^\[Excerpt \d+\]|\Z)", re.M | re.S)
+STATE_SECTION_PATTERN = re.compile(r"^\[([A-Z]{2,})\]$", re.M)
+TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+
+class FakeChatModel:
+    """
+    Deterministic stand-in for a LangChain chat model.
+
+    Answers are built from the excerpts in the prompt and always carry
+    citations in the format the real prompt asks for, so downstream citation
+    handling is exercised. Latency and generation speed are simulated.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        tokens_per_sec: float = FAKE_LLM_TOKENS_PER_SEC,
+        max_tokens: int = LLM_MAX_TOKENS
+    ):
+        """
+        Args:
+            latency_ms: Simulated time to first token in milliseconds
+            tokens_per_sec: Simulated generation speed (<= 0 means instant)
+            max_tokens: Maximum number of answer tokens
+        """
+        self.latency = latency_ms / 1000.0
+        self.token_delay = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.max_tokens = max_tokens
+
+    def _answer(self, messages: List) -> str:
+        """Build the deterministic answer for a prompt."""
+        prompt = messages[-1].content if messages else ""
+        excerpts = EXCERPT_PATTERN.findall(prompt.split("\nUSER QUESTION:")[0])
+
+        if excerpts:
+            parts = ["Based on the provided manual excerpts:"]
+            for _, source, page_ref, text in excerpts[:3]:
+                sentence = " ".join(text.split())[:160].rstrip()
+                parts.append(f"- \"{sentence}...\" ({source} {page_ref})")
+            excerpt_text = " ".join(text for *_, text in excerpts).lower()
+            if not any(keyword in excerpt_text for keyword in TIME_KEYWORDS):
+                parts.append("No explicit time-of-day requirement found in the provided manual excerpts.")
+            return "\n".join(parts)
+
+        states = STATE_SECTION_PATTERN.findall(prompt)
+        if states:
+            return "Comparison of " + ", ".join(states) + ": each state's answer is summarized above, with its citations."
+
+        return "No explicit time-of-day requirement found in the provided manual excerpts."
+
+    def _tokens(self, messages: List) -> List[str]:
+        return TOKEN_PATTERN.findall(self._answer(messages))[:self.max_tokens]
+
+    def invoke(self, messages: List, *args, **kwargs) -> "AIMessage":
+        from langchain_core.messages import AIMessage
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_delay * len(tokens))
+        return AIMessage(content="".join(tokens))
+
+    async def ainvoke(self, messages: List, *args, **kwargs) -> "AIMessage":
+        from langchain_core.messages import AIMessage
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self.token_delay * len(tokens))
+        return AIMessage(content="".join(tokens))
+
+    def stream(self, messages: List, *args, **kwargs) -> Iterator["AIMessageChunk"]:
+        from langchain_core.messages import AIMessageChunk
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self.token_delay)
+            yield AIMessageChunk(content=token)
+
+    async def astream(self, messages: List, *args, **kwargs) -> AsyncIterator["AIMessageChunk"]:
+        from langchain_core.messages import AIMessageChunk
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_delay)
+            yield AIMessageChunk(content=token)
+
+
+def _create_groq_llm():
+    """Create the ChatGroq model."""
+    if not GROQ_API_KEY:
+        raise ValueError(
+            "GROQ_API_KEY not found. Please set it in your environment or .env file."
+        )
+
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model=GROQ_MODEL,
+        temperature=0.1,  # Low temperature for factual responses
+        max_tokens=LLM_MAX_TOKENS,
+        groq_api_key=GROQ_API_KEY,
+        max_retries=0  # Retries are handled by the gateway
+    )
+
+
+def _create_fake_llm():
+    """Create the deterministic local stand-in."""
+    return FakeChatModel()
+
+
+LLM_BACKENDS: Dict[str, Callable] = {
+    "groq": _create_groq_llm,
+    "fake": _create_fake_llm,
+}
+
+
+def create_llm(backend: str = LLM_BACKEND):
+    """
+    Create the chat model for a backend.
+
+    Args:
+        backend: Backend name (see LLM_BACKENDS)
+
+    Returns:
+        Chat model with invoke/ainvoke/stream methods
+
+    Raises:
+        ValueError: If the backend is unknown or misconfigured
+    """
+    try:
+        factory = LLM_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown LLM backend '{backend}'. Choose one of: {', '.join(LLM_BACKENDS)}"
+        )
+    return factory()
+
+
+def describe_backend(backend: str = LLM_BACKEND) -> str:
+    """Get a human-readable description of a backend."""
+    if backend == "groq":
+        return f"Groq model: {GROQ_MODEL}"
+    if backend == "fake":
+        return f"fake local model ({FAKE_LLM_LATENCY_MS:.0f} ms latency, {FAKE_LLM_TOKENS_PER_SEC:.0f} tokens/s)"
+    return backend
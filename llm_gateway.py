@@ -0,0 +1,628 @@
+"""
+LLM gateway: rate limiting, bounded concurrency, retries, deadlines, and a
+circuit breaker in front of a LangChain chat model.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CALL_TIMEOUT,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_TIMEOUT,
+    LLM_MAX_TOKENS
+)
+
+
+class LLMGatewayError(Exception):
+    """Base class for errors raised by the LLM gateway."""
+
+
+class CircuitOpenError(LLMGatewayError):
+    """Raised when the circuit breaker is open and calls are rejected."""
+
+
+class LLMDeadlineExceeded(LLMGatewayError):
+    """Raised when a call cannot complete before its deadline."""
+
+
+class LLMRetriesExhausted(LLMGatewayError):
+    """Raised when a retryable error persists after all retries."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate.
+
+    Reservations may drive the balance negative; the caller then waits for
+    the returned number of seconds, which keeps callers in FIFO order.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            per_minute: Refill rate in tokens per minute (<= 0 disables limiting)
+            capacity: Maximum burst size (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take tokens from the bucket.
+
+        Args:
+            amount: Number of tokens to take
+
+        Returns:
+            Seconds the caller must wait before the reservation is valid
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            # A single request larger than the bucket would otherwise never fit
+            self._tokens -= min(amount, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def refund(self, amount: float):
+        """Return tokens to the bucket (e.g. unused estimate or cancelled call)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = LLM_CIRCUIT_RESET_TIMEOUT
+    ):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before allowing a probe call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current breaker state (closed, open, or half_open)."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """
+        Admit or reject a call.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or a half-open probe is already running
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(
+                        "LLM circuit breaker is open after repeated failures; try again shortly."
+                    )
+                self._state = self.HALF_OPEN
+            if self._probe_in_flight:
+                raise CircuitOpenError("LLM circuit breaker is half-open; a probe call is in progress.")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit at the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Release a half-open probe that ended without a verdict (e.g. a 400 error)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class GatewayMetrics:
+    """Thread-safe counters and wait-time statistics for the gateway."""
+
+    # Upper bounds (seconds) of the queue-wait histogram buckets
+    WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.counters = {
+            'requests': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'deadline_exceeded': 0,
+            'circuit_rejections': 0
+        }
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(self.WAIT_BUCKETS) + 1)
+
+    def increment(self, name: str, amount: int = 1):
+        """Increment a named counter."""
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_wait(self, seconds: float):
+        """Record how long a call waited for admission."""
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(self.WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    @contextmanager
+    def queued(self):
+        """Track a caller waiting for admission."""
+        with self._lock:
+            self.queue_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+
+    def start_call(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end_call(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, any]:
+        """
+        Get a point-in-time copy of all metrics.
+
+        Returns:
+            Dictionary with queue_depth, in_flight, counters and wait statistics
+        """
+        with self._lock:
+            labels = [f"le_{bound}" for bound in self.WAIT_BUCKETS] + ["le_inf"]
+            return {
+                'queue_depth': self.queue_depth,
+                'in_flight': self.in_flight,
+                **self.counters,
+                'wait_count': self.wait_count,
+                'wait_avg': self.wait_sum / self.wait_count if self.wait_count else 0.0,
+                'wait_max': self.wait_max,
+                'wait_histogram': dict(zip(labels, self.wait_buckets))
+            }
+
+
+def estimate_tokens(messages: List) -> int:
+    """
+    Roughly estimate the prompt tokens of a list of chat messages.
+
+    Args:
+        messages: LangChain messages
+
+    Returns:
+        Estimated token count (about 4 characters per token)
+    """
+    return sum(len(getattr(message, 'content', '') or '') for message in messages) // 4 + 1
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Get the HTTP status code carried by an SDK exception, if any."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Check whether an error is a rate limit, server error, or transient network failure."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connection' in name or 'RateLimit' in name
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Get the Retry-After delay (seconds) from an SDK exception, if present."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Gateway in front of a LangChain chat model.
+
+    Every call is admitted through request and token rate limits plus a bounded
+    concurrency pool, runs under a deadline, is retried with jittered
+    exponential backoff on 429/5xx and transient errors, and is rejected early
+    while the circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        llm,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        call_timeout: float = LLM_CALL_TIMEOUT,
+        max_output_tokens: int = LLM_MAX_TOKENS,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            llm: LangChain chat model (anything with invoke/ainvoke/stream)
+            requests_per_minute: Request rate limit (<= 0 disables)
+            tokens_per_minute: Token rate limit (<= 0 disables)
+            max_concurrency: Maximum calls in flight
+            max_retries: Retries after the first attempt
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Maximum backoff delay in seconds
+            call_timeout: Default deadline per call in seconds, including queueing and retries
+            max_output_tokens: Output tokens reserved per call for rate limiting
+            circuit_breaker: Breaker to use (a new one by default)
+        """
+        self.llm = llm
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.call_timeout = call_timeout
+        self.max_output_tokens = max_output_tokens
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.stats = GatewayMetrics()
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Sync calls run here so a deadline can interrupt the wait
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="llm-gateway"
+        )
+
+    def metrics(self) -> Dict[str, any]:
+        """
+        Get gateway metrics.
+
+        Returns:
+            Dictionary with queue depth, in-flight calls, counters, wait-time
+            statistics and the circuit breaker state
+        """
+        snapshot = self.stats.snapshot()
+        snapshot['circuit_state'] = self.breaker.state
+        return snapshot
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        return time.monotonic() + (timeout if timeout is not None else self.call_timeout)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _reserve(self, messages: List, deadline_at: float) -> tuple:
+        """
+        Reserve rate-limit budget for one attempt.
+
+        Returns:
+            Tuple of (seconds to wait, reserved token count)
+        """
+        tokens = estimate_tokens(messages) + self.max_output_tokens
+        wait = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        if wait > 0:
+            self.stats.increment('rate_limited')
+        if time.monotonic() + wait > deadline_at:
+            self._refund(tokens)
+            self.stats.increment('deadline_exceeded')
+            raise LLMDeadlineExceeded(
+                f"LLM rate limit wait ({wait:.1f}s) exceeds the call deadline."
+            )
+        return wait, tokens
+
+    def _refund(self, tokens: int):
+        """Return the rate-limit budget of an attempt that never reached the LLM."""
+        self.request_bucket.refund(1)
+        self.token_bucket.refund(tokens)
+
+    def _settle_tokens(self, reserved: int, response):
+        """Refund the unused part of a token reservation once usage is known."""
+        usage = getattr(response, 'usage_metadata', None) or {}
+        used = usage.get('total_tokens')
+        if used is not None and used < reserved:
+            self.token_bucket.refund(reserved - used)
+
+    def _admit(self, messages: List, deadline_at: float) -> int:
+        """Wait for rate-limit budget and a concurrency slot (sync)."""
+        start = time.monotonic()
+        with self.stats.queued():
+            wait, tokens = self._reserve(messages, deadline_at)
+            time.sleep(wait)
+            if not self._acquire_slot(deadline_at):
+                self._refund(tokens)
+                self.stats.increment('deadline_exceeded')
+                raise LLMDeadlineExceeded("Timed out waiting for a free LLM slot.")
+        self.stats.observe_wait(time.monotonic() - start)
+        return tokens
+
+    async def _aadmit(self, messages: List, deadline_at: float) -> int:
+        """Wait for rate-limit budget and a concurrency slot (async)."""
+        start = time.monotonic()
+        with self.stats.queued():
+            wait, tokens = self._reserve(messages, deadline_at)
+            try:
+                await asyncio.sleep(wait)
+                # The blocking wait runs in a thread, so waiters are woken by
+                # the semaphore like sync callers instead of polling for a slot
+                acquire = asyncio.get_running_loop().run_in_executor(None, self._acquire_slot, deadline_at)
+                try:
+                    acquired = await asyncio.shield(acquire)
+                except asyncio.CancelledError:
+                    # The thread may still get a slot; give it back when it does
+                    acquire.add_done_callback(
+                        lambda future: future.result() and self._slots.release()
+                    )
+                    raise
+            except asyncio.CancelledError:
+                self._refund(tokens)
+                raise
+            if not acquired:
+                self._refund(tokens)
+                self.stats.increment('deadline_exceeded')
+                raise LLMDeadlineExceeded("Timed out waiting for a free LLM slot.")
+        self.stats.observe_wait(time.monotonic() - start)
+        return tokens
+
+    def _acquire_slot(self, deadline_at: float) -> bool:
+        """Wait until a concurrency slot is free or the deadline passes."""
+        return self._slots.acquire(timeout=max(0.0, deadline_at - time.monotonic()))
+
+    def _run_with_retries(self, attempt_call: Callable[[float], any], deadline_at: float):
+        """
+        Run attempt_call(remaining_seconds) with breaker checks and retries (sync).
+        """
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats.increment('circuit_rejections')
+                raise
+            self.stats.increment('requests')
+            try:
+                result = attempt_call(deadline_at)
+            except LLMDeadlineExceeded:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    self.breaker.release_probe()
+                    self.stats.increment('failures')
+                    raise
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries:
+                    self.stats.increment('failures')
+                    raise LLMRetriesExhausted(f"LLM call failed after {attempt + 1} attempts: {str(e)}") from e
+                if time.monotonic() + delay >= deadline_at:
+                    self.stats.increment('deadline_exceeded')
+                    raise LLMDeadlineExceeded(f"LLM call deadline reached while retrying: {str(e)}") from e
+                self.stats.increment('retries')
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            self.stats.increment('successes')
+            return result
+
+    def invoke(self, messages: List, timeout: Optional[float] = None):
+        """
+        Call the model's invoke through the gateway.
+
+        Args:
+            messages: LangChain messages
+            timeout: Deadline in seconds (defaults to call_timeout)
+
+        Returns:
+            The model's response message
+
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the call
+            LLMDeadlineExceeded: If the deadline passes while queued, running, or backing off
+            LLMRetriesExhausted: If retryable errors persist after all retries
+        """
+        deadline_at = self._deadline(timeout)
+
+        def attempt(deadline_at: float):
+            tokens = self._admit(messages, deadline_at)
+            self.stats.start_call()
+            future = self._executor.submit(self.llm.invoke, messages)
+
+            # The slot is held until the underlying call really finishes
+            def release(_):
+                self.stats.end_call()
+                self._slots.release()
+            future.add_done_callback(release)
+
+            try:
+                response = future.result(timeout=max(0.0, deadline_at - time.monotonic()))
+            except FutureTimeoutError:
+                self.stats.increment('deadline_exceeded')
+                raise LLMDeadlineExceeded("LLM call exceeded its deadline.")
+            self._settle_tokens(tokens, response)
+            return response
+
+        return self._run_with_retries(attempt, deadline_at)
+
+    async def ainvoke(self, messages: List, timeout: Optional[float] = None):
+        """
+        Call the model's ainvoke through the gateway.
+
+        Args:
+            messages: LangChain messages
+            timeout: Deadline in seconds (defaults to call_timeout)
+
+        Returns:
+            The model's response message
+
+        Raises:
+            Same as invoke
+        """
+        deadline_at = self._deadline(timeout)
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats.increment('circuit_rejections')
+                raise
+            self.stats.increment('requests')
+            try:
+                tokens = await self._aadmit(messages, deadline_at)
+                self.stats.start_call()
+                try:
+                    response = await asyncio.wait_for(
+                        self.llm.ainvoke(messages),
+                        max(0.0, deadline_at - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    self.stats.increment('deadline_exceeded')
+                    raise LLMDeadlineExceeded("LLM call exceeded its deadline.")
+                finally:
+                    self.stats.end_call()
+                    self._slots.release()
+                self._settle_tokens(tokens, response)
+            except (LLMDeadlineExceeded, asyncio.CancelledError):
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    self.breaker.release_probe()
+                    self.stats.increment('failures')
+                    raise
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries:
+                    self.stats.increment('failures')
+                    raise LLMRetriesExhausted(f"LLM call failed after {attempt + 1} attempts: {str(e)}") from e
+                if time.monotonic() + delay >= deadline_at:
+                    self.stats.increment('deadline_exceeded')
+                    raise LLMDeadlineExceeded(f"LLM call deadline reached while retrying: {str(e)}") from e
+                self.stats.increment('retries')
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            self.stats.increment('successes')
+            return response
+
+    def stream(self, messages: List, timeout: Optional[float] = None) -> Iterator:
+        """
+        Call the model's stream through the gateway.
+
+        Failures before the first chunk are retried like invoke; once chunks
+        have been yielded, errors propagate to the caller. The deadline is
+        checked between chunks.
+
+        Args:
+            messages: LangChain messages
+            timeout: Deadline in seconds (defaults to call_timeout)
+
+        Yields:
+            Message chunks from the model
+        """
+        deadline_at = self._deadline(timeout)
+
+        def attempt(deadline_at: float):
+            tokens = self._admit(messages, deadline_at)
+            self.stats.start_call()
+            try:
+                iterator = iter(self.llm.stream(messages))
+                first = next(iterator, None)
+            except Exception:
+                self.stats.end_call()
+                self._slots.release()
+                raise
+            return tokens, first, iterator
+
+        tokens, first, iterator = self._run_with_retries(attempt, deadline_at)
+        try:
+            if first is None:
+                return
+            yield first
+            for chunk in iterator:
+                if time.monotonic() > deadline_at:
+                    self.stats.increment('deadline_exceeded')
+                    raise LLMDeadlineExceeded("LLM stream exceeded its deadline.")
+                yield chunk
+        finally:
+            self.stats.end_call()
+            self._slots.release()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Concurrent load-test harness for RAGPipeline.answer_question.
+Replays a question corpus against one shared pipeline, either closed-loop at
+a fixed concurrency or open-loop at a fixed arrival rate, and reports
+throughput, per-stage latency percentiles, error rate, and peak RSS.
+
+Usage:
+    python loadtest.py --state TX --concurrency 8 --requests 200
+    python loadtest.py --state TX --rate 5 --duration 60 --backend groq
+"""
+import argparse
+import json
+import math
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from config import DATA_DIR, DEFAULT_TOP_K
+
+
+DEFAULT_QUESTIONS_FILE = DATA_DIR / "loadtest" / "questions.txt"
+DEFAULT_RESULTS_DIR = DATA_DIR / "loadtest" / "results"
+STAGES = ['embed', 'retrieve', 'format', 'llm', 'total']
+
+
+def load_questions(path: Path) -> List[str]:
+    """
+    Load the question corpus (one question per line, # comments allowed).
+
+    Args:
+        path: Path to the corpus file
+
+    Returns:
+        List of questions
+    """
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: Sample values
+        pct: Percentile between 0 and 100
+
+    Returns:
+        Percentile value (0.0 for an empty sample)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class LoadTestRecorder:
+    """Thread-safe collector of per-request results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def record(self, record: Dict[str, any]):
+        with self._lock:
+            self.records.append(record)
+
+
+def run_request(pipeline, recorder: LoadTestRecorder, state: str, question: str, k: int, scheduled: float):
+    """Answer one question and record its latency breakdown."""
+    started = time.perf_counter()
+    record = {
+        'question': question,
+        'queue_delay': started - scheduled,
+        'error': None,
+        'timings': {}
+    }
+    try:
+        response = pipeline.answer_question(state=state, question=question, k=k)
+        record['timings'] = response.get('timings', {})
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {str(e)}"
+    record['latency'] = time.perf_counter() - started
+    recorder.record(record)
+
+
+def run_closed_loop(pipeline, recorder, state, questions, k, concurrency, total_requests):
+    """Keep `concurrency` requests in flight until total_requests have been sent."""
+    counter = iter(range(total_requests))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            run_request(pipeline, recorder, state, questions[i % len(questions)], k, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(pipeline, recorder, state, questions, k, rate, duration, max_workers, seed):
+    """Send requests with Poisson arrivals at `rate` per second for `duration` seconds."""
+    rng = random.Random(seed)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        start = time.perf_counter()
+        next_arrival = start
+        i = 0
+        while next_arrival - start < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(
+                run_request, pipeline, recorder, state, questions[i % len(questions)], k, next_arrival
+            )
+            i += 1
+            next_arrival += rng.expovariate(rate)
+
+
+def summarize(records: List[Dict[str, any]], wall_time: float) -> Dict[str, any]:
+    """
+    Aggregate per-request records into the report.
+
+    Args:
+        records: Records from LoadTestRecorder
+        wall_time: Duration of the run in seconds
+
+    Returns:
+        Summary dictionary
+    """
+    successes = [r for r in records if r['error'] is None]
+    errors = [r for r in records if r['error'] is not None]
+
+    latency = {}
+    for stage in STAGES:
+        values = [r['timings'][stage] for r in successes if stage in r['timings']]
+        latency[stage] = {
+            'count': len(values),
+            'mean': sum(values) / len(values) if values else 0.0,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': max(values) if values else 0.0
+        }
+
+    queue_delays = [r['queue_delay'] for r in records]
+    error_types = {}
+    for r in errors:
+        name = r['error'].split(':', 1)[0]
+        error_types[name] = error_types.get(name, 0) + 1
+
+    return {
+        'requests': len(records),
+        'successes': len(successes),
+        'errors': len(errors),
+        'error_rate': len(errors) / len(records) if records else 0.0,
+        'error_types': error_types,
+        'wall_time': wall_time,
+        'throughput_rps': len(successes) / wall_time if wall_time > 0 else 0.0,
+        'latency': latency,
+        'queue_delay': {
+            'p50': percentile(queue_delays, 50),
+            'p95': percentile(queue_delays, 95),
+            'p99': percentile(queue_delays, 99)
+        },
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def print_report(summary: Dict[str, any]):
+    """Print the summary as a table."""
+    print(f"Requests:    {summary['requests']} ({summary['errors']} errors, {summary['error_rate']:.1%})")
+    print(f"Wall time:   {summary['wall_time']:.1f}s")
+    print(f"Throughput:  {summary['throughput_rps']:.2f} req/s")
+    print(f"Peak RSS:    {summary['peak_rss_mb']:.0f} MB")
+    batcher = summary.get('embedding_batcher')
+    if batcher:
+        print(f"Embeddings:  {batcher['requests']} queries in {batcher['batches']} batches "
+              f"(mean {batcher['mean_batch_size']:.1f}, window {batcher['window_ms']:.0f} ms)")
+    print()
+    print(f"{'Stage':<10} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for stage, stats in summary['latency'].items():
+        print(
+            f"{stage:<10} "
+            + " ".join(f"{stats[key] * 1000:>7.0f}ms" for key in ('mean', 'p50', 'p95', 'p99', 'max'))
+        )
+    if summary['error_types']:
+        print("\nErrors:")
+        for name, count in summary['error_types'].items():
+            print(f"  {name}: {count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test RAGPipeline.answer_question")
+    parser.add_argument("--state", default="TX", help="State code to query")
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS_FILE, help="Question corpus (one per line)")
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K, help="Chunks to retrieve per question")
+    parser.add_argument("--backend", default="fake", help="LLM backend (fake simulates the LLM; groq calls the API)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: requests kept in flight")
+    parser.add_argument("--requests", type=int, default=100, help="Closed loop: total requests")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: arrivals per second (overrides --concurrency)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Open loop: seconds to generate arrivals")
+    parser.add_argument("--max-workers", type=int, default=64, help="Open loop: maximum requests in flight")
+    parser.add_argument("--seed", type=int, default=0, help="Open loop: arrival process seed")
+    parser.add_argument("--embed-window-ms", type=float, default=None, help="Query-embedding batching window (default: EMBED_BATCH_WINDOW_MS)")
+    parser.add_argument("--embed-max-batch", type=int, default=None, help="Query-embedding maximum batch size (default: EMBED_MAX_BATCH_SIZE)")
+    parser.add_argument("--output", type=Path, default=None, help="JSON results path (default: data/loadtest/results/<timestamp>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the load test."""
+    args = parse_args(argv)
+
+    print("=" * 70)
+    print("RAG PIPELINE LOAD TEST")
+    print("=" * 70)
+    print()
+
+    questions = load_questions(args.questions)
+    if not questions:
+        print(f"❌ Error: No questions found in {args.questions}")
+        sys.exit(1)
+
+    mode = f"open loop, {args.rate}/s for {args.duration:.0f}s" if args.rate else \
+        f"closed loop, concurrency {args.concurrency}, {args.requests} requests"
+    print(f"📋 Questions: {len(questions)} from {args.questions}")
+    print(f"🏛️  State: {args.state}")
+    print(f"🤖 LLM backend: {args.backend}")
+    print(f"🚦 Mode: {mode}")
+    print()
+
+    from rag import RAGPipeline
+
+    load_start = time.perf_counter()
+    pipeline = RAGPipeline(llm_backend=args.backend)
+    load_time = time.perf_counter() - load_start
+    print(f"✓ Pipeline loaded in {load_time:.1f}s")
+    
+    if args.embed_window_ms is not None:
+        pipeline.embedder.window = args.embed_window_ms / 1000.0
+    if args.embed_max_batch is not None:
+        pipeline.embedder.max_batch_size = args.embed_max_batch
+    print()
+
+    recorder = LoadTestRecorder()
+    start = time.perf_counter()
+    if args.rate:
+        run_open_loop(pipeline, recorder, args.state, questions, args.k,
+                      args.rate, args.duration, args.max_workers, args.seed)
+    else:
+        run_closed_loop(pipeline, recorder, args.state, questions, args.k,
+                        args.concurrency, args.requests)
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(recorder.records, wall_time)
+    summary['pipeline_load_time'] = load_time
+    summary['llm_gateway'] = pipeline.llm_gateway.metrics()
+    summary['embedding_batcher'] = pipeline.embedder.stats()
+
+    print("RESULTS")
+    print("-" * 70)
+    print_report(summary)
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = DEFAULT_RESULTS_DIR / f"loadtest-{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'state': args.state,
+            'questions_file': str(args.questions),
+            'question_count': len(questions),
+            'k': args.k,
+            'backend': args.backend,
+            'mode': 'open' if args.rate else 'closed',
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'rate': args.rate,
+            'duration': args.duration,
+            'embed_window_ms': pipeline.embedder.window * 1000,
+            'embed_max_batch': pipeline.embedder.max_batch_size
+        },
+        'summary': summary
+    }
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print()
+    print(f"✓ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Rendering of cited PDF pages with the cited text highlighted.
+
+A page is rendered to PNG with PyMuPDF. The snippet's lines are searched on
+the page and the matches are drawn as a highlight annotation, which is removed
+again after rendering. Rendered images go into a size-bounded disk LRU keyed
+by the PDF's content hash, page, DPI and highlighted text, so repeat views of
+a page are a file read. Documents stay open in a small handle pool instead of
+being reopened for every render.
+
+Cache files (in PAGE_CACHE_DIR):
+    <file hash>-p<page>-d<dpi>-<highlight digest or "plain">.png
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import (
+    PAGE_CACHE_DIR,
+    PAGE_CACHE_MAX_MB,
+    PAGE_RENDER_DPI,
+    PAGE_RENDER_MAX_DPI,
+    PDF_DIR,
+    PDF_HANDLE_POOL_SIZE
+)
+from tracing import PAGE_CACHE_HITS, PAGE_CACHE_MISSES, span
+
+
+MIN_RENDER_DPI = 36
+MIN_HIGHLIGHT_CHARS = 12  # shorter snippet lines match too many places on a page
+HIGHLIGHT_COLOR = (1.0, 0.85, 0.0)
+
+_hashes: Dict[tuple, str] = {}
+_hashes_lock = threading.Lock()
+
+
+def file_hash(path: Path) -> str:
+    """
+    Get the SHA-256 of a file's contents.
+
+    Hashes are remembered per (path, size, modification time), so a file is
+    only read again after it changes.
+
+    Args:
+        path: File path
+
+    Returns:
+        Hex digest
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _hashes_lock:
+        digest = _hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _hashes_lock:
+            _hashes[key] = digest
+    return digest
+
+
+def highlight_lines(snippet: str) -> List[str]:
+    """
+    Split a citation snippet into the lines searched for on the page.
+
+    Args:
+        snippet: Citation snippet (a trailing "..." is ignored)
+
+    Returns:
+        Lines long enough to be a meaningful match
+    """
+    if snippet.endswith("..."):
+        snippet = snippet[:-3]
+    return [line.strip() for line in snippet.splitlines() if len(line.strip()) >= MIN_HIGHLIGHT_CHARS]
+
+
+class _PooledDocument:
+    """An open document with its lock and the number of callers borrowing it."""
+
+    def __init__(self, document: "fitz.Document"):
+        self.document = document
+        self.lock = threading.Lock()
+        self.borrowers = 0  # changed under the pool lock
+
+
+class DocumentPool:
+    """
+    LRU pool of open PDF documents.
+
+    A PyMuPDF document is not safe to use from several threads at once, so
+    each document has its own lock and is lent to one caller at a time.
+    Borrowed documents are pinned: eviction never closes a document between
+    the moment a caller takes it from the pool and the end of its render.
+    """
+
+    def __init__(self, size: int = PDF_HANDLE_POOL_SIZE):
+        """
+        Args:
+            size: Most documents kept open
+        """
+        self.size = size
+        self._documents = OrderedDict()  # path -> _PooledDocument
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path: Path) -> Iterator["fitz.Document"]:
+        """
+        Borrow an open document, opening it on first use.
+
+        Args:
+            path: PDF path
+
+        Yields:
+            The open document, locked for the caller
+        """
+        key = str(path)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is None:
+                import fitz
+                entry = self._documents[key] = _PooledDocument(fitz.open(key))
+            entry.borrowers += 1
+            self._documents.move_to_end(key)
+            self._evict()
+
+        try:
+            with entry.lock:
+                yield entry.document
+        finally:
+            with self._lock:
+                entry.borrowers -= 1
+                # Documents pinned during an earlier eviction are closed now
+                self._evict()
+
+    def preopen(self, paths: Iterable[Path]):
+        """Open documents ahead of the first render (at most the pool size)."""
+        for path in list(paths)[:self.size]:
+            with self.open(path):
+                pass
+
+    def _evict(self):
+        """Close least recently used documents beyond the pool size (pool lock held)."""
+        for key in list(self._documents):
+            if len(self._documents) <= self.size:
+                break
+            entry = self._documents[key]
+            # A borrowed document stays open until a later eviction
+            if entry.borrowers == 0:
+                del self._documents[key]
+                entry.document.close()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def close(self):
+        """Close every document."""
+        with self._lock:
+            for entry in self._documents.values():
+                with entry.lock:
+                    entry.document.close()
+            self._documents.clear()
+
+
+class PageCache:
+    """
+    Size-bounded LRU of rendered pages on disk.
+
+    Recency is the file modification time, refreshed on every hit, so the
+    order survives restarts and is shared by processes using the same
+    directory.
+    """
+
+    def __init__(self, directory: Path = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_MB * 1024 * 1024):
+        """
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Total size of cached images to keep
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        files = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".png")),
+            key=lambda entry: entry.stat().st_mtime_ns
+        )
+        self._sizes = OrderedDict((entry.name, entry.stat().st_size) for entry in files)
+        self._total = sum(self._sizes.values())
+
+    def get(self, name: str) -> Optional[bytes]:
+        """
+        Get a cached image.
+
+        Args:
+            name: Cache file name
+
+        Returns:
+            PNG bytes, or None on a miss
+        """
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._sizes.pop(name, 0)
+            return None
+
+        with self._lock:
+            if name not in self._sizes:
+                self._total += len(data)
+            self._sizes[name] = len(data)
+            self._sizes.move_to_end(name)
+        return data
+
+    def put(self, name: str, data: bytes):
+        """
+        Store an image, evicting the least recently used ones beyond the size bound.
+
+        Args:
+            name: Cache file name
+            data: PNG bytes
+        """
+        path = self.directory / name
+        tmp_path = path.with_name(f"{name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(data)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                oldest, size = self._sizes.popitem(last=False)
+                (self.directory / oldest).unlink(missing_ok=True)
+                self._total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number and total size of cached images."""
+        with self._lock:
+            return {'images': len(self._sizes), 'bytes': self._total, 'max_bytes': self.max_bytes}
+
+
+class PageRenderer:
+    """Renders cited pages of the manuals in PDF_DIR, through the page cache."""
+
+    def __init__(
+        self,
+        pdf_dir: Path = PDF_DIR,
+        cache: Optional[PageCache] = None,
+        pool: Optional[DocumentPool] = None,
+        preopen: bool = True
+    ):
+        """
+        Args:
+            pdf_dir: Directory holding the source PDFs
+            cache: Disk cache for rendered pages (default: PAGE_CACHE_DIR)
+            pool: Document handle pool (default: PDF_HANDLE_POOL_SIZE handles)
+            preopen: Open the PDFs in pdf_dir now rather than on first render
+        """
+        self.pdf_dir = Path(pdf_dir)
+        self.cache = cache or PageCache()
+        self.pool = pool or DocumentPool()
+        if preopen:
+            self.pool.preopen(sorted(self.pdf_dir.glob("*.pdf")))
+
+    def resolve(self, source_file: str) -> Path:
+        """
+        Get the path of a source PDF.
+
+        Args:
+            source_file: PDF file name, as stored in chunk metadata
+
+        Returns:
+            Path inside pdf_dir
+
+        Raises:
+            ValueError: If the name is not a plain file name
+            FileNotFoundError: If the PDF does not exist
+        """
+        if not source_file or Path(source_file).name != source_file:
+            raise ValueError(f"Invalid source file name: {source_file!r}")
+        path = self.pdf_dir / source_file
+        if not path.is_file():
+            raise FileNotFoundError(f"PDF not found: {source_file}")
+        return path
+
+    def render(
+        self,
+        source_file: str,
+        page_num: int,
+        dpi: int = PAGE_RENDER_DPI,
+        highlight: str = ""
+    ) -> bytes:
+        """
+        Render one page to PNG, with the given text highlighted.
+
+        Args:
+            source_file: PDF file name
+            page_num: 1-based page number
+            dpi: Resolution
+            highlight: Text to highlight (e.g. a citation snippet); lines not
+                found on the page are ignored
+
+        Returns:
+            PNG bytes
+
+        Raises:
+            ValueError: If the file name, page number or DPI is invalid
+            FileNotFoundError: If the PDF does not exist
+        """
+        if not MIN_RENDER_DPI <= dpi <= PAGE_RENDER_MAX_DPI:
+            raise ValueError(f"DPI must be between {MIN_RENDER_DPI} and {PAGE_RENDER_MAX_DPI}")
+        path = self.resolve(source_file)
+
+        lines = highlight_lines(highlight)
+        variant = hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()[:12] if lines else "plain"
+        name = f"{file_hash(path)[:16]}-p{page_num}-d{dpi}-{variant}.png"
+
+        data = self.cache.get(name)
+        if data is not None:
+            PAGE_CACHE_HITS.inc()
+            return data
+
+        PAGE_CACHE_MISSES.inc()
+        with span("render_page", source=source_file, page=page_num, dpi=dpi):
+            with self.pool.open(path) as document:
+                if not 1 <= page_num <= document.page_count:
+                    raise ValueError(f"{source_file} has no page {page_num}")
+                page = document[page_num - 1]
+
+                quads = []
+                for line in lines:
+                    quads.extend(page.search_for(line, quads=True))
+
+                annot = None
+                try:
+                    if quads:
+                        annot = page.add_highlight_annot(quads)
+                        annot.set_colors(stroke=HIGHLIGHT_COLOR)
+                        annot.update()
+                    data = page.get_pixmap(dpi=dpi, annots=True).tobytes("png")
+                finally:
+                    # Pooled documents are shared; leave them unmodified
+                    if annot is not None:
+                        page.delete_annot(annot)
+
+        self.cache.put(name, data)
+        return data
+
+    def close(self):
+        """Close the pooled documents."""
+        self.pool.close()
@@ -4,9 +4,17 @@ Extracts text from PDF files page by page with metadata.
 """
 import fitz  # PyMuPDF
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import re
 
+from state_registry import known_jurisdictions, state_from_filename
+
+
+# Running page headers, used for the section outline when a PDF has no TOC
+CHAPTER_HEADER_PATTERN = re.compile(r"^Chapter \d+[A-Z]?: .+$")
+SECTION_HEADER_PATTERN = re.compile(r"^Section \d+[A-Z]?: .+$")
+HEADER_SCAN_LINES = 4
+
 
 def normalize_whitespace(text: str) -> str:
     """
@@ -84,28 +92,117 @@ def extract_pdf_pages(pdf_path: Path) -> List[Dict[str, any]]:
     return pages
 
 
-def extract_state_from_filename(filename: str) -> str:
+def extract_outline(pdf_path: Path, pages: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Get a PDF's chapter/section outline.
+    
+    Uses the PDF's own outline (bookmarks) when it has one. Otherwise the
+    outline is rebuilt from running page headers such as
+    "Chapter 1: Definitions and Planning" / "Section 2: Definitions of Maintenance".
+    
+    Args:
+        pdf_path: Path to the PDF file
+        pages: Pages from extract_pdf_pages
+        
+    Returns:
+        List of outline entries in document order, each with:
+        - level: 1-based nesting level
+        - title: entry title
+        - page: 1-based first page
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        toc = doc.get_toc(simple=True)
+    finally:
+        doc.close()
+    
+    if toc:
+        return [
+            {"level": level, "title": title.strip(), "page": page}
+            for level, title, page in toc
+            if page > 0 and title.strip()
+        ]
+    
+    return detect_header_outline(pages)
+
+
+def detect_header_outline(pages: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Rebuild an outline from "Chapter N: ..." / "Section N: ..." running headers.
+    
+    Section headers are read from the top lines of each page. Chapter titles
+    are accepted anywhere on the page, since chapter opener pages carry them
+    below a list of the chapter's sections. Table-of-contents pages (lines
+    with dot leaders) are skipped.
+    
+    Args:
+        pages: Pages from extract_pdf_pages
+        
+    Returns:
+        Outline entries (chapters at level 1, sections at level 2)
+    """
+    outline = []
+    chapter = None
+    section = None
+    
+    for page in pages:
+        lines = [line.strip() for line in page["text"].splitlines() if line.strip()]
+        if any(". . ." in line for line in lines):
+            continue
+        page_chapter = next((line for line in lines if CHAPTER_HEADER_PATTERN.match(line)), None)
+        page_section = next(
+            (line for line in lines[:HEADER_SCAN_LINES] if SECTION_HEADER_PATTERN.match(line)),
+            None
+        )
+        
+        if page_chapter and page_chapter != chapter:
+            chapter = page_chapter
+            section = None
+            outline.append({"level": 1, "title": chapter, "page": page["page_num"]})
+        if chapter and page_section and page_section != section:
+            section = page_section
+            outline.append({"level": 2, "title": section, "page": page["page_num"]})
+    
+    return outline
+
+
+def assign_sections(pages: List[Dict[str, any]], outline: List[Dict[str, any]]):
     """
-    Extract state code from filename.
+    Set each page's section_path: the titles of the outline entries, one per
+    level, that are open on that page (empty before the first entry).
+    
+    Args:
+        pages: Pages from extract_pdf_pages (updated in place)
+        outline: Outline entries from extract_outline
+    """
+    entries = sorted(outline, key=lambda entry: entry["page"])
+    path = []
+    next_entry = 0
+    
+    for page in pages:
+        while next_entry < len(entries) and entries[next_entry]["page"] <= page["page_num"]:
+            entry = entries[next_entry]
+            path = path[:entry["level"] - 1] + [entry["title"]]
+            next_entry += 1
+        page["section_path"] = list(path)
+
+
+def extract_state_from_filename(filename: str, known: Optional[Dict[str, str]] = None) -> str:
+    """
+    Extract state (or agency) code from filename.
     Expected format: {STATE}_*.pdf (e.g., CA_Caltrans_Maintenance_Manual.pdf)
     
     Args:
         filename: Name of the PDF file
+        known: Known jurisdiction codes (default: state_registry.known_jurisdictions())
         
     Returns:
-        State code (CA, TX, or WA)
+        Jurisdiction code (e.g. CA, TX, FHWA)
         
     Raises:
         ValueError: If state cannot be determined
     """
-    # Get first part before underscore
-    parts = filename.split('_')
-    if parts:
-        state = parts[0].upper()
-        if state in ["CA", "TX", "WA"]:
-            return state
-    
-    raise ValueError(f"Cannot determine state from filename: {filename}")
+    return state_from_filename(filename, known)
 
 
 def extract_title_from_filename(filename: str) -> str:
@@ -139,14 +236,16 @@ def extract_all_pdfs(pdf_dir: Path) -> List[Dict[str, any]]:
         - state: State code
         - source_file: Filename
         - title: Friendly title
-        - pages: List of page dictionaries
+        - pages: List of page dictionaries (with section_path)
         - total_pages: Total page count
+        - outline: Chapter/section outline
     """
     if not pdf_dir.exists():
         raise FileNotFoundError(f"PDF directory not found: {pdf_dir}")
     
     documents = []
     pdf_files = sorted(pdf_dir.glob("*.pdf"))
+    known = known_jurisdictions()
     
     if not pdf_files:
         raise ValueError(f"No PDF files found in {pdf_dir}")
@@ -155,11 +254,13 @@ def extract_all_pdfs(pdf_dir: Path) -> List[Dict[str, any]]:
         try:
             # Extract metadata from filename
             filename = pdf_path.name
-            state = extract_state_from_filename(filename)
+            state = extract_state_from_filename(filename, known)
             title = extract_title_from_filename(filename)
             
-            # Extract pages
+            # Extract pages and map each page to its chapter/section
             pages = extract_pdf_pages(pdf_path)
+            outline = extract_outline(pdf_path, pages)
+            assign_sections(pages, outline)
             
             documents.append({
                 "state": state,
@@ -167,7 +268,8 @@ def extract_all_pdfs(pdf_dir: Path) -> List[Dict[str, any]]:
                 "title": title,
                 "pages": pages,
                 "total_pages": len(pages),
-                "pdf_path": str(pdf_path)
+                "pdf_path": str(pdf_path),
+                "outline": outline
             })
             
             print(f"✓ Extracted {len(pages)} pages from {filename} (State: {state})")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiler.
+Starts a fresh Python process with `-X importtime` and reports where startup
+time goes: per-module import time, then each step from importing the RAG
+module to the first answer. Results are written as JSON so a later run can be
+compared against them to catch cold-start regressions.
+
+Usage:
+    python profile_startup.py
+    python profile_startup.py --backend groq --state TX
+    python profile_startup.py --baseline data/benchmarks/results/startup-<timestamp>.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import DATA_DIR, DEFAULT_TOP_K, WARMUP_QUERY
+
+
+RESULTS_DIR = DATA_DIR / "benchmarks" / "results"
+RESULT_PREFIX = "RESULT "
+IMPORTTIME_PREFIX = "import time:"
+
+
+def run_worker(backend: str, state: str, question: str, warm_up: bool) -> Dict[str, any]:
+    """
+    Go from a bare interpreter to two answered questions, timing each step.
+
+    Returns:
+        Dictionary of step durations in seconds, in execution order
+    """
+    steps = {}
+
+    start = time.perf_counter()
+    import rag
+    steps['import_rag'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rag.get_collection_stats()
+    steps['collection_stats'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from registry import get_pipeline
+    pipeline = get_pipeline(backend)
+    steps['load_pipeline'] = time.perf_counter() - start
+
+    if warm_up:
+        start = time.perf_counter()
+        pipeline.warm_up(state)
+        steps['warm_up'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pipeline.answer_question(state=state, question=question, k=DEFAULT_TOP_K)
+    steps['first_answer'] = time.perf_counter() - start
+
+    # Vary the text so the query-embedding cache does not skip the embed step
+    start = time.perf_counter()
+    pipeline.answer_question(state=state, question=question + " ", k=DEFAULT_TOP_K)
+    steps['second_answer'] = time.perf_counter() - start
+
+    return steps
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, any]]:
+    """
+    Aggregate `-X importtime` output by top-level package.
+
+    Each module's own ("self") import time is added to its top-level package,
+    so a package's total is the time spent importing its modules, wherever
+    they were imported from.
+
+    Returns:
+        Rows of package, seconds and module count, slowest first
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith(IMPORTTIME_PREFIX):
+            continue
+        try:
+            self_us, _, name = line[len(IMPORTTIME_PREFIX):].split("|")
+            self_seconds = int(self_us) / 1e6
+        except ValueError:
+            continue  # header line
+        package = name.strip().split(".")[0]
+        entry = packages.setdefault(package, {'package': package, 'seconds': 0.0, 'modules': 0})
+        entry['seconds'] += self_seconds
+        entry['modules'] += 1
+    return sorted(packages.values(), key=lambda row: row['seconds'], reverse=True)
+
+
+def profile(args) -> Dict[str, any]:
+    """Run the worker in a fresh process and collect its timings."""
+    command = [
+        sys.executable, "-X", "importtime", __file__, "--worker",
+        "--backend", args.backend,
+        "--state", args.state,
+        "--question", args.question
+    ]
+    if args.no_warmup:
+        command.append("--no-warmup")
+
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    steps = None
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            steps = json.loads(line[len(RESULT_PREFIX):])
+    if steps is None:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith(IMPORTTIME_PREFIX)]
+        raise RuntimeError("Startup worker failed:\n" + "\n".join(errors[-20:]))
+
+    imports = parse_importtime(completed.stderr)
+    first_answer_at = sum(seconds for name, seconds in steps.items() if name != 'second_answer')
+    return {
+        'steps': steps,
+        'imports': imports,
+        'import_seconds': sum(row['seconds'] for row in imports),
+        'time_to_first_answer': first_answer_at,
+        'process_wall': wall
+    }
+
+
+def print_report(result: Dict[str, any], top: int, baseline: Optional[Dict[str, any]] = None):
+    """Print slowest imports, step timings and (optionally) deltas against a baseline."""
+    print(f"{'Slowest imports':<32} {'Time':>9} {'Modules':>8}")
+    for row in result['imports'][:top]:
+        print(f"{row['package']:<32} {row['seconds'] * 1000:>7.0f}ms {row['modules']:>8}")
+    print(f"{'all imports':<32} {result['import_seconds'] * 1000:>7.0f}ms")
+    print()
+
+    base_steps = baseline['steps'] if baseline else {}
+    print(f"{'Step':<32} {'Time':>9}" + (f" {'Baseline':>9} {'Change':>8}" if baseline else ""))
+    rows = list(result['steps'].items()) + [('time_to_first_answer', result['time_to_first_answer'])]
+    for name, seconds in rows:
+        line = f"{name:<32} {seconds:>8.2f}s"
+        base = baseline.get(name) if name == 'time_to_first_answer' and baseline else base_steps.get(name)
+        if base:
+            line += f" {base:>8.2f}s {(seconds - base) / base:>+7.0%}"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile cold start: import times and time to first answer")
+    parser.add_argument("--backend", default="fake", help="LLM backend for the first answer")
+    parser.add_argument("--state", default="TX", help="State code to ask about")
+    parser.add_argument("--question", default=WARMUP_QUERY, help="Question to answer")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the warm-up query before the first answer")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier results JSON to compare against")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.2,
+        help="With --baseline, exit with status 1 if time to first answer grew by more than this fraction"
+    )
+    parser.add_argument("--output", type=Path, default=None, help="JSON results path")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the cold-start profiler."""
+    args = parse_args(argv)
+
+    if args.worker:
+        steps = run_worker(args.backend, args.state, args.question, warm_up=not args.no_warmup)
+        print(RESULT_PREFIX + json.dumps(steps))
+        return
+
+    print("=" * 70)
+    print("COLD-START PROFILE")
+    print("=" * 70)
+    print(f"Backend: {args.backend} · State: {args.state} · Warm-up: {'off' if args.no_warmup else 'on'}")
+    print()
+
+    result = profile(args)
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    print_report(result, args.top, baseline)
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"startup-{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'backend': args.backend,
+        'state': args.state,
+        'warm_up': not args.no_warmup,
+        **result
+    }, indent=2), encoding="utf-8")
+    print()
+    print(f"✓ Results written to {output}")
+
+    if baseline:
+        growth = result['time_to_first_answer'] / baseline['time_to_first_answer'] - 1
+        if growth > args.max_regression:
+            print(f"❌ Time to first answer regressed by {growth:.0%} (limit {args.max_regression:.0%})")
+            sys.exit(1)
+        print(f"✓ Time to first answer within {args.max_regression:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
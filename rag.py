@@ -1,73 +1,292 @@
 """
 RAG pipeline using LangChain: retrieval, prompt assembly, and Groq LLM completion.
 """
-from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Iterator, List, Dict, Optional, Tuple
+import numpy as np
 
-# LangChain imports
-from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage
-try:
-    from langsmith import Client as LangSmithClient
-    LANGSMITH_AVAILABLE = True
-except ImportError:
-    LANGSMITH_AVAILABLE = False
+# Heavy dependencies (LangChain, sentence-transformers/torch, chromadb) are
+# imported on first use, so importing this module stays cheap
+if TYPE_CHECKING:
+    import chromadb
+    from intents import IntentClassifier
+    from langchain_core.messages import BaseMessage
 
+from llm_backends import describe_backend
+from llm_gateway import LLMGatewayError, estimate_tokens
+from registry import (
+    get_chroma_client,
+    get_compact_index,
+    get_doc_store,
+    get_embedding_batcher,
+    get_embedding_model,
+    get_intent_classifier,
+    get_llm,
+    get_llm_gateway
+)
+from index_manifest import read_manifest
+from intents import INTENTS
+from compact_vectors import CompactIndex, open_compact_index
+from state_registry import known_jurisdictions, registered_states, shard_collection_name, shard_compact_dir
+from chunk_hierarchy import read_hierarchy
+from chunking import format_page_offsets, page_at, parse_locations, parse_page_offsets, slice_page_offsets
+from sections import section_chunk_filter
+from tracing import (
+    METRICS,
+    EMBED_CACHE_HITS,
+    EMBED_CACHE_MISSES,
+    QUERY_INTENTS,
+    CHUNKS_RETRIEVED,
+    PROMPT_CHARS,
+    LLM_TOKENS,
+    Trace,
+    activate,
+    span,
+    start_trace
+)
 from config import (
-    CHROMA_DIR,
     COLLECTION_NAME,
-    EMBED_MODEL,
-    GROQ_API_KEY,
-    GROQ_MODEL,
+    LLM_BACKEND,
     DEFAULT_TOP_K,
-    LANGCHAIN_API_KEY,
-    LANGCHAIN_TRACING_V2,
-    LANGCHAIN_PROJECT
+    CHUNK_OVERLAP_CHARS,
+    MERGE_ADJACENT_CHUNKS,
+    MMR_LAMBDA,
+    MMR_FETCH_MULTIPLIER,
+    ANSWER_MANY_MAX_CONCURRENCY,
+    ASYNC_IO_WORKERS,
+    ASYNC_ANSWER_TIMEOUT,
+    QUERY_EMBED_CACHE_SIZE,
+    PARENT_CONTEXT_MODE,
+    PARENT_WINDOW_CHARS,
+    PARENT_CONTEXT_TOKEN_BUDGET,
+    SECTION_COLLECTION_NAME,
+    SECTION_ROUTING,
+    SECTION_ROUTING_TOP_N,
+    SECTION_CACHE_SIZE,
+    STATE_SHARD_CACHE_SIZE,
+    STATS_CACHE_TTL,
+    WARMUP_QUERY
 )
 
 
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2D array."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _join_overlapping_text(left: str, right: str, max_overlap: int = CHUNK_OVERLAP_CHARS * 2) -> str:
+    """
+    Concatenate two neighbouring chunk texts, dropping the span they share.
+    Shared spans shorter than the 64-character probe are treated as no overlap.
+    
+    Args:
+        left: Text of the earlier chunk
+        right: Text of the following chunk
+        max_overlap: Longest shared span to look for at the end of left
+        
+    Returns:
+        Combined text
+    """
+    if not right:
+        return left
+    
+    probe = right[:64]
+    pos = left.find(probe, max(0, len(left) - max_overlap))
+    while pos != -1:
+        # Earliest match first, so the longest shared span wins
+        if right.startswith(left[pos:]):
+            return left + right[len(left) - pos:]
+        pos = left.find(probe, pos + 1)
+    
+    return left + "\n\n" + right
+
+
+def _parent_window(
+    text: str,
+    hits: List[Dict[str, any]],
+    window: int = PARENT_WINDOW_CHARS,
+    page_offsets: List[Tuple[int, int]] = None
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Cut the parts of a parent text around its matching child passages.
+    
+    Args:
+        text: Parent chunk text
+        hits: Matching child chunks (with parent_offset and char_count metadata)
+        window: Characters kept on each side of a hit
+        page_offsets: (page number, offset) pairs of the parent text
+        
+    Returns:
+        Tuple of (the windows in document order, joined with an ellipsis where
+        text was cut; the page offsets of that window text, empty if the
+        parent's are unknown)
+    """
+    spans = sorted(
+        (
+            max(0, hit['metadata']['parent_offset'] - window),
+            min(len(text), hit['metadata']['parent_offset'] + hit['metadata']['char_count'] + window)
+        )
+        for hit in hits
+    )
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    
+    window_text = "… " if merged[0][0] > 0 else ""
+    window_pages = []
+    for i, (start, end) in enumerate(merged):
+        if i:
+            window_text += " … "
+        # Offsets are mapped on the stripped part, as it appears in the output
+        part = text[start:end]
+        start += len(part) - len(part.lstrip())
+        part = part.strip()
+        if page_offsets:
+            for page, offset in slice_page_offsets(page_offsets, start, start + len(part)):
+                if not window_pages or window_pages[-1][0] != page:
+                    window_pages.append((page, len(window_text) + offset))
+        window_text += part
+    if merged[-1][1] < len(text):
+        window_text += " …"
+    return window_text, window_pages
+
+
+def _record_llm_tokens(messages: List["BaseMessage"], answer: str, response=None) -> int:
+    """
+    Record the tokens used by one LLM call.
+    
+    Uses the provider's usage metadata when available, otherwise estimates
+    from the prompt and answer lengths.
+    
+    Args:
+        messages: Prompt messages
+        answer: Generated answer text
+        response: LLM response message, if any
+    
+    Returns:
+        Token count recorded
+    """
+    usage = getattr(response, 'usage_metadata', None) or {}
+    total = usage.get('total_tokens')
+    if not total:
+        total = estimate_tokens(messages) + len(answer or '') // 4
+    LLM_TOKENS.observe(total)
+    return total
+
+
+_CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
 class RAGPipeline:
     """RAG pipeline for querying state maintenance manuals using LangChain."""
     
-    def __init__(self):
-        """Initialize the RAG pipeline with embedding model, Chroma client, and LangChain LLM."""
-        # Initialize embedding model
-        print(f"Loading embedding model: {EMBED_MODEL}")
-        self.embedding_model = SentenceTransformer(EMBED_MODEL)
+    def __init__(self, llm_backend: Optional[str] = None):
+        """
+        Initialize the RAG pipeline with embedding model, Chroma client, and LangChain LLM.
         
-        # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(CHROMA_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        The embedding model, Chroma client, LLM and LLM gateway come from the
+        process-wide registry, so every pipeline in a process shares them.
+        
+        Args:
+            llm_backend: LLM backend name (defaults to config.LLM_BACKEND)
+        """
+        # Shared embedding model, and the micro-batcher that groups concurrent
+        # query embeddings into one forward pass
+        self.embedding_model = get_embedding_model()
+        self.embedder = get_embedding_batcher()
+        
+        # Shared ChromaDB client
+        self.chroma_client = get_chroma_client()
+        
+        # States in the index (from the manifest), and whether each has its
+        # own collection
+        manifest = read_manifest()
+        self.states = registered_states(manifest)
+        self.sharded = manifest is not None and manifest.get('sharding') == "state"
+        
+        # Get or create collection. State shards are opened on their first
+        # query instead (see _shard), so startup does not grow with the states
+        if self.sharded:
+            self.collection = None
+            print(f"✓ Found {len(self.states)} state shards of {COLLECTION_NAME}")
+        else:
+            try:
+                self.collection = self.chroma_client.get_collection(name=COLLECTION_NAME)
+                print(f"✓ Connected to collection: {COLLECTION_NAME}")
+            except Exception as e:
+                raise ValueError(
+                    f"Collection '{COLLECTION_NAME}' not found. "
+                    f"Please run 'python ingest.py' first to create the collection."
+                )
+        self._shards = OrderedDict()
+        self._shards_lock = threading.Lock()
+        
+        # Chunk texts are fetched from the external store for the final
+        # top-k only; indexes without a store keep texts in Chroma
+        self.doc_store = get_doc_store()
+        
+        # Parent/child links when the index was built with hierarchical chunking:
+        # children are searched, parents are returned
+        self.hierarchy = read_hierarchy() if self.doc_store is not None else None
+        
+        # Compact vectors for the coarse search, when built (compact_vectors.py);
+        # their results carry no texts, so they need the chunk-text store
+        self.compact_index = get_compact_index() if self.doc_store is not None and not self.sharded else None
         
-        # Get or create collection
+        # Section routing collection (absent for indexes built before sections)
         try:
-            self.collection = self.chroma_client.get_collection(name=COLLECTION_NAME)
-            print(f"✓ Connected to collection: {COLLECTION_NAME}")
-        except Exception as e:
-            raise ValueError(
-                f"Collection '{COLLECTION_NAME}' not found. "
-                f"Please run 'python ingest.py' first to create the collection."
-            )
+            self.section_collection = self.chroma_client.get_collection(name=SECTION_COLLECTION_NAME)
+        except Exception:
+            self.section_collection = None
         
-        # Initialize LangChain LLM with Groq
-        if not GROQ_API_KEY:
-            raise ValueError(
-                "GROQ_API_KEY not found. Please set it in your environment or .env file."
-            )
+        # LRU cache of per-section chunk vectors for the second routing stage
+        self._section_cache = OrderedDict()
+        self._section_cache_lock = threading.Lock()
+        
+        # Initialize LangChain LLM for the configured backend
+        backend = llm_backend or LLM_BACKEND
+        self.llm = get_llm(backend)
         
-        self.llm = ChatGroq(
-            model=GROQ_MODEL,
-            temperature=0.1,  # Low temperature for factual responses
-            max_tokens=1024,
-            groq_api_key=GROQ_API_KEY
+        print(f"✓ Initialized LangChain with {describe_backend(backend)}")
+        
+        # Rate limiting, retries, deadlines and circuit breaking for all LLM calls
+        # (shared, so limits apply to the whole process)
+        self.llm_gateway = get_llm_gateway(backend)
+        METRICS.register_collector(self._gateway_gauges)
+        
+        # LRU cache of query embeddings (repeated and suggested questions)
+        self._embed_cache = OrderedDict()
+        self._embed_cache_lock = threading.Lock()
+        
+        # Dedicated executor for blocking embedding/Chroma work in the async API
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=ASYNC_IO_WORKERS,
+            thread_name_prefix="rag-io"
         )
         
-        print(f"✓ Initialized LangChain with Groq model: {GROQ_MODEL}")
+    @property
+    def intent_classifier(self) -> "IntentClassifier":
+        """
+        Shared query intent classifier, loaded on first use.
         
+        Query intents (which pick the retrieval strategy) are classified from
+        the query embedding, against prototypes embedded once per model. On
+        a cold prototype cache, loading embeds the examples, so it is kept
+        out of construction and done by warm_up (or the first retrieval).
+        """
+        return get_intent_classifier()
+    
     def _embed_query(self, query: str) -> List[float]:
         """
         Embed a query string.
@@ -78,31 +297,82 @@ class RAGPipeline:
         Returns:
             Embedding vector
         """
-        return self.embedding_model.encode(query).tolist()
+        with self._embed_cache_lock:
+            cached = self._embed_cache.get(query)
+            if cached is not None:
+                self._embed_cache.move_to_end(query)
+        
+        if cached is not None:
+            EMBED_CACHE_HITS.inc()
+            return list(cached)
+        
+        EMBED_CACHE_MISSES.inc()
+        embedding = self.embedder.embed(query)
+        self._cache_embeddings({query: embedding})
+        
+        return list(embedding)
+    
+    def _cache_embeddings(self, embeddings: Dict[str, List[float]]):
+        """Add query embeddings to the LRU cache, evicting the oldest."""
+        if QUERY_EMBED_CACHE_SIZE <= 0:
+            return
+        with self._embed_cache_lock:
+            for query, embedding in embeddings.items():
+                self._embed_cache[query] = embedding
+                self._embed_cache.move_to_end(query)
+            while len(self._embed_cache) > QUERY_EMBED_CACHE_SIZE:
+                self._embed_cache.popitem(last=False)
+    
+    def _gateway_gauges(self) -> Dict[str, float]:
+        """Export LLM gateway state as gauges for the metrics registry."""
+        snapshot = self.llm_gateway.metrics()
+        gauges = {
+            f"rag_llm_gateway_{name}": value
+            for name, value in snapshot.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        gauges['rag_llm_gateway_circuit_state'] = _CIRCUIT_STATE_VALUES.get(snapshot.get('circuit_state'), -1)
+        return gauges
     
-    def _is_time_related_query(self, query: str) -> bool:
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
         """
-        Check if query is asking about time-of-day constraints.
+        Embed several query strings, using the cache like _embed_query.
+        
+        Queries not in the cache go to the embedding batcher together, so they
+        share forward passes with each other and with concurrent callers.
         
         Args:
-            query: User query
+            queries: Query texts
             
         Returns:
-            True if query appears to be about time constraints
+            List of embedding vectors, in input order
         """
-        query_lower = query.lower()
-        time_indicators = [
-            "night", "day", "time", "hours", "off-peak",
-            "curfew", "lane closure", "when", "schedule"
-        ]
-        return any(indicator in query_lower for indicator in time_indicators)
+        embeddings = {}
+        with self._embed_cache_lock:
+            for query in dict.fromkeys(queries):
+                cached = self._embed_cache.get(query)
+                if cached is not None:
+                    self._embed_cache.move_to_end(query)
+                    embeddings[query] = cached
+        
+        missing = [query for query in dict.fromkeys(queries) if query not in embeddings]
+        EMBED_CACHE_HITS.inc(len(queries) - len(missing))
+        if missing:
+            EMBED_CACHE_MISSES.inc(len(missing))
+            computed = dict(zip(missing, self.embedder.embed_many(missing)))
+            self._cache_embeddings(computed)
+            embeddings.update(computed)
+        
+        return [list(embeddings[query]) for query in queries]
     
     def retrieve_chunks(
         self,
         query: str,
         state: str,
         k: int = DEFAULT_TOP_K,
-        boost_time_keywords: bool = True
+        boost_time_keywords: bool = True,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS,
+        route_sections: bool = SECTION_ROUTING
     ) -> List[Dict[str, any]]:
         """
         Retrieve relevant chunks for a query.
@@ -112,6 +382,10 @@ class RAGPipeline:
             state: State filter (CA, TX, or WA)
             k: Number of results to retrieve
             boost_time_keywords: Whether to boost chunks with time keywords
+            merge_adjacent: Whether to merge neighbouring chunks from the same
+                source file and refill the freed slots with MMR
+            route_sections: Whether to search only the best-matching sections
+                (two-stage retrieval; needs an index with a section routing collection)
             
         Returns:
             List of retrieved chunk dictionaries with metadata
@@ -119,281 +393,1700 @@ class RAGPipeline:
         # Embed query
         query_embedding = self._embed_query(query)
         
-        # Check if query is time-related
-        is_time_query = self._is_time_related_query(query)
+        return self._retrieve_by_embedding(
+            query,
+            query_embedding,
+            state,
+            k=k,
+            boost_time_keywords=boost_time_keywords,
+            merge_adjacent=merge_adjacent,
+            route_sections=route_sections
+        )
+    
+    def _retrieve_by_embedding(
+        self,
+        query: str,
+        query_embedding: List[float],
+        state: str,
+        k: int = DEFAULT_TOP_K,
+        boost_time_keywords: bool = True,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS,
+        route_sections: bool = SECTION_ROUTING
+    ) -> List[Dict[str, any]]:
+        """
+        Retrieve relevant chunks for an already-embedded query.
+        
+        Args:
+            query: User query (used for routing only)
+            query_embedding: Embedding vector of the query
+            state: State filter
+            k: Number of results to retrieve
+            boost_time_keywords: Whether to boost chunks with time keywords
+            merge_adjacent: Whether to merge neighbouring chunks
+            route_sections: Whether to search only the best-matching sections
+            
+        Returns:
+            List of retrieved chunk dictionaries with metadata
+        """
+        return self._retrieve_batch(
+            [query],
+            [query_embedding],
+            state,
+            k=k,
+            boost_time_keywords=boost_time_keywords,
+            merge_adjacent=merge_adjacent,
+            route_sections=route_sections
+        )[0]
+    
+    def _retrieve_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        state: str,
+        k: int = DEFAULT_TOP_K,
+        boost_time_keywords: bool = True,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS,
+        route_sections: bool = SECTION_ROUTING,
+        intents: Optional[List[str]] = None
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Retrieve relevant chunks for several embedded queries at once.
+        
+        Each query's intent, classified from its embedding, picks its strategy
+        (see intents.py). Issues at most two multi-query Chroma calls regardless
+        of the number of queries: one for the time-intent subset, one for all
+        queries. With section routing, one routing query picks each query's
+        sections and the chunks of those sections are searched exactly in
+        memory instead.
         
+        Args:
+            queries: User queries
+            query_embeddings: Embedding vectors, one per query
+            state: State filter
+            k: Number of results to retrieve per query
+            boost_time_keywords: Whether to boost chunks with time keywords
+                for time-intent queries
+            merge_adjacent: Whether to merge neighbouring chunks
+            route_sections: Whether to search only the best-matching sections
+            intents: Intent of each query (default: classified from the
+                embeddings; benchmarks pass them to compare routings)
+            
+        Returns:
+            List of chunk lists, in the same order as queries
+        """
         # Base filter for state
         where_filter = {"state": state}
         
-        # Strategy: If time-related query, get both time-keyword chunks and general chunks
-        all_results = []
+        # Fetch a larger candidate pool when merging, so freed slots can be
+        # refilled, and for child passages, several of which may share a parent
+        multiplier = MMR_FETCH_MULTIPLIER if merge_adjacent or self.hierarchy is not None else 1
         
-        if is_time_query and boost_time_keywords:
+        # Strategy: for time-intent queries, get both time-keyword chunks and general chunks
+        candidates = [[] for _ in queries]
+        
+        if intents is None:
+            with span("classify_intent", queries=len(queries)):
+                intents = self.intent_classifier.classify(query_embeddings)
+        for intent in intents:
+            QUERY_INTENTS.inc(intent=intent)
+        
+        time_indexes = []
+        if boost_time_keywords:
+            time_indexes = [i for i, intent in enumerate(intents) if INTENTS[intent]['boost_time_keywords']]
+        
+        if route_sections and self.section_collection is not None:
+            with span("route_sections", queries=len(queries)):
+                routed = self._route_sections(query_embeddings, state)
+            with span("section_search", sections=sum(len(sections) for sections in routed)):
+                for i, sections in enumerate(routed):
+                    candidates[i] = self._search_sections(
+                        sections,
+                        query_embeddings[i],
+                        n_results=k * multiplier,
+                        time_boost=i in time_indexes,
+                        include_embeddings=merge_adjacent
+                    )
+            time_indexes = []
+            queries_left = []
+        else:
+            queries_left = queries
+        
+        if time_indexes:
             # First, get chunks WITH time keywords
             try:
-                time_results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=min(k, 15),
-                    where={**where_filter, "has_time_keywords": True}
-                )
-                
-                # Parse results
-                if time_results['ids'][0]:
-                    for i in range(len(time_results['ids'][0])):
-                        all_results.append({
-                            'id': time_results['ids'][0][i],
-                            'text': time_results['documents'][0][i],
-                            'metadata': time_results['metadatas'][0][i],
-                            'distance': time_results['distances'][0][i],
-                            'boost_score': 0.1  # Boost for time keywords
-                        })
+                with span("chroma_query", filter="time_keywords", queries=len(time_indexes)):
+                    time_hits = self._query_collection(
+                        [query_embeddings[i] for i in time_indexes],
+                        n_results=min(k, 15) * multiplier,
+                        where={**where_filter, "has_time_keywords": True},
+                        boost_score=0.1,  # Boost for time keywords
+                        include_embeddings=merge_adjacent
+                    )
+                for i, hits in zip(time_indexes, time_hits):
+                    candidates[i].extend(hits)
             except Exception as e:
                 # If no results with time keywords, that's okay
                 pass
-            
-            # Then get general results
-            general_results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k,
-                where=where_filter
-            )
-            
-            # Add general results (avoiding duplicates)
-            existing_ids = {r['id'] for r in all_results}
-            if general_results['ids'][0]:
-                for i in range(len(general_results['ids'][0])):
-                    chunk_id = general_results['ids'][0][i]
-                    if chunk_id not in existing_ids:
-                        all_results.append({
-                            'id': chunk_id,
-                            'text': general_results['documents'][0][i],
-                            'metadata': general_results['metadatas'][0][i],
-                            'distance': general_results['distances'][0][i],
-                            'boost_score': 0.0
-                        })
-            
-            # Sort by adjusted distance (lower is better)
-            all_results.sort(key=lambda x: x['distance'] - x['boost_score'])
-            all_results = all_results[:k]
-            
-        else:
-            # Simple retrieval without boosting
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k,
-                where=where_filter
-            )
-            
-            # Parse results
-            if results['ids'][0]:
-                for i in range(len(results['ids'][0])):
-                    all_results.append({
-                        'id': results['ids'][0][i],
-                        'text': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i],
-                        'distance': results['distances'][0][i],
-                        'boost_score': 0.0
-                    })
         
-        return all_results
+        # Then get general results
+        if queries_left:
+            with span("chroma_query", filter="state", queries=len(queries)):
+                general_hits = self._query_collection(
+                    query_embeddings,
+                    n_results=k * multiplier,
+                    where=where_filter,
+                    include_embeddings=merge_adjacent
+                )
+            for i, hits in enumerate(general_hits):
+                candidates[i].extend(hits)
+        
+        with span("select", merge_adjacent=merge_adjacent):
+            return [
+                self._select_chunks(candidates[i], query_embeddings[i], k, merge_adjacent)
+                for i in range(len(queries))
+            ]
     
-    def _format_context(self, chunks: List[Dict[str, any]]) -> str:
+    def _shard(self, state: str) -> Tuple[Optional["chromadb.Collection"], Optional[CompactIndex]]:
         """
-        Format retrieved chunks into context string.
+        Get the Chroma collection and compact index that hold a state's chunks.
+        
+        In a sharded index each state has its own; they are opened on the
+        state's first query, and the STATE_SHARD_CACHE_SIZE most recently
+        used shards are kept open.
         
         Args:
-            chunks: Retrieved chunks
+            state: State code
             
         Returns:
-            Formatted context string
-        """
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            metadata = chunk['metadata']
-            text = chunk['text']
-            page_start = metadata.get('page_start', '?')
-            page_end = metadata.get('page_end', '?')
-            source = metadata.get('source_file', 'Unknown')
-            
-            # Format page range
-            if page_start == page_end:
-                page_ref = f"p.{page_start}"
-            else:
-                page_ref = f"p.{page_start}-{page_end}"
+            Tuple of (collection, compact index or None); the collection is
+            None for a state that is not in the sharded index
             
-            context_parts.append(
-                f"[Excerpt {i}] ({source} {page_ref}):\n{text}\n"
-            )
+        Raises:
+            ValueError: If a registered state's collection is missing
+        """
+        if not self.sharded:
+            return self.collection, self.compact_index
+        if state not in self.states:
+            return None, None
         
-        return "\n".join(context_parts)
+        with self._shards_lock:
+            shard = self._shards.get(state)
+            if shard is not None:
+                self._shards.move_to_end(state)
+                return shard
+        
+        with span("open_shard", state=state):
+            try:
+                collection = self.chroma_client.get_collection(name=shard_collection_name(state))
+            except Exception:
+                raise ValueError(
+                    f"Collection '{shard_collection_name(state)}' not found. "
+                    f"Please run 'python ingest.py' to rebuild the index."
+                )
+            compact_index = open_compact_index(shard_compact_dir(state)) if self.doc_store is not None else None
+        
+        shard = (collection, compact_index)
+        with self._shards_lock:
+            self._shards[state] = shard
+            self._shards.move_to_end(state)
+            while len(self._shards) > max(1, STATE_SHARD_CACHE_SIZE):
+                self._shards.popitem(last=False)
+        return shard
     
-    def _call_llm(self, query: str, context: str, state: str) -> str:
+    def state_collection(self, state: Optional[str]):
+        """Get the Chroma collection holding a state's chunks (None if the state is not indexed)."""
+        return self._shard(state)[0]
+    
+    def set_compact_index(self, index: Optional[CompactIndex], state: Optional[str] = None) -> Optional[CompactIndex]:
         """
-        Call LangChain LLM for completion.
+        Replace the compact index searched for a state's chunks (e.g. to benchmark another mode).
         
         Args:
-            query: User query
-            context: Formatted context from retrieved chunks
-            state: State code
+            index: Compact index, or None to search Chroma
+            state: State whose shard to change (ignored for an unsharded index)
             
         Returns:
-            LLM response text
+            The compact index used before
         """
-        try:
-            # Create prompt template
-            system_message = SystemMessage(
-                content="You are a helpful assistant specialized in analyzing transportation maintenance manuals. You provide accurate, cited answers based only on provided context."
-            )
-            
-            # Build the user message
-            user_prompt = f"""You are an expert assistant helping users understand state Department of Transportation (DOT) maintenance manual policies.
-
-You will be provided with excerpts from the {state} maintenance manual and a user question. Your task is to answer the question based ONLY on the provided excerpts.
-
-CRITICAL INSTRUCTIONS:
-1. ONLY use information from the provided excerpts below
-2. If the question asks about time-of-day constraints (nighttime, daytime, off-peak, work hours, lane closure windows, etc.), you MUST explicitly state whether such requirements exist in the provided excerpts
-3. If no explicit time-of-day requirement is found in the excerpts, you MUST say: "No explicit time-of-day requirement found in the provided manual excerpts."
-4. DO NOT make up or infer information not present in the excerpts
-5. Include citations in the format: (source_file p.X) or (source_file p.X-Y)
-6. Keep quotes SHORT - only essential snippets
-7. Be concise but complete
-
-CONTEXT FROM {state} MAINTENANCE MANUAL:
-{context}
-
-USER QUESTION:
-{query}
-
-Please provide a clear, accurate answer with citations:"""
-            
-            human_message = HumanMessage(content=user_prompt)
-            
-            # Call LLM using LangChain
-            response = self.llm.invoke([system_message, human_message])
-            
-            return response.content
-            
-        except Exception as e:
-            raise Exception(f"Error calling LangChain LLM: {str(e)}")
+        if not self.sharded:
+            previous, self.compact_index = self.compact_index, index
+            return previous
+        collection, previous = self._shard(state)
+        if collection is not None:
+            with self._shards_lock:
+                self._shards[state] = (collection, index)
+                self._shards.move_to_end(state)
+        return previous
     
-    def _extract_citations(self, answer: str, chunks: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    def _query_collection(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: Dict[str, any],
+        boost_score: float = 0.0,
+        include_embeddings: bool = False
+    ) -> List[List[Dict[str, any]]]:
         """
-        Extract citation information from retrieved chunks.
+        Run one (multi-query) Chroma query and parse the hits into chunk dictionaries.
         
         Args:
-            answer: LLM answer text
-            chunks: Retrieved chunks
+            query_embeddings: Embedding vectors of the queries
+            n_results: Number of results to request per query
+            where: Chroma metadata filter (its state picks the shard)
+            boost_score: Score subtracted from the distance of every hit
+            include_embeddings: Whether to return chunk embeddings (needed for MMR)
             
         Returns:
-            List of citation dictionaries
+            List of chunk lists, one per query embedding
         """
-        citations = []
+        collection, compact_index = self._shard(where['state'])
+        if collection is None:
+            return [[] for _ in query_embeddings]
         
-        for chunk in chunks:
-            metadata = chunk['metadata']
-            text = chunk['text']
-            
-            # Extract a snippet (first 200 chars)
-            snippet = text[:200] + "..." if len(text) > 200 else text
+        if compact_index is not None:
+            hits = compact_index.search(query_embeddings, n_results, where)
+            if hits is not None:
+                return self._compact_results(hits, collection, compact_index, boost_score, include_embeddings)
+        
+        include = ['metadatas', 'distances']
+        if self.doc_store is None:
+            include.append('documents')
+        if include_embeddings:
+            include.append('embeddings')
+        
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+        return [
+            self._parse_query_results(results, i, boost_score)
+            for i in range(len(query_embeddings))
+        ]
+    
+    def _compact_results(
+        self,
+        hits: List[List[Tuple[int, float]]],
+        collection,
+        index,
+        boost_score: float = 0.0,
+        include_embeddings: bool = False
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Convert compact-index hits into chunk dictionaries.
+        
+        Metadata of all hits is fetched from Chroma in one call by ID, which
+        does not touch Chroma's vector index.
+        
+        Args:
+            hits: Per query, (row, distance) pairs from CompactIndex.search
+            collection: Chroma collection holding the hits' metadata
+            index: Compact index the hits come from
+            boost_score: Score subtracted from the distance of every hit
+            include_embeddings: Whether to return chunk embeddings (needed for MMR)
             
-            citations.append({
-                'source_file': metadata.get('source_file', 'Unknown'),
-                'page_start': metadata.get('page_start', '?'),
-                'page_end': metadata.get('page_end', '?'),
-                'snippet': snippet,
-                'has_time_keywords': metadata.get('has_time_keywords', False),
-                'matched_keywords': metadata.get('matched_time_keywords', [])
-            })
+        Returns:
+            List of chunk lists, one per query
+        """
+        rows = sorted({row for query_hits in hits for row, _ in query_hits})
+        if not rows:
+            return [[] for _ in hits]
         
-        return citations
+        ids = [index.ids[row] for row in rows]
+        with span("chroma_get", chunks=len(ids)):
+            results = collection.get(ids=ids, include=['metadatas'])
+        metadatas = dict(zip(results['ids'], results['metadatas']))
+        embeddings = dict(zip(rows, index.embeddings(rows))) if include_embeddings else {}
+        
+        parsed = []
+        for query_hits in hits:
+            chunks = []
+            for row, distance in query_hits:
+                chunk = {
+                    'id': index.ids[row],
+                    'text': None,
+                    'metadata': metadatas.get(index.ids[row], {}),
+                    'distance': distance,
+                    'boost_score': boost_score
+                }
+                if include_embeddings:
+                    chunk['embedding'] = embeddings[row]
+                chunks.append(chunk)
+            parsed.append(chunks)
+        return parsed
     
-    def answer_question(
+    def _parse_query_results(
         self,
-        state: str,
-        question: str,
-        k: int = DEFAULT_TOP_K,
-        return_debug: bool = False
-    ) -> Dict[str, any]:
+        results: Dict[str, any],
+        query_index: int,
+        boost_score: float = 0.0
+    ) -> List[Dict[str, any]]:
         """
-        Answer a question about a state's maintenance manual using LangChain.
+        Convert one query's slice of a Chroma query response into chunk dictionaries.
         
         Args:
-            state: State code (CA, TX, or WA)
-            question: User question
-            k: Number of chunks to retrieve
-            return_debug: Whether to return debug information
+            results: Raw response from collection.query
+            query_index: Index of the query within the response
+            boost_score: Score subtracted from the distance of every hit
             
         Returns:
-            Dictionary containing:
-            - final_answer: The LLM's answer
-            - citations: List of citation dictionaries
-            - retrieved_chunks: (optional) Retrieved chunks for debugging
+            List of chunk dictionaries
         """
-        # Retrieve relevant chunks
-        chunks = self.retrieve_chunks(query=question, state=state, k=k)
+        parsed = []
+        ids = results['ids'][query_index] if results['ids'] else []
+        documents = results.get('documents')
+        embeddings = results.get('embeddings')
         
-        if not chunks:
-            return {
-                'final_answer': f"No relevant information found in the {state} maintenance manual for this query.",
-                'citations': [],
-                'retrieved_chunks': [] if return_debug else None
+        for i in range(len(ids)):
+            chunk = {
+                'id': ids[i],
+                'text': documents[query_index][i] if documents else None,
+                'metadata': results['metadatas'][query_index][i],
+                'distance': results['distances'][query_index][i],
+                'boost_score': boost_score
             }
+            if embeddings is not None:
+                chunk['embedding'] = embeddings[query_index][i]
+            parsed.append(chunk)
         
-        # Format context
-        context = self._format_context(chunks)
+        return parsed
+    
+    def _route_sections(
+        self,
+        query_embeddings: List[List[float]],
+        state: str
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Pick the best-matching sections for each query from the routing collection.
         
-        # Call LLM via LangChain
-        answer = self._call_llm(question, context, state)
+        Args:
+            query_embeddings: Embedding vectors of the queries
+            state: State filter
+            
+        Returns:
+            List of section metadata lists, one per query
+        """
+        results = self.section_collection.query(
+            query_embeddings=query_embeddings,
+            n_results=SECTION_ROUTING_TOP_N,
+            where={"state": state},
+            include=['metadatas']
+        )
+        if not results['ids']:
+            return [[] for _ in query_embeddings]
+        return [list(results['metadatas'][i]) for i in range(len(query_embeddings))]
+    
+    def _section_vectors(self, section: Dict[str, any]) -> Dict[str, any]:
+        """
+        Get the chunk IDs, metadata and embeddings of one section (LRU-cached).
         
-        # Extract citations
-        citations = self._extract_citations(answer, chunks)
+        Args:
+            section: Section metadata from the routing collection
+            
+        Returns:
+            Dictionary with ids, metadatas, documents (None with a chunk-text
+            store) and an embeddings matrix
+        """
+        section_id = section['section_id']
+        with self._section_cache_lock:
+            cached = self._section_cache.get(section_id)
+            if cached is not None:
+                self._section_cache.move_to_end(section_id)
+                return cached
         
-        # Build response
-        response = {
-            'final_answer': answer,
-            'citations': citations
-        }
+        include = ['metadatas', 'embeddings']
+        if self.doc_store is None:
+            include.append('documents')
+        collection, _ = self._shard(section['state'])
+        results = {'ids': [], 'metadatas': []}
+        if collection is not None:
+            with span("chroma_get", section=section_id):
+                results = collection.get(where=section_chunk_filter(section), include=include)
         
-        if return_debug:
-            response['retrieved_chunks'] = chunks
+        embeddings = results.get('embeddings')
+        if embeddings is None or len(embeddings) == 0:
+            embeddings = np.empty((0, 0))
+        vectors = {
+            'ids': list(results['ids']),
+            'metadatas': list(results['metadatas']),
+            'documents': results.get('documents') if self.doc_store is None else None,
+            'embeddings': np.asarray(embeddings, dtype=np.float32)
+        }
+        
+        if SECTION_CACHE_SIZE > 0:
+            with self._section_cache_lock:
+                self._section_cache[section_id] = vectors
+                self._section_cache.move_to_end(section_id)
+                while len(self._section_cache) > SECTION_CACHE_SIZE:
+                    self._section_cache.popitem(last=False)
+        return vectors
+    
+    def _search_sections(
+        self,
+        sections: List[Dict[str, any]],
+        query_embedding: List[float],
+        n_results: int,
+        time_boost: bool = False,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, any]]:
+        """
+        Search the chunks of the given sections exactly, in memory.
+        
+        Distances are squared L2, matching the main collection, so routed and
+        unrouted results are ranked on the same scale.
+        
+        Args:
+            sections: Section metadata from _route_sections
+            query_embedding: Embedding vector of the query
+            n_results: Number of candidates to return
+            time_boost: Whether to boost chunks with time keywords
+            include_embeddings: Whether to return chunk embeddings (needed for MMR)
+            
+        Returns:
+            List of candidate chunk dictionaries, best first
+        """
+        ids, metadatas, documents, matrices = [], [], [], []
+        seen = set()
+        for section in sections:
+            vectors = self._section_vectors(section)
+            # Sections on shared pages can hold the same chunk
+            keep = [i for i, chunk_id in enumerate(vectors['ids']) if chunk_id not in seen]
+            if not keep:
+                continue
+            seen.update(vectors['ids'][i] for i in keep)
+            ids.extend(vectors['ids'][i] for i in keep)
+            metadatas.extend(vectors['metadatas'][i] for i in keep)
+            documents.extend(vectors['documents'][i] if vectors['documents'] else None for i in keep)
+            matrices.append(vectors['embeddings'][keep])
+        
+        if not ids:
+            return []
+        
+        matrix = np.vstack(matrices)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = np.sum((matrix - query) ** 2, axis=1)
+        boosts = np.array([
+            0.1 if time_boost and metadata.get('has_time_keywords') else 0.0
+            for metadata in metadatas
+        ], dtype=np.float32)
+        
+        order = np.argsort(distances - boosts)[:n_results]
+        candidates = []
+        for i in order:
+            chunk = {
+                'id': ids[i],
+                'text': documents[i],
+                'metadata': metadatas[i],
+                'distance': float(distances[i]),
+                'boost_score': float(boosts[i])
+            }
+            if include_embeddings:
+                chunk['embedding'] = matrix[i].tolist()
+            candidates.append(chunk)
+        return candidates
+    
+    def _select_chunks(
+        self,
+        candidates: List[Dict[str, any]],
+        query_embedding: List[float],
+        k: int,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS
+    ) -> List[Dict[str, any]]:
+        """
+        Pick the final top-k chunks from a candidate pool.
+        
+        Candidates are de-duplicated and ranked by boosted distance. When merging
+        is enabled, neighbouring chunks are folded into single excerpts and every
+        slot freed this way is refilled from the remaining pool using MMR.
+        
+        Args:
+            candidates: Candidate chunks, possibly from several queries
+            query_embedding: Embedding vector of the query
+            k: Number of results to return
+            merge_adjacent: Whether to merge neighbouring chunks
+            
+        Returns:
+            List of at most k chunk dictionaries
+        """
+        # Remove duplicates, keeping the best-scored copy of each chunk
+        unique = {}
+        for chunk in candidates:
+            existing = unique.get(chunk['id'])
+            if existing is None or chunk['boost_score'] > existing['boost_score']:
+                unique[chunk['id']] = chunk
+        
+        # Sort by adjusted distance (lower is better)
+        ranked = sorted(unique.values(), key=lambda x: x['distance'] - x['boost_score'])
+        
+        # Hierarchical index: parents already carry the surrounding context,
+        # so they replace adjacent merging
+        if self.hierarchy is not None:
+            return self._select_parents(ranked, k)
+        
+        self._attach_texts(ranked[:k])
+        if not merge_adjacent:
+            return [self._strip_internal_fields(c) for c in ranked[:k]]
+        
+        selected = self._merge_adjacent_chunks(ranked[:k])
+        remaining = ranked[k:]
+        
+        # Refill slots freed by merging with diversified results
+        while len(selected) < k and remaining:
+            picks = self._mmr_select(query_embedding, selected, remaining, k - len(selected))
+            picked_ids = {c['id'] for c in picks}
+            remaining = [c for c in remaining if c['id'] not in picked_ids]
+            self._attach_texts(picks)
+            selected = self._merge_adjacent_chunks(selected + picks)
+        
+        selected.sort(key=lambda x: x['distance'] - x['boost_score'])
+        return [self._strip_internal_fields(c) for c in selected]
+    
+    def _select_parents(self, ranked: List[Dict[str, any]], k: int) -> List[Dict[str, any]]:
+        """
+        Turn ranked child passages into de-duplicated parent chunks.
+        
+        Parents are ordered by their best child. Each is returned whole
+        (PARENT_CONTEXT_MODE "parent") or as windows around its matching
+        children ("window"). A parent that does not fit the remaining
+        PARENT_CONTEXT_TOKEN_BUDGET whole is cut to windows, and skipped if even
+        those do not fit (the best parent is always returned).
+        
+        Args:
+            ranked: Child chunks, best first
+            k: Maximum number of parents
+            
+        Returns:
+            List of at most k parent chunk dictionaries
+        """
+        groups = {}
+        for child in ranked:
+            parent_id = child['metadata'].get('parent_id')
+            if parent_id not in self.hierarchy:
+                continue
+            if parent_id in groups:
+                groups[parent_id].append(child)
+            elif len(groups) < k:
+                groups[parent_id] = [child]
+        
+        with span("fetch_texts", chunks=len(groups)):
+            texts = self.doc_store.get_many(groups)
+        
+        budget = PARENT_CONTEXT_TOKEN_BUDGET * 4  # characters, at ~4 per token
+        selected = []
+        for parent_id, hits in groups.items():
+            text = texts.get(parent_id, '')
+            metadata = dict(self.hierarchy[parent_id]['metadata'])
+            if PARENT_CONTEXT_MODE == "window" or len(text) > budget:
+                text, pages = _parent_window(text, hits, page_offsets=parse_page_offsets(metadata.get('page_offsets')))
+                if pages:
+                    metadata.update({
+                        'page_start': pages[0][0],
+                        'page_end': pages[-1][0],
+                        'page_offsets': format_page_offsets(pages),
+                        'char_count': len(text)
+                    })
+            if len(text) > budget and selected:
+                continue
+            budget -= len(text)
+            
+            best = hits[0]
+            selected.append({
+                'id': parent_id,
+                'text': text,
+                'metadata': metadata,
+                'distance': best['distance'],
+                'boost_score': best['boost_score'],
+                'child_ids': [hit['id'] for hit in hits]
+            })
+        
+        return selected
+    
+    def _attach_texts(self, chunks: List[Dict[str, any]]):
+        """
+        Fill in chunk texts from the chunk-text store, in place.
+        
+        Only chunks without a text are looked up, so candidates that never
+        make the final selection are never read.
+        
+        Args:
+            chunks: Chunk dictionaries
+        """
+        missing = [chunk for chunk in chunks if chunk['text'] is None]
+        if not missing or self.doc_store is None:
+            return
+        
+        with span("fetch_texts", chunks=len(missing)):
+            texts = self.doc_store.get_many(chunk['id'] for chunk in missing)
+        for chunk in missing:
+            chunk['text'] = texts.get(chunk['id'], '')
+    
+    @staticmethod
+    def _strip_internal_fields(chunk: Dict[str, any]) -> Dict[str, any]:
+        """Drop working fields (embeddings, position spans) from a result chunk."""
+        return {key: value for key, value in chunk.items() if key not in ('embedding', 'position_span')}
+    
+    @staticmethod
+    def _chunk_span(chunk: Dict[str, any]) -> Optional[Tuple[int, int]]:
+        """
+        Get the (first, last) chunk-index span of a chunk within its source file.
+        
+        Args:
+            chunk: Chunk dictionary
+            
+        Returns:
+            Tuple of chunk indexes, or None if the position is unknown
+        """
+        if 'position_span' in chunk:
+            return chunk['position_span']
+        
+        index = chunk['metadata'].get('chunk_index')
+        if index is None:
+            # Older indexes: the global chunk index is the last part of the ID
+            try:
+                index = int(chunk['id'].rsplit(':', 1)[1])
+            except (IndexError, ValueError):
+                return None
+        return int(index), int(index)
+    
+    def _merge_adjacent_chunks(self, chunks: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        Merge chunks that are adjacent or overlapping in the same source file.
+        
+        Args:
+            chunks: Ranked chunks
+            
+        Returns:
+            List of chunks where every run of neighbours is one excerpt
+        """
+        by_source = {}
+        unpositioned = []
+        for chunk in chunks:
+            span = self._chunk_span(chunk)
+            if span is None:
+                unpositioned.append(chunk)
+                continue
+            source = chunk['metadata'].get('source_file', 'Unknown')
+            by_source.setdefault(source, []).append((span, chunk))
+        
+        merged = list(unpositioned)
+        for entries in by_source.values():
+            entries.sort(key=lambda entry: entry[0])
+            run = [entries[0]]
+            for span, chunk in entries[1:]:
+                if span[0] <= run[-1][0][1] + 1:
+                    run.append((span, chunk))
+                else:
+                    merged.append(self._combine_run(run))
+                    run = [(span, chunk)]
+            merged.append(self._combine_run(run))
+        
+        return merged
+    
+    def _combine_run(self, run: List[Tuple[Tuple[int, int], Dict[str, any]]]) -> Dict[str, any]:
+        """
+        Combine a run of neighbouring chunks into a single excerpt.
+        
+        Args:
+            run: List of (span, chunk) tuples sorted by position
+            
+        Returns:
+            Combined chunk dictionary
+        """
+        if len(run) == 1:
+            return run[0][1]
+        
+        chunks = [chunk for _, chunk in run]
+        text = chunks[0]['text']
+        pages = parse_page_offsets(chunks[0]['metadata'].get('page_offsets'))
+        for chunk in chunks[1:]:
+            text = _join_overlapping_text(text, chunk['text'])
+            # The joined chunk always ends the combined text
+            chunk_start = len(text) - len(chunk['text'])
+            for page, offset in parse_page_offsets(chunk['metadata'].get('page_offsets')):
+                if pages and page > pages[-1][0]:
+                    pages.append((page, chunk_start + offset))
+        
+        keywords = []
+        for chunk in chunks:
+            for keyword in (chunk['metadata'].get('matched_time_keywords') or '').split(','):
+                if keyword and keyword not in keywords:
+                    keywords.append(keyword)
+        
+        metadata = dict(chunks[0]['metadata'])
+        metadata.update({
+            'page_start': min(c['metadata'].get('page_start', 0) for c in chunks),
+            'page_end': max(c['metadata'].get('page_end', 0) for c in chunks),
+            'has_time_keywords': any(c['metadata'].get('has_time_keywords', False) for c in chunks),
+            'matched_time_keywords': ','.join(keywords),
+            'char_count': len(text)
+        })
+        if pages:
+            metadata['page_offsets'] = format_page_offsets(pages)
+        duplicates = [c['metadata']['duplicate_locations'] for c in chunks if c['metadata'].get('duplicate_locations')]
+        if duplicates:
+            metadata.update({
+                'duplicate_count': sum(c['metadata'].get('duplicate_count', 0) for c in chunks),
+                'duplicate_locations': ";".join(duplicates)
+            })
+        
+        merged_ids = []
+        for chunk in chunks:
+            merged_ids.extend(chunk.get('merged_ids', [chunk['id']]))
+        
+        combined = {
+            'id': chunks[0]['id'],
+            'text': text,
+            'metadata': metadata,
+            'distance': min(c['distance'] for c in chunks),
+            'boost_score': max(c['boost_score'] for c in chunks),
+            'merged_ids': merged_ids,
+            'position_span': (run[0][0][0], max(span[1] for span, _ in run))
+        }
+        
+        embeddings = [c['embedding'] for c in chunks if c.get('embedding') is not None]
+        if embeddings:
+            combined['embedding'] = np.mean(_normalize_rows(np.asarray(embeddings)), axis=0)
+        
+        return combined
+    
+    def _mmr_select(
+        self,
+        query_embedding: List[float],
+        selected: List[Dict[str, any]],
+        candidates: List[Dict[str, any]],
+        n: int
+    ) -> List[Dict[str, any]]:
+        """
+        Pick candidates by Maximal Marginal Relevance.
+        
+        Args:
+            query_embedding: Embedding vector of the query
+            selected: Chunks already in the result set
+            candidates: Pool to pick from
+            n: Number of chunks to pick
+            
+        Returns:
+            List of picked chunks, in pick order
+        """
+        pool = [c for c in candidates if c.get('embedding') is not None]
+        if not pool:
+            return candidates[:n]
+        
+        query_vec = _normalize_rows(np.asarray([query_embedding]))[0]
+        pool_vecs = _normalize_rows(np.asarray([c['embedding'] for c in pool]))
+        relevance = pool_vecs @ query_vec
+        
+        selected_vecs = [c['embedding'] for c in selected if c.get('embedding') is not None]
+        if selected_vecs:
+            redundancy = (pool_vecs @ _normalize_rows(np.asarray(selected_vecs)).T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(pool))
+        
+        picks = []
+        available = np.ones(len(pool), dtype=bool)
+        for _ in range(min(n, len(pool))):
+            scores = MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * redundancy
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            picks.append(pool[best])
+            available[best] = False
+            redundancy = np.maximum(redundancy, pool_vecs @ pool_vecs[best])
+        
+        return picks
+    
+    def _format_context(self, chunks: List[Dict[str, any]]) -> str:
+        """
+        Format retrieved chunks into context string.
+        
+        Args:
+            chunks: Retrieved chunks
+            
+        Returns:
+            Formatted context string
+        """
+        context_parts = []
+        for i, chunk in enumerate(chunks, 1):
+            metadata = chunk['metadata']
+            text = chunk['text']
+            page_start = metadata.get('page_start', '?')
+            page_end = metadata.get('page_end', '?')
+            source = metadata.get('source_file', 'Unknown')
+            
+            # Format page range
+            if page_start == page_end:
+                page_ref = f"p.{page_start}"
+            else:
+                page_ref = f"p.{page_start}-{page_end}"
+            
+            context_parts.append(
+                f"[Excerpt {i}] ({source} {page_ref}):\n{text}\n"
+            )
+        
+        return "\n".join(context_parts)
+    
+    def _build_messages(self, query: str, context: str, state: str) -> List["BaseMessage"]:
+        """
+        Build the chat messages sent to the LLM.
+        
+        Args:
+            query: User query
+            context: Formatted context from retrieved chunks
+            state: State code
+            
+        Returns:
+            List of LangChain messages (system + user)
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        # Create prompt template
+        system_message = SystemMessage(
+            content="You are a helpful assistant specialized in analyzing transportation maintenance manuals. You provide accurate, cited answers based only on provided context."
+        )
+        
+        # Build the user message
+        user_prompt = f"""You are an expert assistant helping users understand state Department of Transportation (DOT) maintenance manual policies.
+
+You will be provided with excerpts from the {state} maintenance manual and a user question. Your task is to answer the question based ONLY on the provided excerpts.
+
+CRITICAL INSTRUCTIONS:
+1. ONLY use information from the provided excerpts below
+2. If the question asks about time-of-day constraints (nighttime, daytime, off-peak, work hours, lane closure windows, etc.), you MUST explicitly state whether such requirements exist in the provided excerpts
+3. If no explicit time-of-day requirement is found in the excerpts, you MUST say: "No explicit time-of-day requirement found in the provided manual excerpts."
+4. DO NOT make up or infer information not present in the excerpts
+5. Include citations in the format: (source_file p.X) or (source_file p.X-Y)
+6. Keep quotes SHORT - only essential snippets
+7. Be concise but complete
+
+CONTEXT FROM {state} MAINTENANCE MANUAL:
+{context}
+
+USER QUESTION:
+{query}
+
+Please provide a clear, accurate answer with citations:"""
+        
+        human_message = HumanMessage(content=user_prompt)
+        PROMPT_CHARS.observe(len(system_message.content) + len(user_prompt))
+        
+        return [system_message, human_message]
+    
+    def _call_llm(self, query: str, context: str, state: str) -> str:
+        """
+        Call LangChain LLM for completion.
+        
+        Args:
+            query: User query
+            context: Formatted context from retrieved chunks
+            state: State code
+            
+        Returns:
+            LLM response text
+        """
+        messages = self._build_messages(query, context, state)
+        try:
+            # Call LLM using LangChain
+            response = self.llm_gateway.invoke(messages)
+            _record_llm_tokens(messages, response.content, response)
+            
+            return response.content
+            
+        except LLMGatewayError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error calling LangChain LLM: {str(e)}")
+    
+    async def _acall_llm(self, query: str, context: str, state: str) -> str:
+        """
+        Async variant of _call_llm using LangChain's ainvoke.
+        
+        Args:
+            query: User query
+            context: Formatted context from retrieved chunks
+            state: State code
+            
+        Returns:
+            LLM response text
+        """
+        messages = self._build_messages(query, context, state)
+        try:
+            response = await self.llm_gateway.ainvoke(messages)
+            _record_llm_tokens(messages, response.content, response)
+            
+            return response.content
+            
+        except (asyncio.CancelledError, LLMGatewayError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error calling LangChain LLM: {str(e)}")
+    
+    def _extract_citations(self, answer: str, chunks: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        Extract citation information from retrieved chunks.
+        
+        Args:
+            answer: LLM answer text
+            chunks: Retrieved chunks
+            
+        Returns:
+            List of citation dictionaries
+        """
+        citations = []
+        
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            text = chunk['text']
+            
+            # Extract a snippet (first 200 chars)
+            snippet = text[:200] + "..." if len(text) > 200 else text
+            page_offsets = parse_page_offsets(metadata.get('page_offsets'))
+            
+            citations.append({
+                'source_file': metadata.get('source_file', 'Unknown'),
+                'page_start': metadata.get('page_start', '?'),
+                'page_end': metadata.get('page_end', '?'),
+                'page_offsets': page_offsets,
+                'snippet': snippet,
+                'snippet_page': page_at(page_offsets, 0, default=metadata.get('page_start', '?')),
+                'also_at': parse_locations(metadata.get('duplicate_locations')),
+                'has_time_keywords': metadata.get('has_time_keywords', False),
+                'matched_keywords': metadata.get('matched_time_keywords', [])
+            })
+        
+        return citations
+    
+    def answer_question(
+        self,
+        state: str,
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Dict[str, any]:
+        """
+        Answer a question about a state's maintenance manual using LangChain.
+        
+        Args:
+            state: State code (CA, TX, or WA)
+            question: User question
+            k: Number of chunks to retrieve
+            return_debug: Whether to return debug information
+            
+        Returns:
+            Dictionary containing:
+            - final_answer: The LLM's answer
+            - citations: List of citation dictionaries
+            - retrieved_chunks: (optional) Retrieved chunks for debugging
+            - timings: Seconds spent per stage (embed, retrieve, format, llm, total)
+            - trace: (debug only) The request trace with every span
+        """
+        with start_trace("answer_question", state=state, k=k) as trace:
+            # Embed query
+            with span("embed"):
+                query_embedding = self._embed_query(question)
+            
+            # Retrieve relevant chunks
+            with span("retrieve") as retrieve_span:
+                chunks = self._retrieve_by_embedding(question, query_embedding, state, k=k)
+                retrieve_span.set(chunks=len(chunks))
+            
+            response = self._generate_answer(state, question, chunks, return_debug)
+        
+        response['timings'] = trace.stage_timings()
+        if return_debug:
+            response['trace'] = trace.to_dict()
+        
+        return response
+    
+    def _generate_answer(
+        self,
+        state: str,
+        question: str,
+        chunks: List[Dict[str, any]],
+        return_debug: bool = False
+    ) -> Dict[str, any]:
+        """
+        Build the answer for a question from its retrieved chunks.
+        
+        Format and LLM stages are recorded as spans of the active trace.
+        
+        Args:
+            state: State code
+            question: User question
+            chunks: Retrieved chunks
+            return_debug: Whether to return debug information
+            
+        Returns:
+            Response dictionary (see answer_question)
+        """
+        CHUNKS_RETRIEVED.observe(len(chunks))
+        
+        if not chunks:
+            return self._no_results_response(state, return_debug)
+        
+        # Format context
+        with span("format") as format_span:
+            context = self._format_context(chunks)
+            if format_span:
+                format_span.set(context_chars=len(context))
+        
+        # Call LLM via LangChain
+        with span("llm"):
+            answer = self._call_llm(question, context, state)
+        
+        return self._build_response(answer, chunks, return_debug)
+    
+    def _no_results_response(self, state: str, return_debug: bool = False) -> Dict[str, any]:
+        """Build the response returned when retrieval finds nothing."""
+        return {
+            'final_answer': f"No relevant information found in the {state} maintenance manual for this query.",
+            'citations': [],
+            'retrieved_chunks': [] if return_debug else None
+        }
+    
+    def _build_response(
+        self,
+        answer: str,
+        chunks: List[Dict[str, any]],
+        return_debug: bool = False
+    ) -> Dict[str, any]:
+        """
+        Assemble the response dictionary for a generated answer.
+        
+        Args:
+            answer: LLM answer text
+            chunks: Retrieved chunks the answer was generated from
+            return_debug: Whether to include the retrieved chunks
+            
+        Returns:
+            Response dictionary (see answer_question)
+        """
+        # Extract citations
+        citations = self._extract_citations(answer, chunks)
+        
+        # Build response
+        response = {
+            'final_answer': answer,
+            'citations': citations
+        }
+        
+        if return_debug:
+            response['retrieved_chunks'] = chunks
+        
+        return response
+    
+    def stream_answer(
+        self,
+        state: str,
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Iterator[Dict[str, any]]:
+        """
+        Answer a question, yielding LLM tokens as they are generated.
+        
+        Args:
+            state: State code (CA, TX, or WA)
+            question: User question
+            k: Number of chunks to retrieve
+            return_debug: Whether to return debug information
+            
+        Yields:
+            Event dictionaries:
+            - {'type': 'token', 'content': str} for each piece of the answer
+            - {'type': 'done', 'response': dict} once, at the end. The response
+              has the keys of answer_question plus 'metrics' with
+              retrieval_time, time_to_first_token and total_time in seconds
+        """
+        trace = Trace("stream_answer", state=state, k=k)
+        try:
+            yield from self._stream_answer(trace, state, question, k, return_debug)
+        except GeneratorExit:
+            # The consumer stopped reading; not an error
+            trace.finish()
+            raise
+        except BaseException as e:
+            trace.finish(error=e)
+            raise
+    
+    def _stream_answer(
+        self,
+        trace: Trace,
+        state: str,
+        question: str,
+        k: int,
+        return_debug: bool
+    ) -> Iterator[Dict[str, any]]:
+        """Event generator behind stream_answer, recording spans on trace."""
+        # Activate only around non-yielding work: the consumer runs in this
+        # context between events
+        with activate(trace):
+            with trace.span("embed"):
+                query_embedding = self._embed_query(question)
+            with trace.span("retrieve") as retrieve_span:
+                chunks = self._retrieve_by_embedding(question, query_embedding, state, k=k)
+                retrieve_span.set(chunks=len(chunks))
+        retrieval_time = time.perf_counter() - trace.start
+        CHUNKS_RETRIEVED.observe(len(chunks))
+        
+        if not chunks:
+            response = self._no_results_response(state, return_debug)
+            yield {'type': 'token', 'content': response['final_answer']}
+            trace.finish()
+            response['metrics'] = {
+                'retrieval_time': retrieval_time,
+                'time_to_first_token': trace.duration,
+                'total_time': trace.duration
+            }
+            response['timings'] = trace.stage_timings()
+            if return_debug:
+                response['trace'] = trace.to_dict()
+            yield {'type': 'done', 'response': response}
+            return
+        
+        # Format context
+        with trace.span("format"):
+            context = self._format_context(chunks)
+            messages = self._build_messages(question, context, state)
+        
+        answer_parts = []
+        first_token_time = None
+        with trace.span("llm") as llm_span:
+            try:
+                for message_chunk in self.llm_gateway.stream(messages):
+                    if not message_chunk.content:
+                        continue
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - trace.start
+                        llm_span.set(time_to_first_token=first_token_time)
+                    answer_parts.append(message_chunk.content)
+                    yield {'type': 'token', 'content': message_chunk.content}
+            except LLMGatewayError:
+                raise
+            except Exception as e:
+                raise Exception(f"Error calling LangChain LLM: {str(e)}")
+            llm_span.set(tokens=_record_llm_tokens(messages, ''.join(answer_parts)))
+        
+        trace.finish()
+        total_time = trace.duration
+        response = self._build_response(''.join(answer_parts), chunks, return_debug)
+        response['metrics'] = {
+            'retrieval_time': retrieval_time,
+            'time_to_first_token': first_token_time if first_token_time is not None else total_time,
+            'total_time': total_time
+        }
+        response['timings'] = trace.stage_timings()
+        if return_debug:
+            response['trace'] = trace.to_dict()
+        yield {'type': 'done', 'response': response}
+    
+    async def aretrieve_chunks(
+        self,
+        query: str,
+        state: str,
+        k: int = DEFAULT_TOP_K,
+        boost_time_keywords: bool = True,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS,
+        route_sections: bool = SECTION_ROUTING,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, any]]:
+        """
+        Async variant of retrieve_chunks.
+        
+        Embedding and Chroma calls run in the pipeline's dedicated I/O executor,
+        so the event loop stays free. Cancelling the awaiting task returns
+        immediately; the executor job finishes in the background and its
+        result is discarded.
+        
+        Args:
+            query: User query
+            state: State filter (CA, TX, or WA)
+            k: Number of results to retrieve
+            boost_time_keywords: Whether to boost chunks with time keywords
+            merge_adjacent: Whether to merge neighbouring chunks
+            route_sections: Whether to search only the best-matching sections
+            timeout: Seconds to wait before raising asyncio.TimeoutError (None = no limit)
+            
+        Returns:
+            List of retrieved chunk dictionaries with metadata
+        """
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(
+            self.io_executor,
+            functools.partial(
+                self.retrieve_chunks,
+                query=query,
+                state=state,
+                k=k,
+                boost_time_keywords=boost_time_keywords,
+                merge_adjacent=merge_adjacent,
+                route_sections=route_sections
+            )
+        )
+        return await asyncio.wait_for(call, timeout)
+    
+    async def aanswer_question(
+        self,
+        state: str,
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False,
+        timeout: Optional[float] = ASYNC_ANSWER_TIMEOUT
+    ) -> Dict[str, any]:
+        """
+        Async variant of answer_question.
+        
+        Retrieval runs in the I/O executor and the LLM is awaited with ainvoke,
+        so one event loop can serve many questions concurrently.
+        
+        Args:
+            state: State code (CA, TX, or WA)
+            question: User question
+            k: Number of chunks to retrieve
+            return_debug: Whether to return debug information
+            timeout: Deadline in seconds for the whole answer (None = no limit)
+            
+        Returns:
+            Response dictionary (see answer_question)
+            
+        Raises:
+            asyncio.TimeoutError: If the deadline passes
+            asyncio.CancelledError: If the calling task is cancelled
+        """
+        return await asyncio.wait_for(
+            self._aanswer_question(state, question, k, return_debug),
+            timeout
+        )
+    
+    async def _aanswer_question(
+        self,
+        state: str,
+        question: str,
+        k: int,
+        return_debug: bool
+    ) -> Dict[str, any]:
+        """Retrieve and generate an answer without a deadline."""
+        with start_trace("aanswer_question", state=state, k=k) as trace:
+            # Runs in the I/O executor, so inner spans are not recorded
+            with span("retrieve") as retrieve_span:
+                chunks = await self.aretrieve_chunks(query=question, state=state, k=k)
+                retrieve_span.set(chunks=len(chunks))
+            CHUNKS_RETRIEVED.observe(len(chunks))
+            
+            if not chunks:
+                response = self._no_results_response(state, return_debug)
+            else:
+                with span("format"):
+                    context = self._format_context(chunks)
+                with span("llm"):
+                    answer = await self._acall_llm(question, context, state)
+                response = self._build_response(answer, chunks, return_debug)
+        
+        response['timings'] = trace.stage_timings()
+        if return_debug:
+            response['trace'] = trace.to_dict()
+        
+        return response
+    
+    def warm_up(self, state: Optional[str] = None) -> Dict[str, float]:
+        """
+        Run a dummy query end to end, except for the LLM call, so the first
+        real question does not pay one-time costs (first forward pass, intent
+        prototypes, Chroma index load, LangChain imports).
+        
+        The query embedding bypasses the query cache, so warm-up does not
+        show up as a cache miss.
+        
+        Args:
+            state: State to query (defaults to the first registered state)
+            
+        Returns:
+            Seconds spent per step, plus 'total'
+        """
+        state = state or next(iter(self.states), "")
+        timings = {}
+        start = time.perf_counter()
+        
+        step_start = time.perf_counter()
+        query_embedding = self.embedder.embed(WARMUP_QUERY)
+        timings['embed'] = time.perf_counter() - step_start
+        
+        step_start = time.perf_counter()
+        self.intent_classifier.classify([query_embedding])
+        timings['intents'] = time.perf_counter() - step_start
+        
+        step_start = time.perf_counter()
+        chunks = self._retrieve_by_embedding(WARMUP_QUERY, query_embedding, state)
+        timings['retrieve'] = time.perf_counter() - step_start
+        
+        step_start = time.perf_counter()
+        self._build_messages(WARMUP_QUERY, self._format_context(chunks), state)
+        timings['format'] = time.perf_counter() - step_start
+        
+        timings['total'] = time.perf_counter() - start
+        print(f"✓ Warm-up query finished in {timings['total']:.2f}s")
+        return timings
+    
+    def close(self):
+        """Shut down the I/O executor used by the async API and stop exporting gateway gauges."""
+        METRICS.unregister_collector(self._gateway_gauges)
+        self.io_executor.shutdown(wait=False)
+    
+    def answer_many(
+        self,
+        state: str,
+        questions: List[str],
+        k: int = DEFAULT_TOP_K,
+        max_concurrency: int = ANSWER_MANY_MAX_CONCURRENCY,
+        return_debug: bool = False
+    ) -> List[Dict[str, any]]:
+        """
+        Answer many questions about one state's manual in bulk.
+        
+        All questions are embedded in one batch and retrieved with multi-query
+        Chroma calls; LLM calls then run concurrently, at most max_concurrency
+        at a time. A failure affects only the question that caused it. Each
+        answer is traced on its own; the embed and retrieve timings are those
+        of the shared batch.
+        
+        Args:
+            state: State code (CA, TX, or WA)
+            questions: User questions
+            k: Number of chunks to retrieve per question
+            max_concurrency: Maximum number of LLM calls in flight
+            return_debug: Whether to return debug information
+            
+        Returns:
+            List of response dictionaries in input order. Each has the keys of
+            answer_question plus:
+            - question: The question text
+            - error: Error message, or None on success
+        """
+        if not questions:
+            return []
+        
+        results = [None] * len(questions)
+        batch_start = time.perf_counter()
+        batch_timings = {}
+        
+        # Batched embedding and retrieval; fall back to per-question retrieval
+        # so one bad question cannot fail the whole batch
+        try:
+            query_embeddings = self._embed_queries(questions)
+            batch_timings['embed'] = time.perf_counter() - batch_start
+            chunk_lists = self._retrieve_batch(questions, query_embeddings, state, k=k)
+        except Exception:
+            chunk_lists = []
+            for i, question in enumerate(questions):
+                try:
+                    chunk_lists.append(self.retrieve_chunks(query=question, state=state, k=k))
+                except Exception as e:
+                    chunk_lists.append(None)
+                    results[i] = self._error_response(question, e, return_debug)
+        batch_timings['retrieve'] = time.perf_counter() - batch_start - batch_timings.get('embed', 0.0)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {
+                executor.submit(
+                    self._answer_in_batch, state, question, chunks, k, batch_start, batch_timings, return_debug
+                ): i
+                for i, (question, chunks) in enumerate(zip(questions, chunk_lists))
+                if chunks is not None
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    response = future.result()
+                    response['question'] = questions[i]
+                    response['error'] = None
+                    results[i] = response
+                except Exception as e:
+                    results[i] = self._error_response(questions[i], e, return_debug)
+        
+        return results
+    
+    def _answer_in_batch(
+        self,
+        state: str,
+        question: str,
+        chunks: List[Dict[str, any]],
+        k: int,
+        batch_start: float,
+        batch_timings: Dict[str, float],
+        return_debug: bool
+    ) -> Dict[str, any]:
+        """Answer one question of answer_many from its retrieved chunks, with timings."""
+        with start_trace("answer_many", state=state, k=k) as trace:
+            response = self._generate_answer(state, question, chunks, return_debug)
+        
+        response['timings'] = {
+            **batch_timings,
+            **trace.stage_timings(),
+            'total': time.perf_counter() - batch_start
+        }
+        if return_debug:
+            response['trace'] = trace.to_dict()
         
         return response
+    
+    def iter_compare_states(
+        self,
+        states: List[str],
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Iterator[Tuple[str, Dict[str, any]]]:
+        """
+        Answer the same question for several states in parallel.
+        
+        The question is embedded once; retrieval and the LLM call for each
+        state then run concurrently, and answers are yielded as they finish.
+        
+        Args:
+            states: State codes to compare
+            question: User question
+            k: Number of chunks to retrieve per state
+            return_debug: Whether to return debug information
+            
+        Yields:
+            (state, response) tuples in completion order. Each response has the
+            keys of answer_question plus 'question' and 'error'
+        """
+        if not states:
+            return
+        
+        query_embedding = self._embed_query(question)
+        
+        with ThreadPoolExecutor(max_workers=len(states)) as executor:
+            futures = {
+                executor.submit(
+                    self._answer_for_state, state, question, query_embedding, k, return_debug
+                ): state
+                for state in states
+            }
+            for future in as_completed(futures):
+                state = futures[future]
+                try:
+                    response = future.result()
+                    response['question'] = question
+                    response['error'] = None
+                except Exception as e:
+                    response = self._error_response(question, e, return_debug)
+                yield state, response
+    
+    def compare_states(
+        self,
+        states: List[str],
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        synthesize: bool = False,
+        return_debug: bool = False
+    ) -> Dict[str, any]:
+        """
+        Answer the same question for several states and optionally compare them.
+        
+        Args:
+            states: State codes to compare
+            question: User question
+            k: Number of chunks to retrieve per state
+            synthesize: Whether to make a final LLM call comparing the answers
+            return_debug: Whether to return debug information
+            
+        Returns:
+            Dictionary containing:
+            - answers: Mapping of state code to response, in the order of states
+            - synthesis: Comparison text, or None if not requested
+        """
+        answers = dict(self.iter_compare_states(states, question, k=k, return_debug=return_debug))
+        answers = {state: answers[state] for state in states}
+        
+        synthesis = None
+        if synthesize:
+            synthesis = self.synthesize_comparison(question, answers)
+        
+        return {
+            'answers': answers,
+            'synthesis': synthesis
+        }
+    
+    def _answer_for_state(
+        self,
+        state: str,
+        question: str,
+        query_embedding: List[float],
+        k: int,
+        return_debug: bool
+    ) -> Dict[str, any]:
+        """Retrieve with a precomputed query embedding and answer for one state."""
+        chunks = self._retrieve_by_embedding(question, query_embedding, state, k=k)
+        return self._generate_answer(state, question, chunks, return_debug)
+    
+    def synthesize_comparison(self, question: str, answers: Dict[str, Dict[str, any]]) -> str:
+        """
+        Compare per-state answers with one additional LLM call.
+        
+        Args:
+            question: User question
+            answers: Mapping of state code to response from iter_compare_states
+            
+        Returns:
+            Comparison text, or an empty string if no state produced an answer
+        """
+        sections = []
+        for state, response in answers.items():
+            if response.get('error') or not response.get('final_answer'):
+                continue
+            sections.append(f"[{state}]\n{response['final_answer']}\n")
+        
+        if not sections:
+            return ""
+        
+        answers_text = "\n".join(sections)
+        
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        system_message = SystemMessage(
+            content="You are a helpful assistant specialized in comparing transportation maintenance manual policies across states. You only use the answers you are given."
+        )
+        
+        user_prompt = f"""Below are answers to the same question, each based only on one state's DOT maintenance manual.
+
+Compare the states:
+1. Summarize where the requirements agree and where they differ
+2. Name the state for every requirement you mention
+3. Keep the citations from the answers in the format (source_file p.X)
+4. If a state's answer says no requirement was found, say so for that state
+5. DO NOT add information that is not in the answers
+
+QUESTION:
+{question}
+
+ANSWERS BY STATE:
+{answers_text}
+
+Please provide a concise comparison:"""
+        
+        messages = [system_message, HumanMessage(content=user_prompt)]
+        try:
+            response = self.llm_gateway.invoke(messages)
+            _record_llm_tokens(messages, response.content, response)
+            return response.content
+        except LLMGatewayError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error calling LangChain LLM: {str(e)}")
+    
+    @staticmethod
+    def _error_response(question: str, error: Exception, return_debug: bool = False) -> Dict[str, any]:
+        """Build the per-question response for a failed bulk answer."""
+        return {
+            'question': question,
+            'final_answer': None,
+            'citations': [],
+            'retrieved_chunks': [] if return_debug else None,
+            'error': str(error)
+        }
 
 
-def get_collection_stats() -> Dict[str, any]:
+_stats_cache = {'stats': None, 'loaded_at': 0.0}
+_stats_cache_lock = threading.Lock()
+
+
+def get_collection_stats(max_age: float = STATS_CACHE_TTL) -> Dict[str, any]:
     """
     Get statistics about the ChromaDB collection.
     
+    Reads the index manifest written by ingest.py; indexes built before the
+    manifest existed fall back to counting in the collection. Results are
+    cached for max_age seconds; errors are not cached.
+    
+    Args:
+        max_age: Seconds a cached result stays valid (0 forces a reload)
+    
     Returns:
-        Dictionary with collection statistics
+        Dictionary with collection statistics:
+        - total_chunks, total_pages, collection_name
+        - states: per-state name, chunks, time_keyword_chunks and pages (the
+          state registry, sorted by code)
+        - {STATE}_exists: whether a registered state has chunks
+        - index_version, built_at: None when there is no manifest
+        - snapshot_id: ID of the imported snapshot, None for a local ingest
+        or {'error': message} if the collection cannot be read
     """
-    try:
-        chroma_client = chromadb.PersistentClient(
-            path=str(CHROMA_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        collection = chroma_client.get_collection(name=COLLECTION_NAME)
-        
-        # Get count
-        count = collection.count()
-        
-        # Try to get state breakdown
+    now = time.monotonic()
+    with _stats_cache_lock:
+        if _stats_cache['stats'] is not None and now - _stats_cache['loaded_at'] < max_age:
+            return _stats_cache['stats']
+    
+    stats = _load_collection_stats()
+    if 'error' not in stats:
+        with _stats_cache_lock:
+            _stats_cache['stats'] = stats
+            _stats_cache['loaded_at'] = now
+    
+    return stats
+
+
+def _load_collection_stats() -> Dict[str, any]:
+    """Build collection statistics from the manifest, or from the collection itself."""
+    manifest = read_manifest()
+    if manifest is not None:
+        names = registered_states(manifest)
+        states = {
+            state: {
+                'name': names[state],
+                'chunks': entry['chunks'],
+                'time_keyword_chunks': entry['time_keyword_chunks'],
+                'pages': entry['pages']
+            }
+            for state, entry in sorted(manifest['states'].items())
+        }
         stats = {
-            'total_chunks': count,
-            'collection_name': COLLECTION_NAME
+            'total_chunks': manifest['total_chunks'],
+            'total_pages': manifest['total_pages'],
+            'collection_name': manifest['collection_name'],
+            'index_version': manifest['index_version'],
+            'built_at': manifest['built_at'],
+            'snapshot_id': manifest.get('snapshot', {}).get('id'),
+            'states': states
         }
-        
-        # Get counts per state
-        for state in ['CA', 'TX', 'WA']:
-            try:
-                results = collection.get(where={"state": state}, limit=1)
-                # This is a rough check - actual count would require querying all
-                stats[f'{state}_exists'] = len(results['ids']) > 0
-            except:
-                stats[f'{state}_exists'] = False
-        
-        return stats
-        
-    except Exception as e:
-        return {'error': str(e)}
+    else:
+        try:
+            collection = get_chroma_client().get_collection(name=COLLECTION_NAME)
+            
+            # Older index without a manifest: count from the metadata, in
+            # one pass however many states it holds
+            names = known_jurisdictions()
+            states = {}
+            last_pages = {}
+            for metadata in collection.get(include=['metadatas'])['metadatas']:
+                state = metadata.get('state', 'Unknown')
+                entry = states.setdefault(state, {
+                    'name': names.get(state, state),
+                    'chunks': 0,
+                    'time_keyword_chunks': 0,
+                    'pages': 0
+                })
+                entry['chunks'] += 1
+                entry['time_keyword_chunks'] += 1 if metadata.get('has_time_keywords') else 0
+                source = (state, metadata.get('source_file', 'Unknown'))
+                last_pages[source] = max(last_pages.get(source, 0), int(metadata.get('page_end', 0)))
+            for (state, _), pages in last_pages.items():
+                states[state]['pages'] += pages
+            states = dict(sorted(states.items()))
+            
+            stats = {
+                'total_chunks': collection.count(),
+                'total_pages': sum(entry['pages'] for entry in states.values()),
+                'collection_name': COLLECTION_NAME,
+                'index_version': None,
+                'built_at': None,
+                'snapshot_id': None,
+                'states': states
+            }
+        except Exception as e:
+            return {'error': str(e)}
+    
+    for state, entry in states.items():
+        stats[f'{state}_exists'] = entry['chunks'] > 0
+    
+    return stats
@@ -0,0 +1,215 @@
+"""
+Thin client for the retrieval/answer HTTP service (server.py).
+
+RemotePipeline mirrors the parts of RAGPipeline the Streamlit app uses, so
+app.py can run without loading any models when RAG_SERVICE_URL is set.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    DEFAULT_TOP_K,
+    MERGE_ADJACENT_CHUNKS,
+    PAGE_RENDER_DPI,
+    SECTION_ROUTING,
+    SERVICE_REQUEST_TIMEOUT,
+    STATS_CACHE_TTL
+)
+
+
+class ServiceError(Exception):
+    """The service returned an error or could not be reached."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class _RemoteGateway:
+    """Exposes the service's LLM gateway metrics like LLMGateway.metrics()."""
+
+    def __init__(self, client: "RemotePipeline"):
+        self._client = client
+
+    def metrics(self) -> Dict[str, any]:
+        return self._client.health()['llm_gateway']
+
+
+class RemotePipeline:
+    """RAGPipeline-compatible client that calls a remote service."""
+
+    def __init__(self, base_url: str, timeout: float = SERVICE_REQUEST_TIMEOUT):
+        """
+        Args:
+            base_url: Service URL, e.g. http://127.0.0.1:8765
+            timeout: Seconds to wait for a response (or between stream events)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.llm_gateway = _RemoteGateway(self)
+
+    def _open(self, path: str, payload: Optional[Dict[str, any]] = None):
+        """Send a request and return the open HTTP response."""
+        data = None
+        headers = {}
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+            headers['Content-Type'] = "application/json"
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise ServiceError(f"RAG service error ({e.code}): {message}", e.code)
+        except (urllib.error.URLError, OSError) as e:
+            raise ServiceError(f"RAG service unreachable at {self.base_url}: {e}")
+
+    def _request(self, path: str, payload: Optional[Dict[str, any]] = None) -> Dict[str, any]:
+        with self._open(path, payload) as response:
+            return json.loads(response.read())
+
+    def _stream(self, path: str, payload: Dict[str, any]) -> Iterator[Dict[str, any]]:
+        with self._open(path, payload) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get('type') == 'error':
+                    raise ServiceError(event['error'])
+                yield event
+
+    def health(self) -> Dict[str, any]:
+        """Get the service's worker pool and LLM gateway state."""
+        return self._request('/health')
+
+    def prometheus_metrics(self) -> str:
+        """Get the service's metrics in Prometheus text format."""
+        with self._open('/metrics') as response:
+            return response.read().decode("utf-8")
+
+    def traces_jsonl(self, limit: Optional[int] = None) -> str:
+        """Get the service's recent request traces as JSON lines."""
+        path = '/traces' + (f"?{urlencode({'limit': limit})}" if limit else '')
+        with self._open(path) as response:
+            return response.read().decode("utf-8")
+
+    def render_page(
+        self,
+        source_file: str,
+        page_num: int,
+        dpi: int = PAGE_RENDER_DPI,
+        highlight: str = ""
+    ) -> bytes:
+        """See page_render.PageRenderer.render."""
+        query = urlencode({'source': source_file, 'page': page_num, 'dpi': dpi, 'highlight': highlight})
+        with self._open('/page?' + query) as response:
+            return response.read()
+
+    def retrieve_chunks(
+        self,
+        query: str,
+        state: str,
+        k: int = DEFAULT_TOP_K,
+        boost_time_keywords: bool = True,
+        merge_adjacent: bool = MERGE_ADJACENT_CHUNKS,
+        route_sections: bool = SECTION_ROUTING
+    ) -> List[Dict[str, any]]:
+        """See RAGPipeline.retrieve_chunks."""
+        return self._request('/retrieve', {
+            'query': query,
+            'state': state,
+            'k': k,
+            'boost_time_keywords': boost_time_keywords,
+            'merge_adjacent': merge_adjacent,
+            'route_sections': route_sections
+        })['chunks']
+
+    def answer_question(
+        self,
+        state: str,
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Dict[str, any]:
+        """See RAGPipeline.answer_question."""
+        return self._request('/answer', {
+            'state': state,
+            'question': question,
+            'k': k,
+            'return_debug': return_debug
+        })
+
+    def stream_answer(
+        self,
+        state: str,
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Iterator[Dict[str, any]]:
+        """See RAGPipeline.stream_answer."""
+        yield from self._stream('/answer/stream', {
+            'state': state,
+            'question': question,
+            'k': k,
+            'return_debug': return_debug
+        })
+
+    def iter_compare_states(
+        self,
+        states: List[str],
+        question: str,
+        k: int = DEFAULT_TOP_K,
+        return_debug: bool = False
+    ) -> Iterator[Tuple[str, Dict[str, any]]]:
+        """See RAGPipeline.iter_compare_states."""
+        for event in self._stream('/compare/stream', {
+            'states': states,
+            'question': question,
+            'k': k,
+            'return_debug': return_debug
+        }):
+            yield event['state'], event['response']
+
+    def synthesize_comparison(self, question: str, answers: Dict[str, Dict[str, any]]) -> str:
+        """See RAGPipeline.synthesize_comparison."""
+        return self._request('/synthesize', {'question': question, 'answers': answers})['synthesis']
+
+
+_stats_cache = {}
+_stats_cache_lock = threading.Lock()
+
+
+def get_remote_collection_stats(base_url: str, max_age: float = STATS_CACHE_TTL) -> Dict[str, any]:
+    """
+    Get collection statistics from the service, cached like rag.get_collection_stats.
+
+    Args:
+        base_url: Service URL
+        max_age: Seconds a cached result stays valid
+
+    Returns:
+        Statistics dictionary, or {'error': message}
+    """
+    now = time.monotonic()
+    with _stats_cache_lock:
+        cached = _stats_cache.get(base_url)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+
+    try:
+        stats = RemotePipeline(base_url, timeout=10)._request('/stats')
+    except ServiceError as e:
+        return {'error': str(e)}
+
+    if 'error' not in stats:
+        with _stats_cache_lock:
+            _stats_cache[base_url] = (now, stats)
+    return stats
@@ -0,0 +1,259 @@
+"""
+Process-wide registry of heavyweight shared resources.
+
+The embedding model (with its query micro-batcher and intent classifier),
+Chroma client, chunk-text store, compact vector index, LLM client, LLM
+gateway, RAG pipeline and page renderer are loaded at most once per process
+and shared by every caller (Streamlit sessions, server workers,
+benchmarks). Loading is thread-safe: concurrent first requests for the same
+resource wait for a single load, while different resources can load in
+parallel.
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    CHROMA_DIR,
+    CHROMA_MEMORY_LIMIT_MB,
+    COMPACT_INDEX_DIR,
+    DOC_STORE_PATH,
+    EMBED_MODEL,
+    LLM_BACKEND,
+    PDF_DIR
+)
+
+
+_resources: Dict[tuple, any] = {}
+_locks: Dict[tuple, threading.Lock] = {}
+_registry_lock = threading.Lock()
+_preload_thread: Optional[threading.Thread] = None
+_ABSENT = object()  # cached result of a loader that found nothing (e.g. no chunk-text store)
+
+
+def _get_or_create(key: tuple, factory: Callable[[], any]) -> any:
+    """
+    Get a shared resource, creating it on first use.
+
+    Args:
+        key: Resource key
+        factory: Callable that loads the resource
+
+    Returns:
+        The shared resource (None is cached too, so optional resources that
+        do not exist are only looked up once)
+    """
+    resource = _resources.get(key)
+    if resource is not None:
+        return None if resource is _ABSENT else resource
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    with lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = factory()
+            _resources[key] = _ABSENT if resource is None else resource
+    return None if resource is _ABSENT else resource
+
+
+def get_embedding_model(model_name: str = EMBED_MODEL):
+    """Get the shared SentenceTransformer model."""
+    def load():
+        from sentence_transformers import SentenceTransformer
+        print(f"Loading embedding model: {model_name}")
+        return SentenceTransformer(model_name)
+
+    return _get_or_create(('embedding_model', model_name), load)
+
+
+def get_embedding_batcher(model_name: str = EMBED_MODEL):
+    """Get the shared query-embedding micro-batcher for an embedding model."""
+    def load():
+        from embedding_batcher import EmbeddingBatcher
+        return EmbeddingBatcher(get_embedding_model(model_name))
+
+    return _get_or_create(('embedding_batcher', model_name), load)
+
+
+def get_intent_classifier(model_name: str = EMBED_MODEL):
+    """Get the shared query intent classifier for an embedding model."""
+    def load():
+        from intents import load_intent_classifier
+        return load_intent_classifier(get_embedding_model(model_name), model_name)
+
+    return _get_or_create(('intent_classifier', model_name), load)
+
+
+def get_chroma_client(path: str = str(CHROMA_DIR)):
+    """
+    Get the shared Chroma persistent client.
+
+    With CHROMA_MEMORY_LIMIT_MB set, Chroma unloads the least recently used
+    collection indexes (e.g. state shards) to stay under the limit.
+    """
+    def load():
+        import chromadb
+        from chromadb.config import Settings
+        settings = {'anonymized_telemetry': False}
+        if CHROMA_MEMORY_LIMIT_MB > 0:
+            settings['chroma_segment_cache_policy'] = "LRU"
+            settings['chroma_memory_limit_bytes'] = CHROMA_MEMORY_LIMIT_MB * 1024 * 1024
+        return chromadb.PersistentClient(path=path, settings=Settings(**settings))
+
+    return _get_or_create(('chroma_client', path), load)
+
+
+def get_doc_store(path: str = str(DOC_STORE_PATH)):
+    """Get the shared chunk-text store, or None if the index has none."""
+    def load():
+        from doc_store import open_doc_store
+        return open_doc_store(Path(path))
+
+    return _get_or_create(('doc_store', path), load)
+
+
+def get_compact_index(path: str = str(COMPACT_INDEX_DIR)):
+    """Get the shared compact vector index, or None if none was built."""
+    def load():
+        from compact_vectors import open_compact_index
+        return open_compact_index(Path(path))
+
+    return _get_or_create(('compact_index', path), load)
+
+
+def get_llm(backend: str = LLM_BACKEND):
+    """Get the shared chat model for an LLM backend."""
+    def load():
+        from llm_backends import create_llm
+        return create_llm(backend)
+
+    return _get_or_create(('llm', backend), load)
+
+
+def get_llm_gateway(backend: str = LLM_BACKEND):
+    """
+    Get the shared LLM gateway for a backend.
+
+    Sharing the gateway makes its rate limits, concurrency cap and circuit
+    breaker apply to the whole process rather than to each caller.
+    """
+    def load():
+        from llm_gateway import LLMGateway
+        return LLMGateway(get_llm(backend))
+
+    return _get_or_create(('llm_gateway', backend), load)
+
+
+def get_pipeline(llm_backend: Optional[str] = None):
+    """
+    Get the shared RAG pipeline for an LLM backend.
+
+    Args:
+        llm_backend: LLM backend name (defaults to config.LLM_BACKEND)
+
+    Returns:
+        RAGPipeline instance shared by all callers
+    """
+    backend = llm_backend or LLM_BACKEND
+
+    def load():
+        from rag import RAGPipeline
+        return RAGPipeline(llm_backend=backend)
+
+    return _get_or_create(('pipeline', backend), load)
+
+
+def get_page_renderer(pdf_dir: str = str(PDF_DIR)):
+    """Get the shared renderer for cited PDF pages (with its document pool and page cache)."""
+    def load():
+        from page_render import PageRenderer
+        return PageRenderer(Path(pdf_dir))
+
+    return _get_or_create(('page_renderer', pdf_dir), load)
+
+
+def preload(llm_backend: Optional[str] = None, warm_up: bool = True) -> threading.Thread:
+    """
+    Start loading the shared pipeline in a background thread.
+
+    The embedding model (and intent classifier), Chroma client, LLM and page
+    renderer (which opens the PDFs) load in parallel, then the pipeline is
+    built and (optionally) warmed up with a dummy query. A get_pipeline call
+    made meanwhile waits for this load instead of starting its own. Only the
+    first call starts a thread, so it is safe to call on every Streamlit
+    rerun.
+
+    Args:
+        llm_backend: LLM backend name (defaults to config.LLM_BACKEND)
+        warm_up: Whether to run RAGPipeline.warm_up once the pipeline is built
+
+    Returns:
+        The preload thread
+    """
+    global _preload_thread
+    with _registry_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(
+                target=_preload,
+                args=(llm_backend or LLM_BACKEND, warm_up),
+                name="rag-preload",
+                daemon=True
+            )
+            _preload_thread.start()
+        return _preload_thread
+
+
+def _preload(backend: str, warm_up: bool):
+    """Load shared resources in parallel, then build and warm up the pipeline."""
+    # The intent classifier waits for the embedding model, then embeds its
+    # prototypes if they are not cached yet
+    loaders = [
+        get_embedding_model,
+        get_intent_classifier,
+        get_chroma_client,
+        lambda: get_llm(backend),
+        get_page_renderer
+    ]
+    threads = [threading.Thread(target=_load_quietly, args=(loader,), daemon=True) for loader in loaders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        pipeline = get_pipeline(backend)
+        if warm_up:
+            pipeline.warm_up()
+    except Exception as e:
+        # Failed loads are not cached: the foreground get_pipeline call
+        # retries and reports the error
+        print(f"⚠️  Background preload failed: {e}")
+
+
+def _load_quietly(loader: Callable[[], any]):
+    try:
+        loader()
+    except Exception:
+        pass  # surfaced by get_pipeline
+
+
+def loaded_resources() -> List[str]:
+    """Get the keys of all loaded resources, for diagnostics."""
+    return [":".join(str(part) for part in key) for key in list(_resources)]
+
+
+def clear():
+    """
+    Drop all shared resources so they are reloaded on next use
+    (e.g. after re-ingesting the collection).
+    """
+    global _preload_thread
+    with _registry_lock:
+        for key, resource in _resources.items():
+            if key[0] in ('pipeline', 'doc_store', 'page_renderer') and hasattr(resource, 'close'):
+                resource.close()
+        _resources.clear()
+        _locks.clear()
+        _preload_thread = None
@@ -0,0 +1,138 @@
+"""
+Section index for two-stage, section-routed retrieval.
+
+At ingest every document is split into sections along its outline (PDF
+bookmarks, or running "Chapter / Section" headers). Each section's title path
+and a short extractive summary are embedded into a small routing collection.
+At query time the routing collection picks the top sections, and only the
+chunks on those sections' pages are searched, so the cost of the second stage
+depends on section size rather than on the size of the whole corpus.
+"""
+from collections import Counter
+from typing import Dict, List
+
+from config import SECTION_SUMMARY_CHARS
+from chunking import create_section_id
+
+
+FRONT_MATTER_TITLE = "Front matter"
+BOILERPLATE_PAGE_SHARE = 0.5  # lines on more than this share of pages are running headers/footers
+
+
+def section_title(section_path: List[str]) -> str:
+    """Get the display title of a section path."""
+    return " > ".join(section_path) or FRONT_MATTER_TITLE
+
+
+def _boilerplate_lines(pages: List[Dict[str, any]]) -> set:
+    """Find lines repeated on most pages (running headers, footers, page labels)."""
+    counts = Counter()
+    for page in pages:
+        counts.update({line.strip() for line in page["text"].splitlines() if line.strip()})
+    threshold = max(2, len(pages) * BOILERPLATE_PAGE_SHARE)
+    return {line for line, count in counts.items() if count > threshold}
+
+
+def _summarize(texts: List[str], skip_lines: set, max_chars: int = SECTION_SUMMARY_CHARS) -> str:
+    """Build an extractive summary: the section's leading text without headers."""
+    lines = []
+    length = 0
+    for text in texts:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line in skip_lines:
+                continue
+            lines.append(line)
+            length += len(line) + 1
+            if length >= max_chars:
+                return " ".join(lines)[:max_chars]
+    return " ".join(lines)
+
+
+def build_sections(documents: List[Dict[str, any]], chunks: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Build the section index for a set of documents.
+
+    A section is a run of pages sharing the same section path. Its chunks are
+    the searchable chunks (children, for a hierarchical index) whose page
+    span overlaps the section's pages.
+
+    Args:
+        documents: Documents from extract_all_pdfs (pages with section_path)
+        chunks: All chunks created from the documents
+
+    Returns:
+        List of section dictionaries in document order
+    """
+    searchable = [c for c in chunks if c.get('level') != 'parent']
+    sections = []
+
+    for doc in documents:
+        skip_lines = _boilerplate_lines(doc['pages'])
+        doc_sections = {}
+        for page in doc['pages']:
+            path = page.get('section_path', [])
+            section_id = create_section_id(doc['state'], doc['source_file'], path)
+            section = doc_sections.get(section_id)
+            if section is None:
+                section = doc_sections[section_id] = {
+                    'id': section_id,
+                    'state': doc['state'],
+                    'source_file': doc['source_file'],
+                    'title': section_title(path),
+                    'level': len(path),
+                    'page_start': page['page_num'],
+                    'page_end': page['page_num'],
+                    'texts': []
+                }
+            section['page_end'] = max(section['page_end'], page['page_num'])
+            section['texts'].append(page['text'])
+
+        doc_chunks = [c for c in searchable if c['source_file'] == doc['source_file']]
+        for section in doc_sections.values():
+            skip = skip_lines | set(section['title'].split(" > "))
+            section['summary'] = _summarize(section.pop('texts'), skip)
+            section['chunks'] = sum(
+                1 for c in doc_chunks
+                if c['page_start'] <= section['page_end'] and c['page_end'] >= section['page_start']
+            )
+            if section['chunks']:
+                sections.append(section)
+
+    return sections
+
+
+def routing_text(section: Dict[str, any]) -> str:
+    """Get the text embedded for a section in the routing collection."""
+    return f"{section['title']}\n\n{section['summary']}"
+
+
+def section_metadata(section: Dict[str, any]) -> Dict[str, any]:
+    """Flatten a section into routing-collection metadata."""
+    return {
+        'section_id': section['id'],
+        'state': section['state'],
+        'source_file': section['source_file'],
+        'title': section['title'],
+        'level': section['level'],
+        'page_start': section['page_start'],
+        'page_end': section['page_end'],
+        'chunks': section['chunks']
+    }
+
+
+def section_chunk_filter(section: Dict[str, any]) -> Dict[str, any]:
+    """
+    Build the Chroma filter for the chunks of one section.
+
+    Args:
+        section: Section metadata from the routing collection
+
+    Returns:
+        Where filter matching chunks whose pages overlap the section
+    """
+    return {"$and": [
+        {"source_file": section['source_file']},
+        {"page_start": {"$lte": section['page_end']}},
+        {"page_end": {"$gte": section['page_start']}}
+    ]}
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Retrieval/answer HTTP service.
+Serves one warm RAGPipeline to any number of UI replicas (see RAG_SERVICE_URL
+in app.py). Pipeline calls run on a fixed worker pool; requests beyond the
+pool wait in a bounded queue and are rejected with 503 once it is full.
+
+Endpoints (JSON in, JSON out; streaming endpoints return JSON lines):
+    POST /retrieve          {state, query, k?, boost_time_keywords?, merge_adjacent?, route_sections?}
+    POST /answer            {state, question, k?, return_debug?}
+    POST /answer/stream     {state, question, k?, return_debug?}
+    POST /compare/stream    {states, question, k?, return_debug?}
+    POST /synthesize        {question, answers}
+    GET  /health            worker pool and LLM gateway state
+    GET  /stats             collection statistics
+    GET  /metrics           Prometheus metrics
+    GET  /traces?limit=     recent request traces (JSON lines)
+    GET  /page?source=&page=&dpi=&highlight=
+                            PNG of a cited page, with the highlight text marked
+
+Usage:
+    python server.py
+    python server.py --port 8765 --workers 8 --queue-size 64 --backend groq
+"""
+import argparse
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from config import (
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_WORKERS,
+    SERVICE_QUEUE_SIZE,
+    SERVICE_REQUEST_TIMEOUT,
+    LLM_BACKEND,
+    DEFAULT_TOP_K,
+    MAX_TOP_K,
+    MERGE_ADJACENT_CHUNKS,
+    PAGE_RENDER_DPI,
+    SECTION_ROUTING
+)
+from tracing import METRICS, export_traces_jsonl
+
+
+MAX_BODY_BYTES = 1024 * 1024
+_END_OF_STREAM = object()
+
+REJECTED = METRICS.counter("rag_service_rejected_total", "Requests rejected because the queue was full")
+
+
+class ServiceBusy(Exception):
+    """The worker pool and its queue are full."""
+
+
+class BadRequest(Exception):
+    """The request body is missing a field or has an invalid value."""
+
+
+class RAGService:
+    """A RAGPipeline behind a bounded worker pool."""
+
+    def __init__(self, pipeline, workers: int = SERVICE_WORKERS, queue_size: int = SERVICE_QUEUE_SIZE,
+                 request_timeout: float = SERVICE_REQUEST_TIMEOUT):
+        """
+        Args:
+            pipeline: RAGPipeline to serve
+            workers: Pipeline calls running at once
+            queue_size: Calls allowed to wait for a worker
+            request_timeout: Seconds a request may take, including queueing
+        """
+        self.pipeline = pipeline
+        self.workers = workers
+        self.queue_size = queue_size
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-service")
+        self._pending = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        METRICS.register_collector(self._gauges)
+
+    def _gauges(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'rag_service_queue_depth': self._pending - self._running,
+                'rag_service_in_flight': self._running
+            }
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """
+        Queue a pipeline call on the worker pool.
+
+        Returns:
+            Future of the call
+
+        Raises:
+            ServiceBusy: If every worker is busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                REJECTED.inc()
+                raise ServiceBusy(f"Service busy: {self._pending} requests pending")
+            self._pending += 1
+
+        def run():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+
+        try:
+            return self.executor.submit(run)
+        except RuntimeError:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run a pipeline call on the worker pool and wait for its result."""
+        return self.submit(fn, *args, **kwargs).result(timeout=self.request_timeout)
+
+    def stream(self, generator_fn: Callable[[], Iterator[Dict[str, any]]]) -> Iterator[Dict[str, any]]:
+        """
+        Run an event generator on the worker pool and relay its events.
+
+        The generator is closed early if the relay stops (client disconnect
+        or timeout).
+
+        Args:
+            generator_fn: Returns the event iterator; called on a worker thread
+
+        Returns:
+            Iterator over the events in order; a failure becomes a final
+            {'type': 'error'} event
+
+        Raises:
+            ServiceBusy: If every worker is busy and the queue is full
+        """
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            iterator = generator_fn()
+            try:
+                for event in iterator:
+                    if cancelled.is_set():
+                        break
+                    events.put(event)
+            except Exception as e:
+                events.put({'type': 'error', 'error': str(e)})
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+                events.put(_END_OF_STREAM)
+
+        def relay():
+            try:
+                while True:
+                    event = events.get(timeout=self.request_timeout)
+                    if event is _END_OF_STREAM:
+                        return
+                    yield event
+            finally:
+                # Stops the producer if the client went away or the relay timed out
+                cancelled.set()
+
+        # Submit now, so a full queue is reported before any response is sent
+        self.submit(produce)
+        return relay()
+
+    def health(self) -> Dict[str, any]:
+        """Get worker pool and LLM gateway state."""
+        with self._lock:
+            pending, running = self._pending, self._running
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queue_depth': pending - running,
+            'in_flight': running,
+            'llm_gateway': self.pipeline.llm_gateway.metrics()
+        }
+
+    def shutdown(self):
+        METRICS.unregister_collector(self._gauges)
+        self.executor.shutdown(wait=False)
+
+
+def _json_default(value):
+    """Serialize numpy scalars and anything else JSON does not know."""
+    item = getattr(value, 'item', None)
+    if callable(item):
+        return item()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def _require(body: Dict[str, any], field: str, kind: type):
+    value = body.get(field)
+    if not isinstance(value, kind) or (kind is str and not value.strip()):
+        raise BadRequest(f"'{field}' is required and must be a {kind.__name__}")
+    return value
+
+
+def _top_k(body: Dict[str, any]) -> int:
+    k = body.get('k', DEFAULT_TOP_K)
+    if not isinstance(k, int) or not 1 <= k <= MAX_TOP_K:
+        raise BadRequest(f"'k' must be an integer between 1 and {MAX_TOP_K}")
+    return k
+
+
+def _flag(body: Dict[str, any], field: str, default: bool) -> bool:
+    value = body.get(field, default)
+    if not isinstance(value, bool):
+        raise BadRequest(f"'{field}' must be a boolean")
+    return value
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler; the RAGService is attached to the server as `service`."""
+
+    server_version = "RAGService/1.0"
+
+    @property
+    def service(self) -> RAGService:
+        return self.server.service
+
+    def log_request(self, code='-', size='-'):
+        # Keep the console readable: log failed requests only
+        if isinstance(code, int) and code >= 400:
+            super().log_request(code, size)
+
+    def _read_json(self) -> Dict[str, any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise BadRequest("Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise BadRequest("Request body must be JSON")
+        if not isinstance(body, dict):
+            raise BadRequest("Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status: int, payload: Dict[str, any], headers: Dict[str, str] = None):
+        data = json.dumps(payload, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, status: int, text: str, content_type: str):
+        self._send_bytes(status, text.encode("utf-8"), content_type)
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, events: Iterator[Dict[str, any]]):
+        """Send events as JSON lines; the connection closes at the end."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(json.dumps(event, default=_json_default).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except queue.Empty:
+            self.wfile.write(json.dumps({'type': 'error', 'error': 'Request timed out'}).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            events.close()
+
+    def _handle(self, route: Callable[[], None]):
+        """Run a route, mapping errors to HTTP status codes."""
+        from llm_gateway import LLMGatewayError
+
+        try:
+            route()
+        except BadRequest as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+        except ServiceBusy as e:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}, {'Retry-After': '1'})
+        except FutureTimeoutError:
+            self._send_json(HTTPStatus.GATEWAY_TIMEOUT, {'error': 'Request timed out'})
+        except LLMGatewayError as e:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+
+    def do_GET(self):
+        routes = {
+            '/health': self._health,
+            '/stats': self._stats,
+            '/metrics': self._metrics,
+            '/traces': self._traces,
+            '/page': self._page
+        }
+        route = routes.get(self.path.split('?', 1)[0])
+        if route is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown endpoint {self.path}"})
+            return
+        self._handle(route)
+
+    def do_POST(self):
+        routes = {
+            '/retrieve': self._retrieve,
+            '/answer': self._answer,
+            '/answer/stream': self._answer_stream,
+            '/compare/stream': self._compare_stream,
+            '/synthesize': self._synthesize
+        }
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown endpoint {self.path}"})
+            return
+        self._handle(route)
+
+    def _health(self):
+        self._send_json(HTTPStatus.OK, self.service.health())
+
+    def _stats(self):
+        from rag import get_collection_stats
+        self._send_json(HTTPStatus.OK, get_collection_stats())
+
+    def _metrics(self):
+        self._send_text(HTTPStatus.OK, METRICS.to_prometheus(), "text/plain; version=0.0.4")
+
+    def _traces(self):
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            limit = int(query['limit'][0]) if 'limit' in query else None
+        except ValueError:
+            raise BadRequest("'limit' must be an integer")
+        self._send_text(HTTPStatus.OK, export_traces_jsonl(limit), "application/x-ndjson")
+
+    def _page(self):
+        from registry import get_page_renderer
+
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            page_num = int(query['page'][0])
+            dpi = int(query.get('dpi', [PAGE_RENDER_DPI])[0])
+        except (KeyError, ValueError):
+            raise BadRequest("'page' is required and 'page' and 'dpi' must be integers")
+        try:
+            image = self.service.call(
+                get_page_renderer().render,
+                query.get('source', [''])[0],
+                page_num,
+                dpi=dpi,
+                highlight=query.get('highlight', [''])[0]
+            )
+        except ValueError as e:
+            raise BadRequest(str(e))
+        except FileNotFoundError as e:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': str(e)})
+            return
+        self._send_bytes(HTTPStatus.OK, image, "image/png", {'Cache-Control': 'max-age=86400'})
+
+    def _retrieve(self):
+        body = self._read_json()
+        chunks = self.service.call(
+            self.service.pipeline.retrieve_chunks,
+            query=_require(body, 'query', str),
+            state=_require(body, 'state', str),
+            k=_top_k(body),
+            boost_time_keywords=_flag(body, 'boost_time_keywords', True),
+            merge_adjacent=_flag(body, 'merge_adjacent', MERGE_ADJACENT_CHUNKS),
+            route_sections=_flag(body, 'route_sections', SECTION_ROUTING)
+        )
+        self._send_json(HTTPStatus.OK, {'chunks': chunks})
+
+    def _answer(self):
+        body = self._read_json()
+        response = self.service.call(
+            self.service.pipeline.answer_question,
+            state=_require(body, 'state', str),
+            question=_require(body, 'question', str),
+            k=_top_k(body),
+            return_debug=bool(body.get('return_debug', False))
+        )
+        self._send_json(HTTPStatus.OK, response)
+
+    def _answer_stream(self):
+        body = self._read_json()
+        state = _require(body, 'state', str)
+        question = _require(body, 'question', str)
+        k = _top_k(body)
+        return_debug = bool(body.get('return_debug', False))
+
+        def generate():
+            return self.service.pipeline.stream_answer(
+                state=state, question=question, k=k, return_debug=return_debug
+            )
+
+        self._send_stream(self.service.stream(generate))
+
+    def _compare_stream(self):
+        body = self._read_json()
+        states = _require(body, 'states', list)
+        question = _require(body, 'question', str)
+        k = _top_k(body)
+        return_debug = bool(body.get('return_debug', False))
+
+        def generate():
+            for state, response in self.service.pipeline.iter_compare_states(
+                states=states, question=question, k=k, return_debug=return_debug
+            ):
+                yield {'type': 'answer', 'state': state, 'response': response}
+
+        self._send_stream(self.service.stream(generate))
+
+    def _synthesize(self):
+        body = self._read_json()
+        synthesis = self.service.call(
+            self.service.pipeline.synthesize_comparison,
+            _require(body, 'question', str),
+            _require(body, 'answers', dict)
+        )
+        self._send_json(HTTPStatus.OK, {'synthesis': synthesis})
+
+
+def create_server(host: str, port: int, service: RAGService) -> ThreadingHTTPServer:
+    """Create the HTTP server for a service."""
+    server = ThreadingHTTPServer((host, port), RAGRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve retrieval and answers over HTTP")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Pipeline calls running at once")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Calls waiting for a worker before 503")
+    parser.add_argument("--backend", default=LLM_BACKEND, help="LLM backend")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the warm-up query before serving")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Load the pipeline once and serve it."""
+    args = parse_args(argv)
+
+    from registry import get_pipeline
+
+    pipeline = get_pipeline(args.backend)
+    if not args.no_warmup:
+        pipeline.warm_up()
+    service = RAGService(pipeline, workers=args.workers, queue_size=args.queue_size)
+    server = create_server(args.host, args.port, service)
+
+    print(f"✓ Serving on http://{args.host}:{args.port} ({args.workers} workers, queue {args.queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
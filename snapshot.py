@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Portable index snapshots: one versioned, checksummed file per index build.
+
+A snapshot holds everything a node needs to serve without the PDFs or an
+ingest run:
+- the chunk collection (or every state shard) and the section-routing
+  collection: IDs, metadata and float32 vectors
+- the chunk-text store, the chunk hierarchy, the compact vector index and
+  the embedded query intent prototypes
+- the index manifest
+
+Importing writes the files back into CHROMA_DIR and loads the vectors into
+Chroma. Nothing is re-embedded. The vectors are memory-mapped straight from
+their blobs and added in batches, but Chroma still builds its own index from
+them, so import time grows with the number of vectors (it is recorded in the
+manifest).
+
+File layout:
+    magic (8 bytes) | header length (8 bytes, little-endian) | header JSON
+    blobs, each starting on a BLOB_ALIGN boundary
+
+The header lists every blob's offset, length and SHA-256, and the dtype and
+shape of array blobs. Blobs are stored raw and page-aligned, so array blobs
+are memory-mapped at their offsets (Snapshot.array) and other blobs are
+viewed in place. The snapshot ID is a digest of the
+blob checksums: two nodes serve the same index exactly when their snapshot
+IDs match.
+
+Usage:
+    python snapshot.py export
+    python snapshot.py export data/snapshots/prod.ragsnap
+    python snapshot.py info data/snapshots/prod.ragsnap
+    python snapshot.py import data/snapshots/prod.ragsnap
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from config import (
+    CHROMA_DIR,
+    CHUNK_HIERARCHY_PATH,
+    COLLECTION_NAME,
+    COMPACT_INDEX_DIR,
+    DOC_STORE_PATH,
+    EMBED_MODEL,
+    INDEX_MANIFEST_PATH,
+    INTENT_PROTOTYPES_PATH,
+    SECTION_COLLECTION_NAME,
+    SNAPSHOT_DIR
+)
+from index_manifest import read_manifest, write_manifest
+from state_registry import shard_collection_names
+
+
+SNAPSHOT_FORMAT = 1
+MAGIC = b"RAGSNAP\x01"
+BLOB_ALIGN = 4096  # page size, so array blobs can be memory-mapped directly
+COPY_BLOCK = 1 << 20
+INSERT_BATCH_SIZE = 100
+
+BlobSource = Union[bytes, Path]
+
+
+class SnapshotError(Exception):
+    """Raised for unreadable, corrupt or incompatible snapshots."""
+
+
+def _align(offset: int) -> int:
+    return -(-offset // BLOB_ALIGN) * BLOB_ALIGN
+
+
+def _index_files() -> List[Path]:
+    """Get the index files kept outside Chroma that exist now."""
+    files = [DOC_STORE_PATH, DOC_STORE_PATH.with_suffix(".idx.json"), CHUNK_HIERARCHY_PATH, INTENT_PROTOTYPES_PATH]
+    if COMPACT_INDEX_DIR.is_dir():
+        files += sorted(COMPACT_INDEX_DIR.rglob("*"))  # one subdirectory per state shard
+    return [path for path in files if path.is_file()]
+
+
+def _collection_names(manifest: Dict[str, any]) -> Dict[str, str]:
+    """Get an index's Chroma collections, keyed by their blob name prefix."""
+    if manifest.get('sharding') == "state":
+        names = {f"chunks/{state}": entry['collection'] for state, entry in manifest['states'].items()}
+    else:
+        names = {'chunks': COLLECTION_NAME}
+    names['sections'] = SECTION_COLLECTION_NAME
+    return names
+
+
+def _json_bytes(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _read_collection(collection) -> Tuple[Dict[str, BlobSource], Dict[str, any]]:
+    """Get a collection's blobs and array descriptions."""
+    results = collection.get(include=['metadatas', 'documents', 'embeddings'])
+    embeddings = np.ascontiguousarray(np.asarray(results['embeddings'], dtype=np.float32))
+    blobs = {
+        'ids': _json_bytes(list(results['ids'])),
+        'metadatas': _json_bytes(list(results['metadatas'])),
+        'embeddings': embeddings.tobytes()
+    }
+    # Indexes with a chunk-text store keep no documents in Chroma
+    documents = list(results.get('documents') or [])
+    if any(documents):
+        blobs['documents'] = _json_bytes(documents)
+    return blobs, {'embeddings': {'dtype': "float32", 'shape': list(embeddings.shape)}}
+
+
+def _blob_digest(source: BlobSource) -> Tuple[int, str]:
+    """Get the length and SHA-256 of a blob."""
+    sha = hashlib.sha256()
+    if isinstance(source, Path):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(COPY_BLOCK), b""):
+                sha.update(block)
+        return source.stat().st_size, sha.hexdigest()
+    sha.update(source)
+    return len(source), sha.hexdigest()
+
+
+def snapshot_id(blobs: Dict[str, Dict[str, any]]) -> str:
+    """
+    Fingerprint a snapshot's contents.
+
+    Args:
+        blobs: Blob table from a snapshot header
+
+    Returns:
+        Short hex digest of the blob names and checksums
+    """
+    digest = hashlib.sha256()
+    for name in sorted(blobs):
+        digest.update(f"{name}={blobs[name]['sha256']}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def export_snapshot(path: Path, chroma_client=None) -> Dict[str, any]:
+    """
+    Write the current index to a snapshot file, atomically.
+
+    Args:
+        path: Snapshot file to write
+        chroma_client: Chroma client (default: the shared client)
+
+    Returns:
+        The snapshot header
+
+    Raises:
+        SnapshotError: If there is no index manifest (run ingest.py first)
+    """
+    manifest = read_manifest()
+    if manifest is None:
+        raise SnapshotError(f"No index manifest at {INDEX_MANIFEST_PATH}; run 'python ingest.py' first")
+
+    if chroma_client is None:
+        from registry import get_chroma_client
+        chroma_client = get_chroma_client()
+
+    sources: Dict[str, BlobSource] = {}
+    arrays: Dict[str, Dict[str, any]] = {}
+    collections = {}
+    for key, name in _collection_names(manifest).items():
+        try:
+            collection = chroma_client.get_collection(name=name)
+        except Exception:
+            # Only the section routing collection is optional
+            if key != 'sections':
+                raise
+            continue
+        blobs, collection_arrays = _read_collection(collection)
+        sources.update({f"{key}/{blob}": data for blob, data in blobs.items()})
+        arrays.update({f"{key}/{blob}": info for blob, info in collection_arrays.items()})
+        collections[key] = {'name': name, 'metadata': collection.metadata or {}, 'count': collection.count()}
+
+    for file_path in _index_files():
+        sources[f"files/{file_path.relative_to(CHROMA_DIR).as_posix()}"] = file_path
+
+    blobs = {}
+    for name, source in sources.items():
+        length, sha256 = _blob_digest(source)
+        blobs[name] = {'length': length, 'sha256': sha256, **arrays.get(name, {})}
+
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'snapshot_id': snapshot_id(blobs),
+        'index_version': manifest['index_version'],
+        'embed_model': manifest['embed_model'],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'collections': collections,
+        'manifest': {key: value for key, value in manifest.items() if key != 'snapshot'},
+        'blobs': blobs
+    }
+
+    # Lay the blobs out after the header; offsets are part of the header, so
+    # grow the header region until it holds its own encoding
+    data_start = BLOB_ALIGN
+    while True:
+        offset = data_start
+        for name in sources:
+            blobs[name]['offset'] = offset
+            offset = _align(offset + blobs[name]['length'])
+        encoded = _json_bytes(header)
+        if len(MAGIC) + 8 + len(encoded) <= data_start:
+            break
+        data_start = _align(len(MAGIC) + 8 + len(encoded))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+        for name, source in sources.items():
+            f.seek(blobs[name]['offset'])
+            if isinstance(source, Path):
+                with open(source, "rb") as src:
+                    for block in iter(lambda: src.read(COPY_BLOCK), b""):
+                        f.write(block)
+            else:
+                f.write(source)
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Snapshot file
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+            SnapshotError: If it is not a snapshot or has an unknown format
+        """
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            prefix = self._file.read(len(MAGIC) + 8)
+            if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+                raise SnapshotError(f"{self.path} is not an index snapshot")
+            (header_length,) = struct.unpack("<Q", prefix[len(MAGIC):])
+            try:
+                self.header = json.loads(self._file.read(header_length).decode("utf-8"))
+            except ValueError:
+                raise SnapshotError(f"{self.path} has a corrupt header")
+            if self.header.get('format') != SNAPSHOT_FORMAT:
+                raise SnapshotError(f"{self.path} has unknown snapshot format {self.header.get('format')}")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+    @property
+    def blobs(self) -> Dict[str, Dict[str, any]]:
+        return self.header['blobs']
+
+    def view(self, name: str) -> memoryview:
+        """
+        Get a blob's bytes without copying them.
+
+        Args:
+            name: Blob name (e.g. "chunks/embeddings")
+
+        Returns:
+            Memory view into the mapped file
+
+        Raises:
+            KeyError: If the snapshot has no such blob
+        """
+        blob = self.blobs[name]
+        return memoryview(self._mmap)[blob['offset']:blob['offset'] + blob['length']]
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Get an array blob as a read-only memory map of its place in the file.
+
+        Blobs start on BLOB_ALIGN (page) boundaries, so the map starts
+        exactly at the blob, and only the rows that are read are paged in.
+
+        Args:
+            name: Blob name (e.g. "chunks/embeddings")
+
+        Returns:
+            Read-only array of the blob's dtype and shape
+        """
+        blob = self.blobs[name]
+        if not blob['length']:
+            return np.empty(blob['shape'], dtype=blob['dtype'])  # an empty map is not allowed
+        return np.memmap(
+            self.path, dtype=blob['dtype'], mode="r", offset=blob['offset'], shape=tuple(blob['shape'])
+        )
+
+    def json(self, name: str):
+        """Decode a JSON blob."""
+        return json.loads(bytes(self.view(name)).decode("utf-8"))
+
+    def verify(self) -> List[str]:
+        """
+        Check every blob against its checksum.
+
+        Returns:
+            Names of blobs that are truncated or do not match (empty if intact)
+        """
+        bad = []
+        for name, blob in self.blobs.items():
+            if blob['offset'] + blob['length'] > len(self._mmap):
+                bad.append(name)
+                continue
+            sha = hashlib.sha256()
+            view = self.view(name)
+            for start in range(0, len(view), COPY_BLOCK):
+                sha.update(view[start:start + COPY_BLOCK])
+            if sha.hexdigest() != blob['sha256']:
+                bad.append(name)
+        if snapshot_id(self.blobs) != self.header['snapshot_id']:
+            bad.append("header")
+        return bad
+
+    def close(self):
+        """Release the file handle, and the memory map unless arrays still view it."""
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # unmapped once the last array or view is garbage-collected
+        self._file.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _write_file(path: Path, view: memoryview):
+    """Write a blob to a file atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(view), COPY_BLOCK):
+            f.write(view[start:start + COPY_BLOCK])
+    os.replace(tmp_path, path)
+
+
+def _validate(snapshot: Snapshot) -> Dict[str, Path]:
+    """
+    Check that a snapshot's header and blob table describe an importable index.
+
+    Args:
+        snapshot: Open snapshot
+
+    Returns:
+        Mapping of file blob name to the path it is written to
+
+    Raises:
+        SnapshotError: If the header is incomplete, a blob lies outside the
+            file or has the wrong size, a collection's parts disagree, or a
+            file would be written outside the index directory
+    """
+    header = snapshot.header
+    path = snapshot.path
+    missing = [key for key in ('snapshot_id', 'embed_model', 'created_at', 'manifest', 'collections', 'blobs')
+               if key not in header]
+    if missing:
+        raise SnapshotError(f"{path} header is missing {', '.join(missing)}")
+
+    size = len(snapshot._mmap)
+    for name, blob in snapshot.blobs.items():
+        if not isinstance(blob, dict) or not {'offset', 'length', 'sha256'} <= blob.keys():
+            raise SnapshotError(f"{path} has a malformed blob entry: {name}")
+        if blob['offset'] < 0 or blob['offset'] + blob['length'] > size:
+            raise SnapshotError(f"{path} is truncated: {name} ends past the end of the file")
+        if 'dtype' in blob:
+            expected = int(np.prod(blob['shape'])) * np.dtype(blob['dtype']).itemsize
+            if expected != blob['length']:
+                raise SnapshotError(f"{path} has a malformed array: {name}")
+
+    for key in header['collections']:
+        for part in ('ids', 'metadatas', 'embeddings'):
+            if f"{key}/{part}" not in snapshot.blobs:
+                raise SnapshotError(f"{path} is missing {key}/{part}")
+        try:
+            ids = snapshot.json(f"{key}/ids")
+            metadatas = snapshot.json(f"{key}/metadatas")
+        except ValueError:
+            raise SnapshotError(f"{path} has corrupt IDs or metadata in {key}")
+        if not len(ids) == len(metadatas) == snapshot.blobs[f"{key}/embeddings"]['shape'][0]:
+            raise SnapshotError(f"{path} has mismatched IDs, metadata and vectors in {key}")
+
+    index_dir = CHROMA_DIR.resolve()
+    targets = {}
+    for name in snapshot.blobs:
+        prefix = name.split("/", 1)[0]
+        if prefix == "files":
+            target = (CHROMA_DIR / name[len("files/"):]).resolve()
+            if index_dir not in target.parents:
+                raise SnapshotError(f"{path} has a file outside the index directory: {name}")
+            targets[name] = target
+        elif prefix not in header['collections']:
+            raise SnapshotError(f"{path} has an unknown blob: {name}")
+    return targets
+
+
+def import_snapshot(
+    path: Path,
+    chroma_client=None,
+    verify: bool = True,
+    force: bool = False
+) -> Dict[str, any]:
+    """
+    Replace the current index with the contents of a snapshot.
+
+    The whole snapshot is validated before the current index is touched, so
+    a bad snapshot leaves it in place. The manifest is written last, so an
+    interrupted import leaves no manifest rather than one describing a
+    partial index.
+
+    The vectors are added to Chroma in batches, and Chroma builds its HNSW
+    index from them, so import time grows with the number of vectors. It is
+    recorded in the manifest ('snapshot' -> 'import_seconds').
+
+    Args:
+        path: Snapshot file
+        chroma_client: Chroma client (default: the shared client)
+        verify: Check blob checksums before changing anything
+        force: Import even if the snapshot was embedded with a different
+            model than EMBED_MODEL (queries would then be embedded with a
+            model the index was not built with)
+
+    Returns:
+        The written manifest
+
+    Raises:
+        SnapshotError: If the snapshot is corrupt or malformed, or was built
+            with another embedding model
+    """
+    if chroma_client is None:
+        from registry import get_chroma_client
+        chroma_client = get_chroma_client()
+
+    from compact_vectors import remove_compact_index
+    from doc_store import remove_store
+
+    start = time.perf_counter()
+    with Snapshot(path) as snapshot:
+        header = snapshot.header
+        targets = _validate(snapshot)
+        if verify:
+            bad = snapshot.verify()
+            if bad:
+                raise SnapshotError(f"{path} failed verification: {', '.join(bad)}")
+        if header['embed_model'] != EMBED_MODEL and not force:
+            raise SnapshotError(
+                f"{path} was embedded with {header['embed_model']}, but EMBED_MODEL is {EMBED_MODEL}"
+            )
+
+        INDEX_MANIFEST_PATH.unlink(missing_ok=True)
+        for name in [COLLECTION_NAME, SECTION_COLLECTION_NAME] + shard_collection_names(chroma_client):
+            try:
+                chroma_client.delete_collection(name=name)
+            except Exception:
+                pass
+        remove_store(DOC_STORE_PATH)
+        CHUNK_HIERARCHY_PATH.unlink(missing_ok=True)
+        remove_compact_index(COMPACT_INDEX_DIR)
+
+        for key, info in header['collections'].items():
+            collection = chroma_client.create_collection(name=info['name'], metadata=info['metadata'] or None)
+            ids = snapshot.json(f"{key}/ids")
+            metadatas = snapshot.json(f"{key}/metadatas")
+            embeddings = snapshot.array(f"{key}/embeddings")
+            documents = snapshot.json(f"{key}/documents") if f"{key}/documents" in snapshot.blobs else None
+            for batch_start in range(0, len(ids), INSERT_BATCH_SIZE):
+                batch_end = batch_start + INSERT_BATCH_SIZE
+                batch = {
+                    'ids': ids[batch_start:batch_end],
+                    'metadatas': metadatas[batch_start:batch_end],
+                    'embeddings': embeddings[batch_start:batch_end].tolist()
+                }
+                if documents is not None:
+                    batch['documents'] = documents[batch_start:batch_end]
+                collection.add(**batch)
+
+        for name, target in targets.items():
+            _write_file(target, snapshot.view(name))
+
+        manifest = dict(header['manifest'])
+        manifest['snapshot'] = {
+            'id': header['snapshot_id'],
+            'file': Path(path).name,
+            'created_at': header['created_at'],
+            'imported_at': datetime.now(timezone.utc).isoformat(),
+            'import_seconds': round(time.perf_counter() - start, 3)
+        }
+        write_manifest(manifest)
+    return manifest
+
+
+def describe(header: Dict[str, any]) -> str:
+    """Summarize a snapshot header for printing."""
+    lines = [
+        f"Snapshot {header['snapshot_id']} (index version {header['index_version']}, created {header['created_at']})",
+        f"Embedding model: {header['embed_model']}"
+    ]
+    for key, info in header['collections'].items():
+        lines.append(f"  {key}: {info['count']} vectors in '{info['name']}'")
+    for name, blob in header['blobs'].items():
+        lines.append(f"  {name}: {blob['length'] / 1e6:.1f} MB")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import a portable index snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the current index to a snapshot file")
+    export_parser.add_argument("path", nargs="?", type=Path, help="Default: data/snapshots/<index version>.ragsnap")
+
+    info_parser = commands.add_parser("info", help="Show and verify a snapshot")
+    info_parser.add_argument("path", type=Path)
+
+    import_parser = commands.add_parser("import", help="Replace the current index with a snapshot")
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--no-verify", action="store_true", help="Skip checksum verification")
+    import_parser.add_argument("--force", action="store_true", help="Import even if EMBED_MODEL differs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the snapshot command line."""
+    args = parse_args(argv)
+
+    try:
+        if args.command == "export":
+            path = args.path
+            if path is None:
+                manifest = read_manifest()
+                version = manifest['index_version'] if manifest else "index"
+                path = SNAPSHOT_DIR / f"{version}.ragsnap"
+            header = export_snapshot(path)
+            print(f"✓ Wrote {path} ({path.stat().st_size / 1e6:.1f} MB)")
+            print(describe(header))
+
+        elif args.command == "info":
+            with Snapshot(args.path) as snapshot:
+                print(describe(snapshot.header))
+                bad = snapshot.verify()
+            if bad:
+                print(f"❌ Checksum mismatch: {', '.join(bad)}")
+                sys.exit(1)
+            print("✓ All checksums match")
+
+        else:
+            manifest = import_snapshot(args.path, verify=not args.no_verify, force=args.force)
+            print(
+                f"✓ Imported snapshot {manifest['snapshot']['id']} "
+                f"(index version {manifest['index_version']}, {manifest['total_chunks']} chunks) "
+                f"in {manifest['snapshot']['import_seconds']:.1f}s"
+            )
+
+    except (OSError, SnapshotError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Registry of the states and agencies (jurisdictions) an index covers.
+
+A PDF belongs to the jurisdiction named by its file name prefix
+({CODE}_*.pdf, e.g. TX_TxDOT_Maintenance_Manual.pdf or
+FHWA_Pavement_Preservation.pdf). Known codes are the 50 states, DC, Puerto
+Rico and FHWA; other agencies can be added in PDF_DIR/jurisdictions.json
+({"CODE": "Name"}). Ingestion records the jurisdictions it found in the index
+manifest, which is then the registry every reader uses.
+
+With state sharding, every jurisdiction has its own Chroma collection and
+compact vector index. A query only touches the shard of its state, and shards
+are opened on first use, so query cost and resident memory depend on the
+states actually queried rather than on how many are registered.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import COLLECTION_NAME, COMPACT_INDEX_DIR, JURISDICTIONS_FILE, PDF_DIR
+
+
+JURISDICTIONS = {
+    "AL": "Alabama",
+    "AK": "Alaska",
+    "AZ": "Arizona",
+    "AR": "Arkansas",
+    "CA": "California",
+    "CO": "Colorado",
+    "CT": "Connecticut",
+    "DE": "Delaware",
+    "DC": "District of Columbia",
+    "FL": "Florida",
+    "GA": "Georgia",
+    "HI": "Hawaii",
+    "ID": "Idaho",
+    "IL": "Illinois",
+    "IN": "Indiana",
+    "IA": "Iowa",
+    "KS": "Kansas",
+    "KY": "Kentucky",
+    "LA": "Louisiana",
+    "ME": "Maine",
+    "MD": "Maryland",
+    "MA": "Massachusetts",
+    "MI": "Michigan",
+    "MN": "Minnesota",
+    "MS": "Mississippi",
+    "MO": "Missouri",
+    "MT": "Montana",
+    "NE": "Nebraska",
+    "NV": "Nevada",
+    "NH": "New Hampshire",
+    "NJ": "New Jersey",
+    "NM": "New Mexico",
+    "NY": "New York",
+    "NC": "North Carolina",
+    "ND": "North Dakota",
+    "OH": "Ohio",
+    "OK": "Oklahoma",
+    "OR": "Oregon",
+    "PA": "Pennsylvania",
+    "PR": "Puerto Rico",
+    "RI": "Rhode Island",
+    "SC": "South Carolina",
+    "SD": "South Dakota",
+    "TN": "Tennessee",
+    "TX": "Texas",
+    "UT": "Utah",
+    "VT": "Vermont",
+    "VA": "Virginia",
+    "WA": "Washington",
+    "WV": "West Virginia",
+    "WI": "Wisconsin",
+    "WY": "Wyoming",
+    "FHWA": "Federal Highway Administration"
+}
+
+_CODE_PATTERN = re.compile(r"^[A-Z][A-Z0-9]{1,9}$")  # also keeps shard collection names valid
+
+
+def known_jurisdictions(path: Path = JURISDICTIONS_FILE) -> Dict[str, str]:
+    """
+    Get every jurisdiction code a PDF may be filed under.
+
+    Args:
+        path: Optional JSON file of extra {"CODE": "Name"} entries
+
+    Returns:
+        Mapping of code to name
+
+    Raises:
+        ValueError: If the extra file is not valid JSON or has an invalid code
+    """
+    names = dict(JURISDICTIONS)
+    if path.is_file():
+        extra = json.loads(path.read_text(encoding="utf-8"))
+        for code, name in extra.items():
+            if not _CODE_PATTERN.match(code):
+                raise ValueError(f"Invalid jurisdiction code in {path.name}: {code!r}")
+            names[code] = name
+    return names
+
+
+def state_from_filename(filename: str, known: Optional[Dict[str, str]] = None) -> str:
+    """
+    Get the jurisdiction code of a PDF from its file name prefix.
+
+    Args:
+        filename: PDF file name ({CODE}_*.pdf)
+        known: Known jurisdictions (default: known_jurisdictions())
+
+    Returns:
+        Jurisdiction code
+
+    Raises:
+        ValueError: If the prefix is not a known jurisdiction code
+    """
+    known = known if known is not None else known_jurisdictions()
+    code = filename.split('_')[0].upper()
+    if code in known:
+        return code
+    raise ValueError(f"Cannot determine state from filename: {filename}")
+
+
+def discover_states(pdf_dir: Path = PDF_DIR) -> Dict[str, str]:
+    """
+    Find the jurisdictions that have PDFs in a directory.
+
+    Files without a known prefix are skipped (ingestion reports them).
+
+    Args:
+        pdf_dir: PDF directory
+
+    Returns:
+        Mapping of code to name, sorted by code
+    """
+    known = known_jurisdictions()
+    states = {}
+    for pdf_path in pdf_dir.glob("*.pdf"):
+        try:
+            code = state_from_filename(pdf_path.name, known)
+        except ValueError:
+            continue
+        states[code] = known[code]
+    return dict(sorted(states.items()))
+
+
+def registered_states(manifest: Optional[Dict[str, any]]) -> Dict[str, str]:
+    """
+    Get the jurisdictions an index covers.
+
+    Args:
+        manifest: Index manifest (None for an index without one, whose
+            jurisdictions are discovered from PDF_DIR instead)
+
+    Returns:
+        Mapping of code to name, sorted by code
+    """
+    if manifest is None:
+        return discover_states()
+    return {
+        code: entry.get('name') or JURISDICTIONS.get(code, code)
+        for code, entry in sorted(manifest['states'].items())
+    }
+
+
+def state_collection_name(manifest: Optional[Dict[str, any]], state: str) -> str:
+    """Get the name of the collection holding a state's chunks."""
+    if manifest is not None and manifest.get('sharding') == "state":
+        return shard_collection_name(state)
+    return COLLECTION_NAME
+
+
+def shard_collection_name(state: str) -> str:
+    """Get the name of a state's Chroma collection in a sharded index."""
+    return f"{COLLECTION_NAME}_state_{state.lower()}"
+
+
+def shard_compact_dir(state: str) -> Path:
+    """Get the directory of a state's compact vector index in a sharded index."""
+    return COMPACT_INDEX_DIR / state
+
+
+def shard_collection_names(chroma_client) -> List[str]:
+    """Get the names of every state shard collection in a Chroma database."""
+    prefix = shard_collection_name("")
+    # Chroma returns collection objects before 0.6 and names since
+    names = [getattr(collection, 'name', collection) for collection in chroma_client.list_collections()]
+    return sorted(name for name in names if name.startswith(prefix))
@@ -0,0 +1,135 @@
+"""Export -> import round trip of an index snapshot (snapshot.py)."""
+import numpy as np
+import pytest
+
+import index_manifest
+import snapshot
+from config import COLLECTION_NAME, EMBED_MODEL
+
+
+class FakeCollection:
+    """The part of a Chroma collection that snapshot.py uses."""
+
+    def __init__(self, name, metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.ids, self.metadatas, self.documents, self.embeddings = [], [], [], []
+
+    def add(self, ids, metadatas, embeddings, documents=None):
+        self.ids += list(ids)
+        self.metadatas += list(metadatas)
+        self.embeddings += [list(vector) for vector in embeddings]
+        self.documents += list(documents) if documents is not None else [None] * len(ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include=None):
+        return {
+            'ids': list(self.ids),
+            'metadatas': list(self.metadatas),
+            'documents': list(self.documents),
+            'embeddings': np.asarray(self.embeddings, dtype=np.float32)
+        }
+
+
+class FakeClient:
+    """The part of a Chroma client that snapshot.py uses."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def create_collection(self, name, metadata=None):
+        self.collections[name] = FakeCollection(name, metadata)
+        return self.collections[name]
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+    def list_collections(self):
+        return list(self.collections)
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """Point every index path snapshot.py uses into a temporary directory."""
+    chroma_dir = tmp_path / "chroma"
+    chroma_dir.mkdir()
+    manifest_path = chroma_dir / "index_manifest.json"
+    monkeypatch.setattr(snapshot, "CHROMA_DIR", chroma_dir)
+    monkeypatch.setattr(snapshot, "INDEX_MANIFEST_PATH", manifest_path)
+    monkeypatch.setattr(snapshot, "DOC_STORE_PATH", chroma_dir / "chunk_texts.bin")
+    monkeypatch.setattr(snapshot, "CHUNK_HIERARCHY_PATH", chroma_dir / "chunk_hierarchy.json")
+    monkeypatch.setattr(snapshot, "COMPACT_INDEX_DIR", chroma_dir / "compact_vectors")
+    monkeypatch.setattr(snapshot, "INTENT_PROTOTYPES_PATH", chroma_dir / "intent_prototypes.npz")
+    monkeypatch.setattr(snapshot, "read_manifest", lambda: index_manifest.read_manifest(manifest_path))
+    monkeypatch.setattr(snapshot, "write_manifest", lambda manifest: index_manifest.write_manifest(manifest, manifest_path))
+    return chroma_dir
+
+
+def manifest_for(total_chunks):
+    return {
+        'format': index_manifest.MANIFEST_FORMAT,
+        'index_version': "test",
+        'embed_model': EMBED_MODEL,
+        'total_chunks': total_chunks,
+        'states': {}
+    }
+
+
+def test_round_trip(index_dir, tmp_path):
+    # More rows than one insert batch, so the batch loop runs several times
+    rng = np.random.default_rng(0)
+    count = snapshot.INSERT_BATCH_SIZE * 3 + 7
+    ids = [f"TX:manual.pdf:{i}" for i in range(count)]
+    metadatas = [{'state': "TX", 'page_start': i, 'page_end': i, 'has_time_keywords': i % 2 == 0} for i in range(count)]
+    embeddings = rng.random((count, 16), dtype=np.float32)
+
+    source = FakeClient()
+    source.create_collection(COLLECTION_NAME, {'hnsw:space': "l2"}).add(ids, metadatas, embeddings)
+    (index_dir / "chunk_hierarchy.json").write_text('{"format": 1, "parents": {}}')
+    snapshot.write_manifest(manifest_for(count))
+
+    path = tmp_path / "index.ragsnap"
+    header = snapshot.export_snapshot(path, source)
+    for blob in header['blobs'].values():
+        assert blob['offset'] % snapshot.BLOB_ALIGN == 0
+    with snapshot.Snapshot(path) as opened:
+        vectors = opened.array("chunks/embeddings")
+        assert isinstance(vectors, np.memmap)
+        assert np.array_equal(vectors, embeddings)
+        del vectors
+
+    target = FakeClient()
+    manifest = snapshot.import_snapshot(path, target)
+
+    imported = target.get_collection(COLLECTION_NAME)
+    assert imported.ids == ids
+    assert imported.metadatas == metadatas
+    assert np.array_equal(np.asarray(imported.embeddings, dtype=np.float32), embeddings)
+    assert imported.metadata == {'hnsw:space': "l2"}
+    assert (index_dir / "chunk_hierarchy.json").read_text() == '{"format": 1, "parents": {}}'
+
+    assert manifest['snapshot']['id'] == header['snapshot_id']
+    assert 0 <= manifest['snapshot']['import_seconds'] < 60
+    assert snapshot.read_manifest()['snapshot'] == manifest['snapshot']
+
+
+def test_bad_snapshot_keeps_index(index_dir, tmp_path):
+    source = FakeClient()
+    source.create_collection(COLLECTION_NAME).add(["a"], [{'state': "TX"}], [[0.0, 1.0]])
+    snapshot.write_manifest(manifest_for(1))
+    path = tmp_path / "index.ragsnap"
+    header = snapshot.export_snapshot(path, source)
+
+    data = bytearray(path.read_bytes())
+    data[header['blobs']['chunks/embeddings']['offset']] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.import_snapshot(path, source)
+    assert source.get_collection(COLLECTION_NAME).ids == ["a"]
+    assert snapshot.read_manifest() is not None
@@ -0,0 +1,419 @@
+"""
+Lightweight built-in tracing and metrics for the RAG pipeline.
+
+- Traces: one per request, with nested timed spans for every stage. The
+  active trace lives in a context variable, so deep helpers can add spans
+  without threading a trace argument through every call.
+- Metrics: process-wide counters and histograms, exportable in Prometheus
+  text format and as JSON.
+- Export: finished traces are kept in a bounded in-memory history and can be
+  appended to a JSON lines file (config.TRACE_EXPORT_PATH).
+"""
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import TRACE_EXPORT_PATH, TRACE_HISTORY_SIZE
+
+
+# Default histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CHARS_BUCKETS = (1000, 5000, 10000, 25000, 50000, 100000, 200000)
+TOKENS_BUCKETS = (100, 250, 500, 1000, 2000, 5000, 10000, 25000, 50000)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'type': 'counter',
+            'values': [{'labels': dict(key), 'value': value} for key, value in self.samples().items()]
+        }
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            else:
+                series['counts'][-1] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def samples(self) -> Dict[Tuple, Dict[str, any]]:
+        with self._lock:
+            return {key: {**series, 'counts': list(series['counts'])} for key, series in self._series.items()}
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'type': 'histogram',
+            'buckets': list(self.buckets),
+            'values': [
+                {'labels': dict(key), 'counts': series['counts'], 'sum': series['sum'], 'count': series['count']}
+                for key, series in self.samples().items()
+            ]
+        }
+
+
+class MetricsRegistry:
+    """Process-wide registry of counters, histograms and gauge collectors."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        """Get or create a counter."""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str = "", buckets: Tuple[float, ...] = SECONDS_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets)
+            return self._metrics[name]
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """
+        Register a callback that returns gauge values at export time.
+
+        Registering the same callback again (e.g. the same bound method) has
+        no effect. Owners should unregister it when they shut down.
+
+        Args:
+            collector: Callable returning a mapping of metric name to numeric value
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Dict[str, float]]):
+        """Stop exporting a gauge collector (no effect if it is not registered)."""
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for collector in list(self._collectors):
+            try:
+                gauges.update(collector())
+            except Exception:
+                continue
+        return gauges
+
+    def to_prometheus(self) -> str:
+        """
+        Export all metrics in Prometheus text exposition format.
+
+        Returns:
+            Prometheus text
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.to_prometheus())
+        for name, value in sorted(self._gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, any]:
+        """
+        Export all metrics as a JSON-serializable dictionary.
+
+        Returns:
+            Mapping of metric name to its type and values
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        exported = {name: metric.to_dict() for name, metric in metrics.items()}
+        for name, value in self._gauges().items():
+            exported[name] = {'type': 'gauge', 'values': [{'labels': {}, 'value': value}]}
+        return exported
+
+
+METRICS = MetricsRegistry()
+
+REQUESTS = METRICS.counter("rag_requests_total", "Questions answered, by entry point and outcome")
+STAGE_SECONDS = METRICS.histogram("rag_stage_seconds", "Time spent per pipeline stage")
+EMBED_CACHE_HITS = METRICS.counter("rag_query_embedding_cache_hits_total", "Query embeddings served from cache")
+EMBED_CACHE_MISSES = METRICS.counter("rag_query_embedding_cache_misses_total", "Query embeddings computed")
+QUERY_INTENTS = METRICS.counter("rag_query_intents_total", "Retrieval queries by classified intent")
+PAGE_CACHE_HITS = METRICS.counter("rag_page_cache_hits_total", "Cited page images served from the disk cache")
+PAGE_CACHE_MISSES = METRICS.counter("rag_page_cache_misses_total", "Cited page images rendered")
+CHUNKS_RETRIEVED = METRICS.histogram("rag_chunks_retrieved", "Chunks passed to the LLM per question", SIZE_BUCKETS)
+PROMPT_CHARS = METRICS.histogram("rag_prompt_chars", "Characters in the LLM prompt", CHARS_BUCKETS)
+LLM_TOKENS = METRICS.histogram("rag_llm_tokens", "LLM tokens per call (usage metadata, or estimated)", TOKENS_BUCKETS)
+
+
+class Span:
+    """A timed stage within a trace."""
+
+    def __init__(self, name: str, parent: Optional[str], start: float, attributes: Dict[str, any]):
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Attach attributes to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self, trace_start: float) -> Dict[str, any]:
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start_ms': (self.start - trace_start) * 1000,
+            'duration_ms': (self.duration or 0.0) * 1000,
+            'attributes': self.attributes
+        }
+
+
+class Trace:
+    """All spans recorded for one request."""
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.spans: List[Span] = []
+        self._stack: List[Span] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Time a stage of this trace.
+
+        Args:
+            name: Stage name
+            **attributes: Attributes to attach
+
+        Yields:
+            The span, so callers can attach more attributes
+        """
+        parent = self._stack[-1].name if self._stack else None
+        current = Span(name, parent, time.perf_counter(), dict(attributes))
+        self.spans.append(current)
+        self._stack.append(current)
+        try:
+            yield current
+        finally:
+            current.duration = time.perf_counter() - current.start
+            self._stack.pop()
+            if parent is None:
+                STAGE_SECONDS.observe(current.duration, stage=name)
+
+    def finish(self, error: Optional[BaseException] = None):
+        """
+        Close the trace, record request metrics and export it.
+
+        Args:
+            error: Exception that ended the request, if any
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {str(error)}"
+        STAGE_SECONDS.observe(self.duration, stage="total")
+        REQUESTS.inc(entry_point=self.name, outcome="error" if error else "ok")
+        _record_trace(self)
+
+    def stage_timings(self) -> Dict[str, float]:
+        """
+        Get seconds spent per top-level stage.
+
+        Returns:
+            Mapping of stage name to seconds, plus 'total'
+        """
+        timings = {}
+        for span in self.spans:
+            if span.parent is None and span.duration is not None:
+                timings[span.name] = timings.get(span.name, 0.0) + span.duration
+        timings['total'] = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return timings
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': (self.duration or 0.0) * 1000,
+            'error': self.error,
+            'attributes': self.attributes,
+            'spans': [span.to_dict(self.start) for span in self.spans]
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_current_trace", default=None)
+_history = deque(maxlen=TRACE_HISTORY_SIZE)
+_export_lock = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace active in this context, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def activate(trace: Trace) -> Iterator[Trace]:
+    """Make a trace the active one for the enclosed block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Trace]:
+    """
+    Create, activate and finish a trace around a block.
+
+    Args:
+        name: Entry point name (e.g. answer_question)
+        **attributes: Request attributes (state, k, ...)
+
+    Yields:
+        The active trace
+    """
+    trace = Trace(name, **attributes)
+    with activate(trace):
+        try:
+            yield trace
+        except BaseException as e:
+            trace.finish(error=e)
+            raise
+    trace.finish()
+
+
+def span(name: str, **attributes):
+    """
+    Time a stage of the active trace; a no-op when no trace is active.
+
+    Args:
+        name: Stage name
+        **attributes: Attributes to attach
+
+    Returns:
+        Context manager yielding the span (or None)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **attributes)
+
+
+def _record_trace(trace: Trace):
+    """Keep a finished trace in history and append it to the export file."""
+    record = trace.to_dict()
+    _history.append(record)
+    if TRACE_EXPORT_PATH:
+        with _export_lock:
+            path = Path(TRACE_EXPORT_PATH)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def recent_traces(limit: Optional[int] = None) -> List[Dict[str, any]]:
+    """
+    Get the most recent finished traces, newest last.
+
+    Args:
+        limit: Maximum number of traces to return
+
+    Returns:
+        List of trace dictionaries
+    """
+    traces = list(_history)
+    return traces[-limit:] if limit else traces
+
+
+def export_traces_jsonl(limit: Optional[int] = None) -> str:
+    """Export recent traces as JSON lines."""
+    return "".join(json.dumps(trace) + "\n" for trace in recent_traces(limit))
+
+
+def export_metrics_jsonl() -> str:
+    """Export a timestamped metrics snapshot as one JSON line."""
+    return json.dumps({'timestamp': time.time(), 'metrics': METRICS.to_dict()}) + "\n"
@@ -124,6 +124,16 @@ def check_chroma_collection():
             print(f"✓ ChromaDB collection exists with {count} chunks")
             return True
         except:
+            pass
+        
+        # Sharded index: one collection per state
+        names = [getattr(c, 'name', c) for c in client.list_collections()]
+        shards = [name for name in names if name.startswith("road_maintenance_manuals_state_")]
+        if shards:
+            count = sum(client.get_collection(name=name).count() for name in shards)
+            print(f"✓ ChromaDB has {len(shards)} state shards with {count} chunks")
+            return True
+        else:
             print("⚠ ChromaDB collection not found")
             print("  Run: python ingest.py")
             return False